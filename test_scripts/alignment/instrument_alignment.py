@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+
+"""
+Purpose:
+    - put PFISR integration periods, 2 Hz Swarm TCT, 1 Hz Swarm MAG, SuperDARN scans and VVELS
+      records on one common epoch grid, replacing the ad hoc np.argmin(np.abs(...)) matching in
+      swarm_passover.py / pfisr_composite.py
+    - all joins are vectorized interval joins built on np.searchsorted / cumulative sums, so a whole
+      event is O(N log N) instead of O(N*M):
+        nearest  - closest sample (or the integration record containing the epoch), within a tolerance
+        mean     - mean of all samples inside each epoch's window [t - window/2, t + window/2)
+        linear   - linear interpolation between neighbouring samples, not across gaps
+    - result: one columnar pandas DataFrame indexed by epoch, columns <source>_<variable>
+"""
+
+
+def to_seconds(times):
+    """datetime64 / unix seconds -> float64 unix seconds."""
+    times = np.asarray(times)
+    if np.issubdtype(times.dtype, np.datetime64):
+        return times.astype('datetime64[ms]').astype(np.int64) / 1000.
+    return times.astype(np.float64)
+
+
+def epoch_grid(start, end, step_s):
+    """Regular epoch grid [start, end) with step_s seconds spacing, as unix seconds."""
+    return np.arange(to_seconds(np.datetime64(start, 'ms')), to_seconds(np.datetime64(end, 'ms')), step_s)
+
+
+def _columns(values):
+    """(N,) or (N, ...) -> (N, ncol) float64 plus column suffixes."""
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        return values[:, None], ['']
+    flat = values.reshape(values.shape[0], -1)
+    return flat, [f'_{i}' for i in range(flat.shape[1])]
+
+
+def join_nearest(t_src, values, t_grid, tolerance):
+    """Value of the sample closest to each epoch; NaN if further than tolerance seconds."""
+    t_src = to_seconds(t_src)
+    vals, suffix = _columns(values)
+    i = np.clip(np.searchsorted(t_src, t_grid), 1, len(t_src) - 1)
+    left_closer = np.abs(t_grid - t_src[i - 1]) <= np.abs(t_src[i] - t_grid)
+    i = np.where(left_closer, i - 1, i)
+    out = vals[i]
+    out[np.abs(t_src[i] - t_grid) > tolerance] = np.nan
+    return out, suffix
+
+
+def join_interval(starts, ends, values, t_grid):
+    """Value of the integration record [start, end) containing each epoch; NaN if none."""
+    starts, ends = to_seconds(starts), to_seconds(ends)
+    vals, suffix = _columns(values)
+    i = np.searchsorted(starts, t_grid, side='right') - 1
+    inside = (i >= 0) & (t_grid < ends[np.clip(i, 0, None)])
+    out = vals[np.clip(i, 0, None)]
+    out[~inside] = np.nan
+    return out, suffix
+
+
+def join_window_mean(t_src, values, t_grid, window):
+    """NaN-aware mean of the samples in [t - window/2, t + window/2) for every epoch, via cumulative sums."""
+    t_src = to_seconds(t_src)
+    vals, suffix = _columns(values)
+    finite = np.isfinite(vals)
+    csum = np.vstack((np.zeros((1, vals.shape[1])), np.cumsum(np.where(finite, vals, 0.), axis=0)))
+    ccnt = np.vstack((np.zeros((1, vals.shape[1])), np.cumsum(finite, axis=0)))
+
+    i0 = np.searchsorted(t_src, t_grid - window / 2., side='left')
+    i1 = np.searchsorted(t_src, t_grid + window / 2., side='left')
+    count = ccnt[i1] - ccnt[i0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = (csum[i1] - csum[i0]) / count
+    out[count == 0] = np.nan
+    return out, suffix
+
+
+def join_linear(t_src, values, t_grid, max_gap):
+    """Linear interpolation at every epoch; NaN outside the data or where neighbours are > max_gap apart."""
+    t_src = to_seconds(t_src)
+    vals, suffix = _columns(values)
+    i = np.clip(np.searchsorted(t_src, t_grid), 1, len(t_src) - 1)
+    t0, t1 = t_src[i - 1], t_src[i]
+    w = ((t_grid - t0) / np.where(t1 > t0, t1 - t0, 1.))[:, None]
+    out = vals[i - 1] * (1. - w) + vals[i] * w
+    bad = (t_grid < t_src[0]) | (t_grid > t_src[-1]) | (t1 - t0 > max_gap)
+    out[bad] = np.nan
+    return out, suffix
+
+
+def align(t_grid, sources):
+    """
+    Join every source onto t_grid and return one DataFrame indexed by epoch.
+
+    Each source is a dict:
+        name      - column prefix, e.g. 'pfisr', 'tct_A', 'mag_B', 'sd_kod', 'vvels'
+        time      - sample times (point samples), or
+        start/end - integration periods (PFISR, VVELS, SuperDARN scans)
+        values    - {variable: array with leading sample axis}
+        method    - 'nearest', 'mean' or 'linear'
+        tolerance - seconds; max distance for 'nearest', max gap for 'linear' (both unlimited by default),
+                    window for 'mean' (default: the grid step)
+    For integration-period sources 'nearest' selects the record containing the epoch and
+    'mean' averages the records whose midpoints fall in the epoch window.
+    """
+    t_grid = to_seconds(t_grid)
+    columns = {}
+    for src in sources:
+        method = src.get('method', 'nearest')
+        tol = src.get('tolerance', np.inf)
+        if method == 'mean' and 'tolerance' not in src:
+            if len(t_grid) < 2:
+                raise ValueError(f"'mean' alignment of {src['name']} needs a tolerance (window) on a single-epoch grid")
+            tol = float(np.median(np.diff(t_grid)))
+        is_interval = 'start' in src
+
+        if is_interval:
+            starts, ends = to_seconds(src['start']), to_seconds(src['end'])
+            order = np.argsort(starts)
+            starts, ends = starts[order], ends[order]
+            t_src = 0.5 * (starts + ends)
+        else:
+            t_src = to_seconds(src['time'])
+            order = np.argsort(t_src, kind='stable')
+            t_src = t_src[order]
+
+        for var, values in src['values'].items():
+            values = np.asarray(values)[order]
+            if is_interval and method == 'nearest':
+                out, suffix = join_interval(starts, ends, values, t_grid)
+            elif method == 'nearest':
+                out, suffix = join_nearest(t_src, values, t_grid, tol)
+            elif method == 'mean':
+                out, suffix = join_window_mean(t_src, values, t_grid, tol)
+            elif method == 'linear':
+                out, suffix = join_linear(t_src, values, t_grid, tol)
+            else:
+                raise ValueError(f"Unknown alignment method '{method}' for {src['name']}")
+            for k, s in enumerate(suffix):
+                columns[f"{src['name']}_{var}{s}"] = out[:, k]
+
+    index = pd.to_datetime(np.round(t_grid * 1000.).astype(np.int64), unit='ms')
+    return pd.DataFrame(columns, index=pd.Index(index, name='epoch'))
+
+
+if __name__ == "__main__":
+    import h5py
+    import cdflib
+
+    filename_lp = '/Users/clevenger/Projects/paper01/sop23_data/202302/27/20230227.002_lp_5min-fitcal.h5'
+    swarm_filename = '/Users/clevenger/Projects/paper01/sop23_data/202302/27/SW_EXPT_EFIA_TCT02_20230227T042051_20230227T164506_0302.cdf'
+    vvels_fn = '/Users/clevenger/Projects/paper01/events/20230227/vvels/outputs/20230227_vvels.h5'
+
+    t_grid = epoch_grid('2023-02-27T08:00:00', '2023-02-27T10:00:00', 10.)
+
+    with h5py.File(filename_lp, 'r') as h5:
+        utime = h5['Time/UnixTime'][:]
+        beamcodes = h5['BeamCodes'][:]
+        bidx = np.argmax(beamcodes[:, 2])
+        ne = h5['FittedParams/Ne'][:, bidx, :]
+        vlos = h5['FittedParams/Fits'][:, bidx, :, 0, 3]
+
+    with h5py.File(vvels_fn, 'r') as h5:
+        vv_time = h5['Time/UnixTime'][:]
+        vv_vel = h5['Velocity/Velocity'][:]
+
+    v = cdflib.CDF(swarm_filename)
+    swarm_time = cdflib.epochs.CDFepoch.to_datetime(v.varget('Timestamp'))
+    tct = {k: v.varget(k) for k in ['Latitude', 'Longitude', 'Viy']}
+
+    sources = [
+        {'name': 'pfisr', 'start': utime[:, 0], 'end': utime[:, 1], 'method': 'nearest',
+         'values': {'ne': ne, 'vlos': vlos}},
+        {'name': 'vvels', 'start': vv_time[:, 0], 'end': vv_time[:, 1], 'method': 'nearest',
+         'values': {'vel': vv_vel}},
+        {'name': 'tct_A', 'time': swarm_time, 'method': 'mean', 'tolerance': 10.,
+         'values': tct},
+    ]
+    table = align(t_grid, sources)
+    print(table.describe().T)
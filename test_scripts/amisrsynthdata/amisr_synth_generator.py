@@ -0,0 +1,185 @@
+import os
+import time
+import h5py
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+"""
+Purpose:
+    - fast generator of AMISR-format fitted files (same layout as paper01_event01_fac_precip.h5 /
+      *-fitcal.h5) for load-testing the rest of the stack
+    - analytic ionosphere evaluated for all beams x gates of a block of time steps in one array
+      operation (shape (nt, nbeams, nrange)):
+        Ne    Chapman F layer + E-region precipitation layer under a drifting auroral arc
+        Ti    neutral-like profile + frictional heating from the convection speed
+        Te    profile + heating inside the arc
+        Vlos  convection with a velocity shear across the arc (upward / downward FAC sheet pair),
+              projected on every beam's line of sight
+    - time blocks are computed in a process pool; the parent process is the single writer of the
+      chunked (one beam x time block per chunk), compressed HDF5 output
+"""
+
+RE_KM = 6371.2
+SITE = (65.13, -147.47, 0.213)  # PFISR lat, lon, alt (km)
+
+DEFAULT_MODEL = {
+    'nmF2': 4.e11, 'hmF2': 300., 'H_F': 55.,       # F region Chapman layer (m^-3, km, km)
+    'nmE': 1.5e11, 'hmE': 115., 'H_E': 10.,        # precipitation E layer peak inside the arc
+    'arc_lat0': 64.5, 'arc_speed': 0.4,            # arc latitude at start (deg) and drift (deg/hour)
+    'arc_width': 0.3,                               # Gaussian half-width of the arc (deg)
+    'v_bg': (0., 300.),                             # background convection east, north (m/s)
+    'v_shear': 800.,                                # eastward jet amplitude across the arc (m/s)
+    'Ti0': 800., 'Te0': 1000., 'dTe_arc': 1500.,   # K
+    'noise': 0.05,                                  # relative noise on Ne, Ti, Te
+}
+
+
+def pfisr_like_beams(nbeams, seed=0):
+    """Beam azimuths / elevations (deg): one up-B beam plus a spread of oblique beams."""
+    rng = np.random.default_rng(seed)
+    az = np.concatenate(([-154.3], rng.uniform(-180., 180., nbeams - 1)))
+    el = np.concatenate(([77.5], rng.uniform(45., 88., nbeams - 1)))
+    return az, el
+
+
+def gate_geometry(az, el, ranges_km, site=SITE):
+    """Gate lat, lon, alt (km) and ENU LOS unit vectors (nbeams, 3) on a spherical Earth."""
+    az_r, el_r = np.radians(az)[:, None], np.radians(el)[:, None]
+    r = ranges_km[None, :]
+    R0 = RE_KM + site[2]
+    # Altitude and ground distance along a straight ray from the site
+    R = np.sqrt(R0**2 + r**2 + 2. * R0 * r * np.sin(el_r))
+    alt = R - RE_KM
+    theta = np.arcsin(r * np.cos(el_r) / R)  # central angle
+    lat0, lon0 = np.radians(site[0]), np.radians(site[1])
+    lat = np.arcsin(np.sin(lat0) * np.cos(theta) + np.cos(lat0) * np.sin(theta) * np.cos(az_r))
+    lon = lon0 + np.arctan2(np.sin(az_r) * np.sin(theta) * np.cos(lat0), np.cos(theta) - np.sin(lat0) * np.sin(lat))
+    k = np.column_stack((np.cos(el_r[:, 0]) * np.sin(az_r[:, 0]), np.cos(el_r[:, 0]) * np.cos(az_r[:, 0]),
+                         np.sin(el_r[:, 0])))
+    return np.degrees(lat), np.degrees(lon), alt, k
+
+
+def _chapman(alt, nm, hm, H):
+    z = (alt - hm) / H
+    return nm * np.exp(0.5 * (1. - z - np.exp(-z)))
+
+
+def evaluate_block(t_hours, lat, alt, k, model=DEFAULT_MODEL, seed=0):
+    """
+    All parameters for a block of time steps at once.
+    t_hours (nt,), lat / alt (nbeams, nrange), k (nbeams, 3) -> dict of (nt, nbeams, nrange) arrays.
+    """
+    rng = np.random.default_rng(seed)
+    m = model
+    t = t_hours[:, None, None]
+    lat, alt = lat[None], alt[None]
+
+    # Arc position and shape in latitude
+    dlat = lat - (m['arc_lat0'] + m['arc_speed'] * t)
+    arc = np.exp(-0.5 * (dlat / m['arc_width'])**2)
+
+    ne = _chapman(alt, m['nmF2'], m['hmF2'], m['H_F']) * (1. + 0.2 * np.sin(2. * np.pi * t / 24.))
+    ne = ne + arc * _chapman(alt, m['nmE'], m['hmE'], m['H_E'])
+
+    # Current sheet pair: eastward jet with a sign change across the arc (shear = FAC pair)
+    jet = m['v_shear'] * np.tanh(dlat / m['arc_width']) * np.exp(-0.5 * (dlat / (3. * m['arc_width']))**2)
+    ve = m['v_bg'][0] + jet
+    vn = np.full_like(jet, m['v_bg'][1])
+    vlos = ve * k[None, :, 0, None] + vn * k[None, :, 1, None]
+
+    ti = m['Ti0'] + 1.5 * np.clip(alt - 100., 0., None) + 0.3 * (ve**2 + vn**2) / 1000.
+    te = m['Te0'] + 3.0 * np.clip(alt - 100., 0., None) + m['dTe_arc'] * arc * (alt > 150.)
+
+    shape = ne.shape
+    noise = lambda: 1. + m['noise'] * rng.standard_normal(shape)
+    return {'ne': ne * noise(), 'ti': ti * noise(), 'te': te * noise(), 'vlos': vlos + 20. * rng.standard_normal(shape)}
+
+
+def _block_worker(args):
+    i0, t_hours, lat, alt, k, model, seed = args
+    out = evaluate_block(t_hours, lat, alt, k, model, seed)
+    nt, nbeams, nrange = out['ne'].shape
+    fits = np.zeros((nt, nbeams, nrange, 2, 4), dtype=np.float32)
+    fits[..., 0, 0] = 1.          # O+ fraction
+    fits[..., 0, 1] = out['ti']
+    fits[..., -1, 1] = out['te']
+    fits[..., 0, 2] = 0.1         # collision frequencies
+    fits[..., -1, 2] = 0.1
+    fits[..., 0, 3] = out['vlos']
+    errors = np.abs(fits) * 0.1
+    return i0, out['ne'].astype(np.float32), fits, errors
+
+
+def generate(outfile, start_time, nrec, nbeams=11, nrange=100, integration=180., range_km=(80., 900.),
+             model=None, block=32, max_workers=None, compression='gzip', seed=0):
+    """
+    Write one synthetic AMISR fitted file. Returns outfile.
+    compression is 'gzip', 'lzf' or None; chunks are (block, 1, nrange, ...) so per-beam time series
+    reads touch only that beam's chunks.
+    """
+    model = {**DEFAULT_MODEL, **(model or {})}
+    az, el = pfisr_like_beams(nbeams, seed)
+    ranges = np.linspace(range_km[0], range_km[1], nrange)
+    lat, lon, alt, k = gate_geometry(az, el, ranges)
+
+    t0 = np.datetime64(start_time, 's').astype(np.int64)
+    utime = t0 + np.arange(nrec) * integration
+    t_hours = (utime + integration / 2. - t0) / 3600.
+
+    comp = {'compression': compression}
+    if compression == 'gzip':
+        comp['compression_opts'] = 4
+    block = min(block, nrec)
+
+    with h5py.File(outfile, 'w') as h5:
+        h5['Time/UnixTime'] = np.column_stack((utime, utime + integration)).astype(np.float64)
+        h5['BeamCodes'] = np.column_stack((64000 + np.arange(nbeams), az, el, np.zeros(nbeams)))
+        h5['Site/Latitude'] = SITE[0]
+        h5['Site/Longitude'] = SITE[1]
+        h5['Site/Altitude'] = SITE[2] * 1000.
+        h5['Geomag/Latitude'] = lat
+        h5['Geomag/Longitude'] = lon
+        h5['Geomag/Altitude'] = alt * 1000.
+        h5['FittedParams/Altitude'] = alt * 1000.
+        h5['FittedParams/Range'] = np.broadcast_to(ranges * 1000., (nbeams, nrange))
+        ne_ds = h5.create_dataset('FittedParams/Ne', shape=(nrec, nbeams, nrange), dtype='f4',
+                                  chunks=(block, 1, nrange), **comp)
+        fits_ds = h5.create_dataset('FittedParams/Fits', shape=(nrec, nbeams, nrange, 2, 4), dtype='f4',
+                                    chunks=(block, 1, nrange, 2, 4), **comp)
+        err_ds = h5.create_dataset('FittedParams/Errors', shape=(nrec, nbeams, nrange, 2, 4), dtype='f4',
+                                   chunks=(block, 1, nrange, 2, 4), **comp)
+        h5.attrs['generator'] = 'amisr_synth_generator'
+        h5.attrs['model'] = str(model)
+
+        jobs = [(i0, t_hours[i0:i0 + block], lat, alt, k, model, seed + i0)
+                for i0 in range(0, nrec, block)]
+        # Workers evaluate; this process is the only writer
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for i0, ne, fits, errors in pool.map(_block_worker, jobs):
+                n = ne.shape[0]
+                ne_ds[i0:i0 + n] = ne
+                fits_ds[i0:i0 + n] = fits
+                err_ds[i0:i0 + n] = errors
+    return outfile
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Generate a synthetic AMISR fitted file')
+    parser.add_argument('outfile')
+    parser.add_argument('--start', default='2023-02-27T06:00:00')
+    parser.add_argument('--nrec', type=int, default=240, help='number of integration periods')
+    parser.add_argument('--nbeams', type=int, default=11)
+    parser.add_argument('--nrange', type=int, default=100)
+    parser.add_argument('--integration', type=float, default=180., help='seconds')
+    parser.add_argument('--compression', default='gzip', choices=['gzip', 'lzf', 'none'])
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    t_start = time.time()
+    generate(args.outfile, args.start, args.nrec, args.nbeams, args.nrange, args.integration,
+             compression=None if args.compression == 'none' else args.compression, max_workers=args.workers)
+    size_mb = os.path.getsize(args.outfile) / 1024.**2
+    print(f"Wrote {args.outfile} ({args.nrec} x {args.nbeams} x {args.nrange}, {size_mb:.1f} MB) "
+          f"in {time.time() - t_start:.1f} s")
@@ -0,0 +1,193 @@
+import os
+import re
+import glob
+import h5py
+import numpy as np
+import scipy.io
+
+"""
+Purpose:
+    - read ASI image stacks from sop23_data/<date>/asi/crossing*/ without loading whole .mat files
+    - frame timestamps are indexed once and cached next to the data
+    - only frames inside a requested time window are read:
+        v7.3 (HDF5-based) stack files -> lazy hyperslab reads in small blocks
+        directories of per-frame .mat files -> only the files inside the window are opened
+        older (v5) stack files cannot be read partially and fall back to scipy.io.loadmat
+    - frames are streamed through a generator, so keograms / overlays over a multi-hour
+      crossing run in constant memory
+"""
+
+# Candidate variable names (first match wins)
+TIME_KEYS = ('time', 'times', 't', 'ut', 'datenum', 'timestamp')
+IMAGE_KEYS = ('images', 'image', 'frames', 'img', 'data', 'imgs')
+
+# MATLAB datenum of 1970-01-01
+DATENUM_UNIX_EPOCH = 719529.
+FILENAME_TIME = re.compile(r'(\d{8})[_T](\d{6})')
+
+
+def to_unix(t):
+    """MATLAB datenum or unix seconds -> unix seconds."""
+    t = np.asarray(t, dtype=np.float64).ravel()
+    if t.size and np.nanmax(t) < 1e7:
+        return (t - DATENUM_UNIX_EPOCH) * 86400.
+    return t
+
+
+def _as_unix(t):
+    """datetime64 / ISO string / unix seconds -> unix seconds."""
+    if isinstance(t, (np.datetime64, str)):
+        return np.datetime64(t, 'ms').astype(np.int64) / 1000.
+    return float(t)
+
+
+def _pick_key(keys, available, what, fn):
+    for k in keys:
+        if k in available:
+            return k
+    raise KeyError(f"No {what} variable in {fn} (tried {', '.join(keys)})")
+
+
+def _time_from_filename(fn):
+    m = FILENAME_TIME.search(os.path.basename(fn))
+    if m is None:
+        return None
+    d, hms = m.groups()
+    return float(np.datetime64(f"{d[:4]}-{d[4:6]}-{d[6:]}T{hms[:2]}:{hms[2:4]}:{hms[4:]}", 's').astype(np.int64))
+
+
+class ASIFrameReader:
+    """Time-indexed, lazy access to an ASI stack file or a directory of per-frame files."""
+
+    def __init__(self, path, time_key=None, image_key=None):
+        self.path = path
+        self.is_dir = os.path.isdir(path)
+        self.time_key = time_key
+        self.image_key = image_key
+        self.files = None
+        self.times = self._load_index()
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def _index_file(self):
+        if self.is_dir:
+            return os.path.join(self.path, 'frame_index.npz')
+        return self.path + '.frame_index.npz'
+
+    def _load_index(self):
+        idx = self._index_file
+        src_mtime = os.path.getmtime(self.path)
+        if os.path.exists(idx) and os.path.getmtime(idx) >= src_mtime:
+            cached = np.load(idx, allow_pickle=False)
+            if self.is_dir:
+                self.files = [os.path.join(self.path, f) for f in cached['files']]
+            self.time_key = self.time_key or str(cached['time_key'])
+            self.image_key = self.image_key or str(cached['image_key'])
+            return cached['times']
+
+        if self.is_dir:
+            times = self._index_directory()
+            np.savez(idx, times=times, files=np.array([os.path.basename(f) for f in self.files]),
+                     time_key=self.time_key or '', image_key=self.image_key or '')
+        else:
+            times = self._index_stack()
+            np.savez(idx, times=times, time_key=self.time_key, image_key=self.image_key)
+        return times
+
+    def _index_directory(self):
+        files, times = [], []
+        for f in glob.glob(os.path.join(self.path, '*.mat')):
+            if os.path.basename(f) == 'skymap.mat':
+                continue
+            t = _time_from_filename(f)
+            if t is None:
+                # No timestamp in the name: read only the time variable, skip anything that is not a single frame
+                try:
+                    t = to_unix(self._read_var(f, self.time_key or TIME_KEYS, 'time'))
+                except KeyError:
+                    continue
+                if t.size != 1:
+                    continue
+                t = t[0]
+            files.append(f)
+            times.append(t)
+        order = np.argsort(times)
+        self.files = [files[i] for i in order]
+        return np.asarray(times, dtype=np.float64)[order]
+
+    def _index_stack(self):
+        if h5py.is_hdf5(self.path):
+            with h5py.File(self.path, 'r') as h5:
+                self.time_key = self.time_key or _pick_key(TIME_KEYS, h5, 'time', self.path)
+                self.image_key = self.image_key or _pick_key(IMAGE_KEYS, h5, 'image', self.path)
+                return to_unix(h5[self.time_key][...])
+
+        print(f"{self.path} is not a v7.3 mat file; the whole file has to be loaded")
+        mat = scipy.io.loadmat(self.path, squeeze_me=True, variable_names=None)
+        self.time_key = self.time_key or _pick_key(TIME_KEYS, mat, 'time', self.path)
+        self.image_key = self.image_key or _pick_key(IMAGE_KEYS, mat, 'image', self.path)
+        return to_unix(mat[self.time_key])
+
+    @staticmethod
+    def _read_var(fn, keys, what):
+        keys = (keys,) if isinstance(keys, str) else keys
+        if h5py.is_hdf5(fn):
+            with h5py.File(fn, 'r') as h5:
+                return np.asarray(h5[_pick_key(keys, h5, what, fn)][...]).T
+        mat = scipy.io.loadmat(fn, squeeze_me=True)
+        return np.asarray(mat[_pick_key(keys, mat, what, fn)])
+
+    def select(self, start=None, end=None):
+        """slice of frame indices with start <= time <= end (datetime64 or unix seconds)."""
+        t0 = -np.inf if start is None else _as_unix(start)
+        t1 = np.inf if end is None else _as_unix(end)
+        return slice(int(np.searchsorted(self.times, t0, side='left')),
+                     int(np.searchsorted(self.times, t1, side='right')))
+
+    def iter_frames(self, start=None, end=None, block=16):
+        """Yield (unix_time, frame (ny, nx)) for every frame in the window, reading block frames at a time."""
+        sel = self.select(start, end)
+
+        if self.is_dir:
+            for i in range(sel.start, sel.stop):
+                yield self.times[i], self._read_var(self.files[i], self.image_key or IMAGE_KEYS, 'image')
+            return
+
+        if h5py.is_hdf5(self.path):
+            with h5py.File(self.path, 'r') as h5:
+                dset = h5[self.image_key]
+                # MATLAB (ny, nx, nt) is stored transposed: (nt, nx, ny) in HDF5
+                for i0 in range(sel.start, sel.stop, block):
+                    i1 = min(i0 + block, sel.stop)
+                    chunk = dset[i0:i1]
+                    for k in range(i1 - i0):
+                        yield self.times[i0 + k], chunk[k].T
+            return
+
+        stack = scipy.io.loadmat(self.path, squeeze_me=True)[self.image_key]
+        for i in range(sel.start, sel.stop):
+            yield self.times[i], stack[..., i]
+
+    def read(self, start=None, end=None):
+        """All frames in the window as (times, array (nt, ny, nx)); use iter_frames for long windows."""
+        times, frames = [], []
+        for t, f in self.iter_frames(start, end):
+            times.append(t)
+            frames.append(f)
+        if not frames:
+            return np.empty(0), np.empty((0, 0, 0))
+        return np.asarray(times), np.stack(frames)
+
+
+if __name__ == "__main__":
+    crossing_dir = '/Users/clevenger/Projects/paper01/sop23_data/202302/27/asi/crossing1/in/'
+
+    reader = ASIFrameReader(crossing_dir)
+    print(f"{len(reader)} frames: {np.datetime64(int(reader.times[0]), 's')} - "
+          f"{np.datetime64(int(reader.times[-1]), 's')}")
+
+    # Mean brightness of every frame in a 10 minute window, streamed
+    for t, frame in reader.iter_frames(np.datetime64('2023-02-27T08:30:00'), np.datetime64('2023-02-27T08:40:00')):
+        print(f"{np.datetime64(int(t), 's')}: mean counts = {np.nanmean(frame):.1f}")
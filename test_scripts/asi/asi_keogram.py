@@ -0,0 +1,128 @@
+import h5py
+import numpy as np
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from scipy.spatial import cKDTree
+
+from asi_skymap import get_lut
+from asi_frame_reader import ASIFrameReader
+
+"""
+Purpose:
+    - sample an ASI image stack along arbitrary paths (PFISR beam footprints, Swarm TCT ground
+      tracks) to build keograms
+    - the path-to-pixel indices are computed once from the cached skymap mapping (asi_skymap.py),
+      after which every frame is a single gather: frame.ravel()[pixel_index]
+    - frames are streamed with ASIFrameReader, so a full-night keogram runs in constant memory
+"""
+
+
+def _unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def path_pixel_index(lut, path_lat, path_lon, max_dist_km=10., k=1):
+    """
+    Flat pixel indices (npath, k) of the k mapped pixels nearest each path point. Path points with
+    no pixel within max_dist_km get index -1.
+    """
+    lat = np.asarray(lut[0], dtype=float).ravel()
+    lon = np.asarray(lut[1], dtype=float).ravel()
+    valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+
+    tree = cKDTree(_unit_vectors(lat[valid], lon[valid]))
+    # chord length on the unit sphere for max_dist_km
+    max_chord = 2. * np.sin(max_dist_km / 6371.2 / 2.)
+    dist, nearest = tree.query(_unit_vectors(path_lat, path_lon), k=k)
+    dist, nearest = dist.reshape(len(dist), k), nearest.reshape(len(nearest), k)
+
+    idx = np.full(nearest.shape, -1, dtype=np.int64)
+    ok = dist <= max_chord
+    idx[ok] = valid[nearest[ok]]
+    return idx
+
+
+def keogram(reader, pixel_index, start=None, end=None):
+    """(times (nt,), keogram (nt, npath)) gathered from every frame in the window."""
+    npath, k = pixel_index.shape
+    missing = pixel_index < 0
+    flat_idx = np.where(missing, 0, pixel_index)
+
+    sel = reader.select(start, end)
+    keo = np.full((sel.stop - sel.start, npath), np.nan, dtype=np.float32)
+    times = np.empty(sel.stop - sel.start)
+    for i, (t, frame) in enumerate(reader.iter_frames(start, end)):
+        vals = np.asarray(frame, dtype=np.float32).ravel()[flat_idx]
+        vals[missing] = np.nan
+        keo[i] = np.nanmean(vals, axis=1) if k > 1 else vals[:, 0]
+        times[i] = t
+    return times, keo
+
+
+def pfisr_beam_footprints(h5file, alt_km=110.):
+    """(lat, lon) of each PFISR beam where it crosses alt_km, ordered by latitude."""
+    with h5py.File(h5file, 'r') as h5:
+        lats = h5['Geomag/Latitude'][:]
+        lons = h5['Geomag/Longitude'][:]
+        alts = h5['Geomag/Altitude'][:] / 1000.
+
+    # Linear interpolation of every beam at alt_km in one pass
+    alts = np.where(np.isfinite(alts), alts, np.inf)
+    i = np.clip(np.argmax(alts >= alt_km, axis=1), 1, alts.shape[1] - 1)
+    b = np.arange(alts.shape[0])
+    w = (alt_km - alts[b, i - 1]) / (alts[b, i] - alts[b, i - 1])
+    lat = lats[b, i - 1] + w * (lats[b, i] - lats[b, i - 1])
+    lon = lons[b, i - 1] + w * (lons[b, i] - lons[b, i - 1])
+
+    good = np.isfinite(lat) & np.isfinite(lon)
+    order = np.argsort(lat[good])
+    return lat[good][order], lon[good][order]
+
+
+def swarm_track(swarm_cdf, starttime, endtime):
+    """Swarm TCT ground track (lat, lon) between starttime and endtime."""
+    import cdflib
+    v = cdflib.CDF(swarm_cdf)
+    swarm_time = cdflib.epochs.CDFepoch.to_datetime(v.varget('Timestamp'))
+    stidx = int(np.searchsorted(swarm_time, starttime))
+    etidx = int(np.searchsorted(swarm_time, endtime))
+    if etidx <= stidx:
+        return np.empty(0), np.empty(0)
+    return (v.varget('Latitude', startrec=stidx, endrec=etidx - 1),
+            v.varget('Longitude', startrec=stidx, endrec=etidx - 1))
+
+
+def plot_keogram(times, keo, path_lat, ax=None, vmin=None, vmax=None, title=''):
+    if ax is None:
+        fig, ax = plt.subplots(figsize=(12, 4))
+    c = ax.pcolormesh(times.astype('datetime64[s]'), path_lat, keo.T, shading='auto', cmap='gray',
+                      vmin=vmin, vmax=vmax)
+    ax.set_ylabel('Latitude along path')
+    ax.set_xlabel('Universal Time')
+    ax.set_title(title)
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+    plt.colorbar(c, ax=ax, label='Counts')
+    return ax
+
+
+if __name__ == "__main__":
+    import os
+
+    skymap_fn = '/Users/clevenger/Projects/paper01/sop23_data/202302/27/asi/crossing1/in/skymap.mat'
+    crossing_dir = '/Users/clevenger/Projects/paper01/sop23_data/202302/27/asi/crossing1/in/'
+    filename_lp = '/Users/clevenger/Projects/paper01/sop23_data/202302/27/20230227.002_lp_5min-fitcal.h5'
+    alt_km = 110.
+
+    lut = get_lut(skymap_fn, alt_km=alt_km)
+    reader = ASIFrameReader(crossing_dir)
+
+    path_lat, path_lon = pfisr_beam_footprints(filename_lp, alt_km)
+    pixel_index = path_pixel_index(lut, path_lat, path_lon, k=4)
+    times, keo = keogram(reader, pixel_index)
+
+    fig, ax = plt.subplots(figsize=(12, 4))
+    plot_keogram(times, keo, path_lat, ax=ax, title=f'ASI along PFISR beam footprints ({alt_km:g} km)')
+    output_filename = os.path.join(os.path.dirname(crossing_dir.rstrip('/')), 'keogram_pfisr_beams.png')
+    fig.savefig(output_filename, dpi=300, bbox_inches='tight')
+    print(f"Plot saved as: {output_filename}")
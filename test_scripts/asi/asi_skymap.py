@@ -0,0 +1,152 @@
+import os
+import numpy as np
+import scipy.io
+import scipy.sparse as sp
+
+"""
+Purpose:
+    - load an all-sky imager skymap (asi/crossing*/in/skymap.mat) once
+    - map every ASI pixel to geographic (lat, lon) at a chosen emission altitude and keep the
+      result as a compact float32 lookup table on disk, memmapped on later loads
+    - precompute sparse resampling weights from pixels to a regular lat/lon grid, so a whole image
+      stack is projected with one sparse matrix product instead of recomputing geometry per frame
+"""
+
+RE_KM = 6371.2
+
+# Candidate variable names in the skymap file (first match wins)
+AZIMUTH_KEYS = ('full_azimuth', 'azimuth', 'az', 'AZ', 'FULL_AZIMUTH')
+ELEVATION_KEYS = ('full_elevation', 'elevation', 'el', 'EL', 'FULL_ELEVATION')
+SITE_LAT_KEYS = ('site_lat', 'site_map_latitude', 'glat', 'lat', 'SITE_MAP_LATITUDE')
+SITE_LON_KEYS = ('site_lon', 'site_map_longitude', 'glon', 'lon', 'SITE_MAP_LONGITUDE')
+
+
+def _flatten_mat(mat):
+    """Top-level variables plus the fields of any MATLAB struct, as a flat dict."""
+    out = {}
+    for key, val in mat.items():
+        if key.startswith('__'):
+            continue
+        if hasattr(val, '_fieldnames'):
+            for field in val._fieldnames:
+                out[field] = getattr(val, field)
+        else:
+            out[key] = val
+    return out
+
+
+def _pick(variables, keys, what):
+    for key in keys:
+        if key in variables:
+            return variables[key]
+    raise KeyError(f"No {what} variable found in skymap (tried {', '.join(keys)})")
+
+
+def load_skymap(skymap_fn):
+    """Return azimuth (deg), elevation (deg), site_lat, site_lon from a skymap .mat file."""
+    mat = scipy.io.loadmat(skymap_fn, struct_as_record=False, squeeze_me=True)
+    variables = _flatten_mat(mat)
+    az = np.asarray(_pick(variables, AZIMUTH_KEYS, 'azimuth'), dtype=float)
+    el = np.asarray(_pick(variables, ELEVATION_KEYS, 'elevation'), dtype=float)
+    site_lat = float(np.ravel(_pick(variables, SITE_LAT_KEYS, 'site latitude'))[0])
+    site_lon = float(np.ravel(_pick(variables, SITE_LON_KEYS, 'site longitude'))[0])
+    return az, el, site_lat, site_lon
+
+
+def pixel_latlon(az, el, site_lat, site_lon, alt_km, min_el=10.):
+    """
+    Geographic (lat, lon) of every pixel at emission altitude alt_km (spherical Earth).
+    Pixels below min_el elevation or without a valid look direction are NaN.
+    """
+    el_r = np.radians(el)
+    # Earth-centred angle between the site and the emission point
+    theta = np.arccos(RE_KM * np.cos(el_r) / (RE_KM + alt_km)) - el_r
+
+    lat0, lon0, azr = np.radians(site_lat), np.radians(site_lon), np.radians(az)
+    lat = np.arcsin(np.sin(lat0) * np.cos(theta) + np.cos(lat0) * np.sin(theta) * np.cos(azr))
+    lon = lon0 + np.arctan2(np.sin(azr) * np.sin(theta) * np.cos(lat0),
+                            np.cos(theta) - np.sin(lat0) * np.sin(lat))
+
+    lat, lon = np.degrees(lat), (np.degrees(lon) + 180.) % 360. - 180.
+    bad = ~np.isfinite(el) | ~np.isfinite(az) | (el < min_el)
+    lat[bad] = np.nan
+    lon[bad] = np.nan
+    return lat, lon
+
+
+def lut_path(skymap_fn, alt_km, min_el=10.):
+    return os.path.join(os.path.dirname(skymap_fn), f"skymap_lut_{alt_km:g}km_el{min_el:g}.npy")
+
+
+def get_lut(skymap_fn, alt_km=110., min_el=10.):
+    """
+    Memmapped float32 array (2, ny, nx) of pixel (lat, lon) at alt_km. Computed on first use and
+    stored next to the skymap.
+    """
+    fn = lut_path(skymap_fn, alt_km, min_el)
+    if not os.path.exists(fn) or os.path.getmtime(fn) < os.path.getmtime(skymap_fn):
+        az, el, site_lat, site_lon = load_skymap(skymap_fn)
+        lat, lon = pixel_latlon(az, el, site_lat, site_lon, alt_km, min_el)
+        np.save(fn, np.stack((lat, lon)).astype(np.float32))
+    return np.load(fn, mmap_mode='r')
+
+
+def resampling_weights(lut, lat_edges, lon_edges):
+    """
+    Sparse (ncell x npix) matrix averaging all pixels that fall into each cell of the regular
+    grid given by lat_edges / lon_edges. Cells without pixels have an empty row.
+    """
+    lat = np.asarray(lut[0], dtype=float).ravel()
+    lon = np.asarray(lut[1], dtype=float).ravel()
+    nlat, nlon = len(lat_edges) - 1, len(lon_edges) - 1
+
+    ilat = np.searchsorted(lat_edges, lat, side='right') - 1
+    ilon = np.searchsorted(lon_edges, lon, side='right') - 1
+    valid = np.isfinite(lat) & (ilat >= 0) & (ilat < nlat) & (ilon >= 0) & (ilon < nlon)
+
+    pix = np.flatnonzero(valid)
+    cell = ilat[valid] * nlon + ilon[valid]
+    counts = np.bincount(cell, minlength=nlat * nlon)
+    W = sp.csr_matrix((1. / counts[cell], (cell, pix)), shape=(nlat * nlon, lat.size))
+    return W
+
+
+def get_weights(skymap_fn, lat_edges, lon_edges, alt_km=110., min_el=10.):
+    """Cached resampling weights for one skymap / altitude / output grid."""
+    lat_edges, lon_edges = np.asarray(lat_edges, float), np.asarray(lon_edges, float)
+    tag = f"{lat_edges[0]:g}_{lat_edges[-1]:g}_{len(lat_edges)}_{lon_edges[0]:g}_{lon_edges[-1]:g}_{len(lon_edges)}"
+    fn = lut_path(skymap_fn, alt_km, min_el).replace('.npy', f"_grid{tag}.npz")
+    if os.path.exists(fn) and os.path.getmtime(fn) >= os.path.getmtime(skymap_fn):
+        return sp.load_npz(fn).tocsr()
+    W = resampling_weights(get_lut(skymap_fn, alt_km, min_el), lat_edges, lon_edges)
+    sp.save_npz(fn, W)
+    return W
+
+
+def project_stack(W, frames, grid_shape):
+    """
+    Project one image (ny, nx) or a stack (nt, ny, nx) onto the regular grid with one sparse
+    matrix product. Empty cells are NaN.
+    """
+    frames = np.asarray(frames)
+    single = frames.ndim == 2
+    stack = frames.reshape((1 if single else frames.shape[0], -1)).astype(np.float32)
+
+    out = (W @ stack.T).T
+    empty = np.diff(W.indptr) == 0
+    out[:, empty] = np.nan
+    out = out.reshape((-1,) + tuple(grid_shape))
+    return out[0] if single else out
+
+
+if __name__ == "__main__":
+    skymap_fn = '/Users/clevenger/Projects/paper01/sop23_data/202302/27/asi/crossing1/in/skymap.mat'
+
+    lut = get_lut(skymap_fn, alt_km=110.)
+    print(f"Pixel LUT {lut.shape}: lat {np.nanmin(lut[0]):.2f}-{np.nanmax(lut[0]):.2f}, "
+          f"lon {np.nanmin(lut[1]):.2f}-{np.nanmax(lut[1]):.2f}")
+
+    lat_edges = np.arange(60., 70.01, 0.05)
+    lon_edges = np.arange(-160., -134.99, 0.1)
+    W = get_weights(skymap_fn, lat_edges, lon_edges, alt_km=110.)
+    print(f"Resampling weights {W.shape}, {W.nnz} non-zeros")
@@ -0,0 +1,282 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+from datetime import datetime
+import numpy as np
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+for _d in ('pfisr', 'swarm', 'lompe', 'alignment', 'paper_plotting', 'file_readers'):
+    sys.path.insert(0, os.path.join(_HERE, '..', _d))
+
+from fixtures import SIZES, build_fixtures
+
+"""
+Purpose:
+    - reproducible timings of the readers, rotations, coverage accumulator, diff engine and renderers
+      on synthetic fixtures (fixtures.py) at several data sizes
+    - every run is appended to results/history.jsonl (commit, host, versions, per benchmark/size timings);
+      --check compares the run against the median of the previous runs on the same host and exits
+      non-zero if any benchmark got slower than the threshold
+
+Usage:
+    python bench_suite.py [--sizes small medium] [--only pfisr_read_rti ...] [--repeat 5] [--check]
+"""
+
+FIXTURE_DIR = os.environ.get('PAPER01_BENCH_DATA', os.path.join(os.path.expanduser('~'), '.cache', 'paper01_bench'))
+HISTORY = os.path.join(_HERE, 'results', 'history.jsonl')
+
+BENCHMARKS = {}
+
+
+class Skip(Exception):
+    pass
+
+
+def benchmark(name):
+    """Register a benchmark: setup(fixtures) -> zero-argument callable that is timed."""
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def _need(module):
+    try:
+        return __import__(module)
+    except ImportError as e:
+        raise Skip(f"missing dependency ({e.name})")
+
+
+@benchmark('pfisr_beam_read')
+def _pfisr_beam_read(fx):
+    import h5py
+
+    def run():
+        # Same reads as pfisr_plotter.py before the RTI pyramid
+        with h5py.File(fx['amisr'], 'r') as h5:
+            bidx = np.argmax(h5['BeamCodes'][:, 2])
+            h5['FittedParams/Ne'][:, bidx, :]
+            for ion, k in ((0, 1), (-1, 1), (0, 3)):
+                h5['FittedParams/Fits'][:, bidx, :, ion, k]
+    return run
+
+
+@benchmark('pfisr_beam_read_repacked')
+def _pfisr_beam_read_repacked(fx):
+    from h5_repacker import repack, read_beam
+    repacked = os.path.splitext(fx['amisr'])[0] + '.repacked.h5'
+    if not os.path.exists(repacked) or os.path.getmtime(repacked) < os.path.getmtime(fx['amisr']):
+        repack(fx['amisr'], repacked)
+    with __import__('h5py').File(repacked, 'r') as h5:
+        bidx = np.argmax(h5['BeamCodes'][:, 2])
+
+    def run():
+        # Same beam and parameters as pfisr_beam_read, from the (beam, record, range) layout
+        for param in ('ne', 'ti', 'te', 'vlos'):
+            read_beam(repacked, param, bidx)
+    return run
+
+
+@benchmark('pfisr_read_rti')
+def _pfisr_read_rti(fx):
+    from pfisr_rti_pyramid import build_pyramid, read_rti
+    build_pyramid(fx['amisr'], min_bins=4)
+    return lambda: read_rti(fx['amisr'], width_px=100)
+
+
+@benchmark('pfisr_los_gates')
+def _pfisr_los_gates(fx):
+    from swarm_pfisr_los_projection import load_pfisr_gates
+    return lambda: load_pfisr_gates(fx['amisr'])
+
+
+@benchmark('swarm_tct_read')
+def _swarm_tct_read(fx):
+    from swarm_pfisr_los_projection import load_swarm_tct
+    t0 = np.datetime64('2023-02-27T06:00:00')
+    return lambda: load_swarm_tct(fx['tct'], t0, t0 + np.timedelta64(1, 'D'))
+
+
+@benchmark('tct_enu_rotation')
+def _tct_enu_rotation(fx):
+    from swarm_pfisr_los_projection import rotate_tct_to_enu
+    n = fx['spec']['tct_samples']
+    rng = np.random.default_rng(0)
+    args = [rng.standard_normal(n) for _ in range(7)]
+    return lambda: rotate_tct_to_enu(*args)
+
+
+@benchmark('swarm_pfisr_projection')
+def _swarm_pfisr_projection(fx):
+    from swarm_pfisr_los_projection import load_pfisr_gates, load_swarm_tct, project
+    t0 = np.datetime64('2023-02-27T06:00:00')
+    gates = load_pfisr_gates(fx['amisr'])
+    swarm = load_swarm_tct(fx['tct'], t0, t0 + np.timedelta64(1, 'D'))
+    return lambda: project(swarm, gates, radius_km=200.)
+
+
+@benchmark('superdarn_coverage')
+def _superdarn_coverage(fx):
+    _need('pydarn')
+    from data_coverage import coverage_points
+    return lambda: coverage_points(fx['fitacf'])
+
+
+@benchmark('lompe_point_series')
+def _lompe_point_series(fx):
+    from lompe_timeseries_loader import LompeCaseDataset
+    return lambda: LompeCaseDataset(fx['lompe_a']).point_series('FAC', 65.13, -147.47)
+
+
+@benchmark('lompe_case_diff')
+def _lompe_case_diff(fx):
+    from lompe_timeseries_loader import LompeCaseDataset
+
+    def run():
+        # RMS difference of every field between two cases over all time steps
+        a, b = LompeCaseDataset(fx['lompe_a']), LompeCaseDataset(fx['lompe_b'])
+        return {var: np.sqrt(np.nanmean((b.read(var)[1] - a.read(var)[1])**2))
+                for var in ('FAC', 'E_pot', 'Ve', 'Vn')}
+    return run
+
+
+@benchmark('alignment')
+def _alignment(fx):
+    import h5py
+    from instrument_alignment import epoch_grid, align
+    with h5py.File(fx['amisr'], 'r') as h5:
+        utime = h5['Time/UnixTime'][:]
+        ne = h5['FittedParams/Ne'][:, 0, :]
+    n = fx['spec']['tct_samples']
+    t_tct = np.datetime64('2023-02-27T06:00:00', 'ms') + (np.arange(n) * 500).astype('timedelta64[ms]')
+    vel = np.random.default_rng(0).standard_normal((n, 3))
+    t_grid = epoch_grid('2023-02-27T06:00:00', '2023-02-28T06:00:00', 10.)
+    sources = [
+        {'name': 'pfisr', 'start': utime[:, 0], 'end': utime[:, 1], 'values': {'ne': ne}},
+        {'name': 'tct', 'time': t_tct, 'method': 'mean', 'tolerance': 10., 'values': {'vel': vel}},
+    ]
+    return lambda: align(t_grid, sources)
+
+
+@benchmark('composite_render')
+def _composite_render(fx):
+    import matplotlib
+    matplotlib.use('Agg')
+    from pfisr_composite_renderer import CompositeRenderer
+    renderer = CompositeRenderer(fx['amisr'])
+    renderer.figure(headless=True)
+    nframes = min(10, len(renderer.utime))
+
+    def run():
+        for i in range(nframes):
+            renderer.render(i)
+    return run
+
+
+def time_call(func, repeat):
+    func()  # warm-up (imports, OS cache, pyramid build)
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return {'min_s': min(times), 'median_s': float(np.median(times)), 'repeat': repeat}
+
+
+def run_suite(sizes, only=None, repeat=5):
+    results = []
+    for size in sizes:
+        fx = build_fixtures(size, FIXTURE_DIR)
+        for name, setup in BENCHMARKS.items():
+            if only and name not in only:
+                continue
+            row = {'benchmark': name, 'size': size}
+            try:
+                row.update(time_call(setup(fx), repeat))
+                print(f"{name:28s} {size:8s} min {row['min_s'] * 1e3:10.2f} ms   median {row['median_s'] * 1e3:10.2f} ms")
+            except Skip as e:
+                row['skipped'] = str(e)
+                print(f"{name:28s} {size:8s} skipped: {e}")
+            results.append(row)
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=_HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path=HISTORY):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_history(results, path=HISTORY):
+    import h5py
+    entry = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'h5py': h5py.__version__,
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+    return entry
+
+
+def compare(entry, history, threshold=1.25, window=5):
+    """Benchmarks slower than threshold x the median of the last window runs on the same host."""
+    previous = [h for h in history if h['host'] == entry['host']][-window:]
+    regressions = []
+    for row in entry['results']:
+        if 'skipped' in row:
+            continue
+        base = [r['min_s'] for h in previous for r in h['results']
+                if r['benchmark'] == row['benchmark'] and r['size'] == row['size'] and 'min_s' in r]
+        if not base:
+            continue
+        ratio = row['min_s'] / float(np.median(base))
+        if ratio > threshold:
+            regressions.append((row['benchmark'], row['size'], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark suite on synthetic fixtures')
+    parser.add_argument('--sizes', nargs='+', default=['small', 'medium'], choices=list(SIZES))
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--check', action='store_true', help='exit non-zero on regressions')
+    parser.add_argument('--threshold', type=float, default=1.25)
+    parser.add_argument('--no-record', action='store_true', help='do not append to the history')
+    args = parser.parse_args()
+
+    history = load_history()
+    results = run_suite(args.sizes, args.only, args.repeat)
+    entry = {'host': platform.node(), 'results': results}
+    if not args.no_record:
+        entry = append_history(results)
+        print(f"Results appended to {HISTORY}")
+
+    regressions = compare(entry, history, args.threshold)
+    for name, size, ratio in regressions:
+        print(f"REGRESSION {name} ({size}): {ratio:.2f}x slower than recent median")
+    if args.check and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import os
+import sys
+import numpy as np
+from cdflib.cdfwrite import CDF
+from netCDF4 import Dataset
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'amisrsynthdata'))
+from amisr_synth_generator import generate
+
+"""
+Purpose:
+    - synthetic fixtures with the layouts (and realistic sizes) of the files the scripts read, so the
+      benchmarks do not depend on /Users/clevenger/... data:
+        AMISR fitted HDF5   Time/UnixTime, BeamCodes, Geomag/*, FittedParams/{Ne, Fits, Errors, Altitude}
+                            with Fits (time, beam, range, ion, param)
+        Swarm TCT02 CDF     Timestamp (CDF_EPOCH), Vixh/Vixv/Viy/Viz, VsatN/E/C, Quality_flags, position
+        fitacf records      list of dicts as returned by pydarn read_fitacf
+        Lompe outputs       one NetCDF per time step (<case>/2023-02-27_083500.nc)
+    - fixtures are generated once per size into a fixture directory and reused
+"""
+
+SIZES = {
+    'small': {'nrec': 40, 'nbeams': 11, 'nrange': 40, 'tct_samples': 7200, 'fitacf_records': 500,
+              'lompe_steps': 6, 'lompe_grid': (30, 40)},
+    'medium': {'nrec': 200, 'nbeams': 26, 'nrange': 80, 'tct_samples': 86400, 'fitacf_records': 5000,
+               'lompe_steps': 24, 'lompe_grid': (60, 80)},
+    'large': {'nrec': 1000, 'nbeams': 51, 'nrange': 120, 'tct_samples': 172800, 'fitacf_records': 20000,
+              'lompe_steps': 96, 'lompe_grid': (120, 160)},
+}
+
+T0 = np.datetime64('2023-02-27T06:00:00', 's')
+SITE = (65.13, -147.47)
+RE_KM = 6371.2
+CDF_EPOCH_UNIX_OFFSET_MS = 62167219200000
+
+
+def write_amisr_fitted(path, nrec, nbeams, nrange, integration=180., seed=0):
+    """AMISR-layout fitted file from the synthetic generator (chunked, uncompressed)."""
+    return generate(path, T0, nrec, nbeams, nrange, integration, compression=None, max_workers=2, seed=seed)
+
+
+def write_tct_cdf(path, n, cadence_s=0.5, seed=0):
+    """TCT02-like CDF: a polar pass over PFISR repeated for n samples at 2 Hz."""
+    rng = np.random.default_rng(seed)
+    if os.path.exists(path):
+        os.remove(path)
+    epoch = (T0.astype(np.int64) + np.arange(n) * cadence_s) * 1000. + CDF_EPOCH_UNIX_OFFSET_MS
+    phase = np.arange(n) * cadence_s / 5640. * 2. * np.pi
+    lat = np.degrees(np.arcsin(np.sin(phase)))
+    lon = np.full(n, SITE[1]) + np.degrees(phase) * 0.07
+
+    data = {
+        'Latitude': lat, 'Longitude': lon, 'Radius': np.full(n, (RE_KM + 460.) * 1000.),
+        'VsatN': 7600. * np.cos(phase), 'VsatE': np.full(n, 200.), 'VsatC': np.full(n, 10.),
+        'Vixh': 300. * rng.standard_normal(n), 'Vixv': 300. * rng.standard_normal(n),
+        'Viy': 300. * rng.standard_normal(n), 'Viz': 50. * rng.standard_normal(n),
+    }
+    cdf = CDF(path)
+    cdf.write_var({'Variable': 'Timestamp', 'Data_Type': 31, 'Num_Elements': 1, 'Rec_Vary': True,
+                   'Dim_Sizes': []}, var_data=epoch)
+    cdf.write_var({'Variable': 'Quality_flags', 'Data_Type': 14, 'Num_Elements': 1, 'Rec_Vary': True,
+                   'Dim_Sizes': []}, var_data=rng.integers(0, 4, n).astype(np.uint32))
+    for name, values in data.items():
+        cdf.write_var({'Variable': name, 'Data_Type': 45, 'Num_Elements': 1, 'Rec_Vary': True,
+                       'Dim_Sizes': []}, var_data=values.astype(np.float64))
+    cdf.close()
+    return path
+
+
+def fitacf_records(n, ngates=75, stid=7, seed=0):
+    """fitacf-like records (dicts as returned by pydarn SuperDARNRead.read_fitacf)."""
+    rng = np.random.default_rng(seed)
+    records = []
+    for i in range(n):
+        nscatter = int(rng.integers(5, ngates))
+        slist = np.sort(rng.choice(ngates, nscatter, replace=False)).astype(np.int16)
+        records.append({
+            'stid': stid, 'bmnum': i % 16, 'frang': 180, 'rsep': 45,
+            'slist': slist,
+            'gflg': (rng.random(nscatter) < 0.2).astype(np.int8),
+            'v': 400. * rng.standard_normal(nscatter),
+        })
+    return records
+
+
+def write_lompe_case(case_dir, nsteps, shape, cadence_min=5, offset=0., seed=0):
+    """One Lompe-like NetCDF per time step with static lat/lon and (time, lat, lon) fields."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(case_dir, exist_ok=True)
+    lat = np.linspace(60., 72., shape[0])
+    lon = np.linspace(-165., -130., shape[1])
+    glon, glat = np.meshgrid(lon, lat)
+    paths = []
+    for i in range(nsteps):
+        t = T0 + np.timedelta64(i * cadence_min, 'm')
+        stamp = str(t).replace('T', '_').replace(':', '')
+        path = os.path.join(case_dir, f"{stamp}.nc")
+        with Dataset(path, 'w') as nc:
+            nc.createDimension('time', 1)
+            nc.createDimension('lat', shape[0])
+            nc.createDimension('lon', shape[1])
+            nc.createVariable('lat', 'f8', ('lat',))[:] = lat
+            nc.createVariable('lon', 'f8', ('lon',))[:] = lon
+            base = np.sin(np.radians(glat - 65.) * 10. + i * 0.1) * np.cos(np.radians(glon + 147.) * 5.)
+            for name, scale in (('FAC', 1.e-6), ('E_pot', 1.e4), ('Ve', 500.), ('Vn', 500.)):
+                var = nc.createVariable(name, 'f8', ('time', 'lat', 'lon'))
+                var[0] = scale * (base + offset + 0.05 * rng.standard_normal(shape))
+        paths.append(path)
+    return paths
+
+
+def build_fixtures(size, root):
+    """Generate (once) every fixture of one size below root/<size> -> dict of paths."""
+    spec = SIZES[size]
+    d = os.path.join(root, size)
+    os.makedirs(d, exist_ok=True)
+    paths = {
+        'amisr': os.path.join(d, '20230227.001_lp_3min-fitcal.h5'),
+        'tct': os.path.join(d, 'SW_EXPT_EFIA_TCT02_20230227T060000_20230228T060000_0302.cdf'),
+        'lompe_a': os.path.join(d, 'lompe', 'case_a'),
+        'lompe_b': os.path.join(d, 'lompe', 'case_b'),
+    }
+    done = os.path.join(d, '.complete')
+    if not os.path.exists(done):
+        print(f"Generating {size} fixtures in {d}")
+        write_amisr_fitted(paths['amisr'], spec['nrec'], spec['nbeams'], spec['nrange'])
+        write_tct_cdf(paths['tct'], spec['tct_samples'])
+        write_lompe_case(paths['lompe_a'], spec['lompe_steps'], spec['lompe_grid'])
+        write_lompe_case(paths['lompe_b'], spec['lompe_steps'], spec['lompe_grid'], offset=0.1, seed=1)
+        open(done, 'w').close()
+    paths['fitacf'] = fitacf_records(spec['fitacf_records'])
+    paths['spec'] = spec
+    return paths
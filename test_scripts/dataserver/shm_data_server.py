@@ -0,0 +1,451 @@
+import os
+import sys
+import json
+import time
+import fcntl
+import shutil
+import secrets
+import argparse
+import tempfile
+import threading
+from contextlib import contextmanager
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+import h5py
+import numpy as np
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+for _d in ('profiling', 'file_readers', 'swarm', 'lompe'):
+    sys.path.insert(0, os.path.join(_HERE, '..', _d))
+
+from instrumentation import span
+from read_gemini_efield_inputs import block_slices
+from h5_repacker import BEAM_PARAMS
+
+"""
+Purpose:
+    - load PFISR, Swarm and Lompe products (and any HDF5 file, e.g. the GEMINI E-field inputs) once per
+      machine instead of once per Python session
+    - every array is an .npy file in a store directory on /dev/shm (tmpfs, i.e. shared memory) when it exists,
+      otherwise in the temp directory, where the OS page cache is shared the same way after the first read.
+      Clients attach with np.load(mmap_mode='r'): no copy, no parse, any number of processes
+    - manifest.json maps product keys to their arrays (file, dtype, shape) plus source path, source mtime
+      and loader parameters; a product is reloaded only when its source changes
+    - reloads write a new generation of files and then swap the manifest entry; arrays already attached
+      by clients stay valid (the old files are unlinked, not truncated)
+    - the server process (serve) is the single writer: it preloads a JSON list of products, reloads stale
+      ones every refresh interval and answers load requests from clients over a local socket.
+      get() attaches directly when the product is fresh, asks the server otherwise, and loads in-process
+      when no server is running
+    - every server start generates a random authkey (or takes PAPER01_SHM_AUTHKEY, which must not be the
+      old default and must be at least 16 bytes) and writes it to <store>/.authkey with mode 0600; clients
+      read it from there (or from the environment variable), so only the user running the server can
+      send requests
+
+Usage:
+    python shm_data_server.py serve --preload products.json
+        products.json: [{"product": "pfisr", "source": ".../20230227.001_lp_3min-fitcal.h5"}, ...]
+
+    from shm_data_server import get
+    pfisr = get('pfisr', '.../20230227.001_lp_3min-fitcal.h5')
+    ne = pfisr['ne'][:, bidx, :]
+"""
+
+STORE_DIR = os.environ.get('PAPER01_SHM_DIR', os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else
+                                                           tempfile.gettempdir(), 'paper01_shm'))
+ADDRESS = ('localhost', int(os.environ.get('PAPER01_SHM_PORT', 50555)))
+AUTHKEY_ENV = 'PAPER01_SHM_AUTHKEY'
+INSECURE_AUTHKEYS = (b'', b'paper01')
+MIN_AUTHKEY_BYTES = 16
+REFRESH_S = 10.
+
+LOADERS = {}
+
+
+def loader(product):
+    """Register a product loader: func(source, put, **params); put(name, array or h5py dataset)."""
+    def register(func):
+        LOADERS[product] = func
+        return func
+    return register
+
+
+def _source_mtime(source):
+    """Newest mtime of a file, or of a directory and the files directly inside it."""
+    if not os.path.isdir(source):
+        return os.path.getmtime(source)
+    return max([os.path.getmtime(source)] + [e.stat().st_mtime for e in os.scandir(source) if e.is_file()])
+
+
+def _file_name(name):
+    return name.strip('/').replace('/', '__')
+
+
+class SharedStore:
+    """Directory of .npy arrays plus manifest.json; writers serialise on an flock'ed lock file."""
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        os.makedirs(root, mode=0o700, exist_ok=True)
+        self.manifest_path = os.path.join(root, 'manifest.json')
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.root, '.lock'), 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def manifest(self):
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_manifest(self, manifest):
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp, self.manifest_path)
+
+    def keys(self):
+        return list(self.manifest())
+
+    def is_fresh(self, key, source=None, params=None):
+        entry = self.manifest().get(key)
+        if entry is None:
+            return False
+        if params is not None and entry['params'] != params:
+            return False
+        src = source or entry['source']
+        return src is None or (os.path.exists(src) and _source_mtime(src) <= entry['source_mtime'])
+
+    @contextmanager
+    def writer(self, key, source=None, product=None, params=None):
+        """
+        Yield put(name, data) for one product; the manifest entry is swapped in on successful exit.
+        data is an array (copied) or an h5py dataset (streamed in chunk-aligned blocks).
+        """
+        gen = f"{time.time_ns():x}"
+        kdir = os.path.join(self.root, _file_name(key))
+        os.makedirs(kdir, exist_ok=True)
+        arrays = {}
+        mtime = _source_mtime(source) if source else None
+
+        def put(name, data):
+            if isinstance(data, h5py.Dataset):
+                shape, dtype = data.shape, data.dtype
+            else:
+                data = np.asarray(data)
+                shape, dtype = data.shape, data.dtype
+            if dtype.hasobject or dtype.kind in 'SUV':
+                return
+            fn = os.path.join(kdir, f"{_file_name(name)}.{gen}.npy")
+            out = np.lib.format.open_memmap(fn, mode='w+', dtype=dtype, shape=shape)
+            if isinstance(data, h5py.Dataset) and data.ndim > 0:
+                for sel in block_slices(shape, dtype.itemsize, data.chunks):
+                    out[sel] = data[sel]
+            else:
+                out[...] = data[()] if isinstance(data, h5py.Dataset) else data
+            out.flush()
+            del out
+            arrays[name] = {'file': os.path.relpath(fn, self.root), 'dtype': dtype.str, 'shape': list(shape)}
+
+        try:
+            yield put
+        except BaseException:
+            for info in arrays.values():
+                os.remove(os.path.join(self.root, info['file']))
+            raise
+
+        with self._locked():
+            manifest = self.manifest()
+            old = manifest.get(key, {}).get('arrays', {})
+            manifest[key] = {'product': product, 'source': source, 'source_mtime': mtime, 'params': params or {},
+                             'created': time.time(), 'arrays': arrays}
+            self._write_manifest(manifest)
+        for info in old.values():
+            try:
+                os.remove(os.path.join(self.root, info['file']))
+            except FileNotFoundError:
+                pass
+
+    def attach(self, key, names=None):
+        """Read-only memmaps of a product's arrays: {name: np.memmap}."""
+        entry = self.manifest().get(key)
+        if entry is None:
+            raise KeyError(f"{key} is not in the store ({self.root})")
+        return {name: np.load(os.path.join(self.root, info['file']), mmap_mode='r')
+                for name, info in entry['arrays'].items() if names is None or name in names}
+
+    def remove(self, key):
+        with self._locked():
+            manifest = self.manifest()
+            entry = manifest.pop(key, None)
+            self._write_manifest(manifest)
+        if entry is not None:
+            shutil.rmtree(os.path.join(self.root, _file_name(key)), ignore_errors=True)
+
+    def clear(self):
+        for key in self.keys():
+            self.remove(key)
+
+
+@loader('pfisr')
+def _load_pfisr(source, put):
+    """AMISR fitted file: geometry, UnixTime and (nrec, nbeams, nrange) Ne/Ti/Te/Vlos (+ errors)."""
+    with h5py.File(source, 'r') as h5:
+        for name, path in (('utime', 'Time/UnixTime'), ('beamcodes', 'BeamCodes'), ('altitude', 'FittedParams/Altitude'),
+                           ('range', 'FittedParams/Range'), ('glat', 'Geomag/Latitude'), ('glon', 'Geomag/Longitude'),
+                           ('galt', 'Geomag/Altitude'), ('site_lat', 'Site/Latitude'), ('site_lon', 'Site/Longitude')):
+            if path in h5:
+                put(name, h5[path])
+        for param, (path, idx) in BEAM_PARAMS.items():
+            if f'Beams/{param}' in h5:
+                # h5_repacker layout (beam, record, range) -> record-major like the original files
+                put(param, np.ascontiguousarray(np.transpose(h5[f'Beams/{param}'][()], (1, 0, 2))))
+            elif path in h5:
+                put(param, h5[path][()] if idx is None else h5[path][:, :, :, idx[0], idx[1]])
+
+
+@loader('swarm_tct')
+def _load_swarm_tct(source, put, start, end):
+    from swarm_pfisr_los_projection import load_swarm_tct
+    for name, values in load_swarm_tct(source, np.datetime64(start), np.datetime64(end)).items():
+        put(name, values)
+
+
+@loader('swarm_mag')
+def _load_swarm_mag(source, put, sat, start, end):
+    from swarm_mag_loader import load_mag
+    for name, values in load_mag(source, sat, start, end).items():
+        put(name, values)
+
+
+@loader('lompe')
+def _load_lompe(source, put, variables=None):
+    """Lompe case directory: times, static grid variables and (time, ...) stacks of the other variables."""
+    from lompe_timeseries_loader import LompeCaseDataset
+    ds = LompeCaseDataset(source)
+    put('times', ds.times)
+    for name, info in ds.variables.items():
+        if variables is not None and name not in variables:
+            continue
+        if ds.time_dim in info['dims']:
+            put(name, ds.read(name)[1])
+        else:
+            put(name, np.ma.filled(ds.grid['static'][name], np.nan))
+
+
+@loader('h5')
+def _load_h5(source, put, datasets=None):
+    """Every (or the listed) numeric dataset of an HDF5 file, streamed block by block."""
+    with h5py.File(source, 'r') as h5:
+        def visitor(name, obj):
+            if isinstance(obj, h5py.Dataset) and (datasets is None or name in datasets):
+                put(name, obj)
+        h5.visititems(visitor)
+
+
+def product_key(product, source, key=None):
+    return key or f"{product}:{os.path.abspath(source)}"
+
+
+def load(product, source, key=None, store=None, force=False, **params):
+    """Load one product into the store unless it is already fresh. Returns its key."""
+    store = store or SharedStore()
+    key = product_key(product, source, key)
+    if not force and store.is_fresh(key, source, params):
+        return key
+    with span('shm_load', product=product, file=os.path.basename(source.rstrip('/'))):
+        with store.writer(key, source, product, params) as put:
+            LOADERS[product](source, put, **params)
+    return key
+
+
+def authkey_path(root=STORE_DIR):
+    return os.path.join(root, '.authkey')
+
+
+def check_authkey(authkey):
+    if authkey in INSECURE_AUTHKEYS or len(authkey) < MIN_AUTHKEY_BYTES:
+        raise ValueError(f"Refusing to serve with the default or a short authkey (< {MIN_AUTHKEY_BYTES} bytes); "
+                         f"unset {AUTHKEY_ENV} to use a random per-server key")
+    return authkey
+
+
+def write_authkey(authkey, root=STORE_DIR):
+    """Write the server key to <root>/.authkey, readable by the owner only."""
+    path = authkey_path(root)
+    fd = os.open(path + '.tmp', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        os.fchmod(fd, 0o600)
+        os.write(fd, authkey.hex().encode())
+    finally:
+        os.close(fd)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def read_authkey(root=STORE_DIR):
+    """Client side key: PAPER01_SHM_AUTHKEY, else <root>/.authkey. ConnectionRefusedError if no server wrote one."""
+    if os.environ.get(AUTHKEY_ENV):
+        return os.environ[AUTHKEY_ENV].encode()
+    path = authkey_path(root)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        raise ConnectionRefusedError(f"No server key in {root} (server not running)")
+    if st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError(f"{path} must be owned by this user with mode 0600")
+    with open(path, 'r') as f:
+        return bytes.fromhex(f.read().strip())
+
+
+def request(product, source, key=None, address=ADDRESS, authkey=None, store=None, **params):
+    """Ask a running server to load a product. Raises ConnectionRefusedError when none is running."""
+    if authkey is None:
+        authkey = read_authkey((store or SharedStore()).root)
+    with Client(address, authkey=authkey) as conn:
+        conn.send(('load', product, source, key, params))
+        status, value = conn.recv()
+    if status != 'ok':
+        raise RuntimeError(f"Server failed to load {product} from {source}: {value}")
+    return value
+
+
+def get(product, source, key=None, store=None, names=None, **params):
+    """Zero-copy {name: memmap} of a product: attach if fresh, else via the server, else load in-process."""
+    store = store or SharedStore()
+    key = product_key(product, source, key)
+    if not store.is_fresh(key, source, params):
+        try:
+            request(product, source, key, store=store, **params)
+        except ConnectionRefusedError:
+            load(product, source, key, store, **params)
+    with span('shm_attach', product=product):
+        return store.attach(key, names)
+
+
+def serve(store=None, address=ADDRESS, authkey=None, preload=(), refresh_s=REFRESH_S):
+    """
+    Preload products, then answer load requests and reload stale products until a 'stop' request.
+    authkey defaults to PAPER01_SHM_AUTHKEY or, if that is unset, a random key for this server.
+    """
+    store = store or SharedStore()
+    if authkey is None:
+        env = os.environ.get(AUTHKEY_ENV)
+        authkey = env.encode() if env else secrets.token_bytes(32)
+    check_authkey(authkey)
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def _load(spec):
+        spec = dict(spec)
+        with lock:
+            return load(spec.pop('product'), spec.pop('source'), spec.pop('key', None), store, **spec)
+
+    for spec in preload:
+        print(f"Loading {spec['product']} from {spec['source']}")
+        _load(spec)
+
+    def refresher():
+        while not stop.wait(refresh_s):
+            for key, entry in store.manifest().items():
+                if entry['source'] and os.path.exists(entry['source']) and not store.is_fresh(key):
+                    print(f"Reloading {key}")
+                    try:
+                        _load({'product': entry['product'], 'source': entry['source'], 'key': key, **entry['params']})
+                    except Exception as e:
+                        print(f"Reload of {key} failed: {e!r}")
+
+    threading.Thread(target=refresher, daemon=True).start()
+    with Listener(address, authkey=authkey) as listener:
+        key_file = write_authkey(authkey, store.root)
+        print(f"Serving {store.root} on {address[0]}:{address[1]} (key in {key_file})")
+        try:
+            _accept_loop(listener, store, _load, stop)
+        finally:
+            os.remove(key_file)
+
+
+def _accept_loop(listener, store, load_spec, stop):
+    while not stop.is_set():
+        try:
+            conn = listener.accept()
+        except AuthenticationError:
+            print("Rejected a connection with a wrong authkey")
+            continue
+        with conn:
+            try:
+                msg = conn.recv()
+                if not isinstance(msg, tuple) or not msg:
+                    raise ValueError(f"malformed request {msg!r}")
+                if msg[0] == 'load':
+                    _, product, source, key, params = msg
+                    conn.send(('ok', load_spec({'product': product, 'source': source, 'key': key, **params})))
+                elif msg[0] == 'list':
+                    conn.send(('ok', store.manifest()))
+                elif msg[0] == 'stop':
+                    stop.set()
+                    conn.send(('ok', None))
+                else:
+                    conn.send(('error', f"unknown request {msg[0]!r}"))
+            except (EOFError, OSError) as e:
+                # Client went away before (or while) the request was handled; nobody to reply to
+                print(f"Dropped a connection: {e!r}")
+            except Exception as e:
+                print(f"Request failed: {e!r}")
+                try:
+                    conn.send(('error', repr(e)))
+                except OSError:
+                    pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Shared-memory data server for PFISR / Swarm / Lompe products')
+    parser.add_argument('--store', default=STORE_DIR)
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p = sub.add_parser('serve')
+    p.add_argument('--preload', help='JSON list of {"product", "source", ...loader params}')
+    p.add_argument('--refresh', type=float, default=REFRESH_S, help='seconds between staleness checks')
+    p = sub.add_parser('load')
+    p.add_argument('product', choices=list(LOADERS))
+    p.add_argument('source')
+    p.add_argument('--params', default='{}', help='loader parameters as JSON')
+    p.add_argument('--force', action='store_true')
+    sub.add_parser('list')
+    sub.add_parser('stop')
+    p = sub.add_parser('clear')
+    p.add_argument('keys', nargs='*', help='keys to remove (default: everything)')
+    args = parser.parse_args()
+
+    store = SharedStore(args.store)
+    if args.cmd == 'serve':
+        preload = []
+        if args.preload:
+            with open(args.preload, 'r') as f:
+                preload = json.load(f)
+        serve(store, preload=preload, refresh_s=args.refresh)
+    elif args.cmd == 'load':
+        key = load(args.product, args.source, store=store, force=args.force, **json.loads(args.params))
+        print(key)
+    elif args.cmd == 'list':
+        for key, entry in store.manifest().items():
+            nbytes = sum(np.dtype(a['dtype']).itemsize * int(np.prod(a['shape'])) for a in entry['arrays'].values())
+            print(f"{key}  ({len(entry['arrays'])} arrays, {nbytes / 1024.**2:.1f} MB, "
+                  f"{'fresh' if store.is_fresh(key) else 'stale'})")
+    elif args.cmd == 'stop':
+        with Client(ADDRESS, authkey=read_authkey(store.root)) as conn:
+            conn.send(('stop',))
+            print(conn.recv())
+    elif args.cmd == 'clear':
+        for key in args.keys or store.keys():
+            store.remove(key)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import h5py
+import numpy as np
+
+"""
+Purpose:
+    - rewrite fitted PFISR files (*-fitcal.h5), VVELS outputs and synthetic AMISR files into a layout
+      matching our access pattern, per-beam time series (Fits[:, bidx, :, 0, 1]):
+        /Beams/<param>          (nbeams, nrec, nrange)  ne, dne, ti, dti, te, dte, vlos, dvlos
+                                chunks (1, time block, nrange): one beam's time series is a few chunks
+        /FittedParams/Fits ...  kept, rechunked to (time block, 1, nrange, nion, nparam)
+        other datasets          copied; large datasets with a leading record axis (VVELS Velocity, ...)
+                                are rechunked to (time block, 1, ...)
+    - compression: blosc/lz4 through hdf5plugin if installed, otherwise lzf (or gzip / none on request)
+    - the source is streamed in contiguous time blocks, so the original chunking is read in its natural order
+    - benchmark() compares per-beam read throughput of the original and repacked files, cold (page cache
+      dropped) and warm separately, alternating the read order
+"""
+
+BEAM_PARAMS = {
+    'ne': ('FittedParams/Ne', None),
+    'dne': ('FittedParams/dNe', None),
+    'ti': ('FittedParams/Fits', (0, 1)),
+    'dti': ('FittedParams/Errors', (0, 1)),
+    'te': ('FittedParams/Fits', (-1, 1)),
+    'dte': ('FittedParams/Errors', (-1, 1)),
+    'vlos': ('FittedParams/Fits', (0, 3)),
+    'dvlos': ('FittedParams/Errors', (0, 3)),
+}
+TIME_BLOCK = 256
+RECHUNK_MIN_BYTES = 1 << 20
+
+
+def compression_options(compression='auto'):
+    """h5py dataset keywords for 'auto' (blosc/lz4, falling back to lzf), 'blosc', 'lzf', 'gzip' or 'none'."""
+    if compression in ('auto', 'blosc'):
+        try:
+            import hdf5plugin
+            return dict(hdf5plugin.Blosc(cname='lz4', clevel=5, shuffle=hdf5plugin.Blosc.SHUFFLE))
+        except ImportError:
+            if compression == 'blosc':
+                raise
+            return {'compression': 'lzf', 'shuffle': True}
+    if compression == 'lzf':
+        return {'compression': 'lzf', 'shuffle': True}
+    if compression == 'gzip':
+        return {'compression': 'gzip', 'compression_opts': 4, 'shuffle': True}
+    return {}
+
+
+def _record_count(src):
+    if 'Time/UnixTime' in src:
+        return src['Time/UnixTime'].shape[0]
+    return None
+
+
+def _blocked_copy(src_ds, dst_ds, axis_block):
+    for t0 in range(0, src_ds.shape[0], axis_block):
+        dst_ds[t0:t0 + axis_block] = src_ds[t0:t0 + axis_block]
+
+
+def repack(src_path, dst_path=None, compression='auto', time_block=TIME_BLOCK, keep_fits=True):
+    """Rewrite one file into the per-beam layout. Returns the output path."""
+    if dst_path is None:
+        dst_path = os.path.splitext(src_path)[0] + '.repacked.h5'
+    comp = compression_options(compression)
+
+    with h5py.File(src_path, 'r') as src, h5py.File(dst_path + '.tmp', 'w') as dst:
+        nrec = _record_count(src)
+        tb = min(time_block, nrec) if nrec else time_block
+        is_fitted = 'FittedParams/Fits' in src
+
+        # Everything except the big fitted arrays: copy, rechunking large record-major datasets
+        def copy_item(name, obj):
+            if isinstance(obj, h5py.Group):
+                grp = dst.require_group(name)
+                grp.attrs.update(obj.attrs)
+                return
+            if is_fitted and name in ('FittedParams/Fits', 'FittedParams/Errors', 'FittedParams/Ne',
+                                      'FittedParams/dNe'):
+                return
+            if nrec and obj.ndim >= 2 and obj.shape[0] == nrec and obj.nbytes >= RECHUNK_MIN_BYTES:
+                chunks = (tb,) + tuple(1 if i == 0 and obj.ndim >= 3 else n for i, n in enumerate(obj.shape[1:]))
+                ds = dst.create_dataset(name, shape=obj.shape, dtype=obj.dtype, chunks=chunks, **comp)
+                _blocked_copy(obj, ds, tb)
+                ds.attrs.update(obj.attrs)
+            else:
+                src.copy(obj, dst, name=name)
+
+        dst.attrs.update(src.attrs)
+        src.visititems(copy_item)
+
+        if is_fitted:
+            nbeams, nrange = src['FittedParams/Fits'].shape[1:3]
+            params = {p: spec for p, spec in BEAM_PARAMS.items() if spec[0] in src}
+            beams = {p: dst.create_dataset(f'Beams/{p}', shape=(nbeams, nrec, nrange), dtype='f4',
+                                           chunks=(1, tb, nrange), **comp) for p in params}
+            full = {}
+            if keep_fits:
+                for name in ('FittedParams/Fits', 'FittedParams/Errors', 'FittedParams/Ne', 'FittedParams/dNe'):
+                    if name in src:
+                        s = src[name]
+                        full[name] = dst.create_dataset(name, shape=s.shape, dtype=s.dtype,
+                                                        chunks=(tb, 1) + s.shape[2:], **comp)
+                        full[name].attrs.update(s.attrs)
+
+            # One contiguous time block of each source array at a time, fanned out to every beam
+            for t0 in range(0, nrec, tb):
+                t1 = min(t0 + tb, nrec)
+                blocks = {name: src[name][t0:t1] for name in {spec[0] for spec in params.values()} | set(full)}
+                for name, ds in full.items():
+                    ds[t0:t1] = blocks[name]
+                for p, (name, idx) in params.items():
+                    data = blocks[name] if idx is None else blocks[name][:, :, :, idx[0], idx[1]]
+                    beams[p][:, t0:t1, :] = np.transpose(data, (1, 0, 2))
+            dst['Beams'].attrs['layout'] = '(beam, record, range)'
+            dst['Beams'].attrs['source'] = os.path.basename(src_path)
+
+    os.replace(dst_path + '.tmp', dst_path)
+    return dst_path
+
+
+def read_beam(path, param, beam):
+    """(nrec, nrange) time series of one parameter and beam index from a repacked or original file."""
+    with h5py.File(path, 'r') as h5:
+        if f'Beams/{param}' in h5:
+            return h5[f'Beams/{param}'][beam]
+        name, idx = BEAM_PARAMS[param]
+        if idx is None:
+            return h5[name][:, beam, :]
+        return h5[name][:, beam, :, idx[0], idx[1]]
+
+
+def evict(path):
+    """Drop a file from the OS page cache (Linux / posix_fadvise). Returns False where that is not available."""
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)  # dirty pages (a file that was just written) are not dropped
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return True
+
+
+def _time_reads(path, params, beams):
+    with h5py.File(path, 'r') as h5:
+        nbeams = h5['BeamCodes'].shape[0]
+    sel = range(nbeams) if beams is None else beams
+    nbytes, t0 = 0, time.perf_counter()
+    for p in params:
+        for b in sel:
+            nbytes += read_beam(path, p, b).nbytes
+    return time.perf_counter() - t0, nbytes
+
+
+def benchmark(original, repacked, params=('ne', 'ti', 'te', 'vlos'), beams=None, repeat=3):
+    """
+    Per-beam read throughput (MB/s) of original and repacked files over params x beams.
+    Cold (both files evicted from the page cache before every measurement) and warm (both read once
+    beforehand) are measured separately; the read order alternates between repeats and the median is
+    reported. 'cold' is None where the page cache cannot be dropped.
+    """
+    files = {'original': original, 'repacked': repacked}
+    can_evict = evict(original) and evict(repacked)
+    results = {}
+    for mode in ('cold', 'warm') if can_evict else ('warm',):
+        times = {label: [] for label in files}
+        nbytes = {}
+        if mode == 'warm':
+            for path in files.values():
+                _time_reads(path, params, beams)
+        for r in range(repeat):
+            order = list(files) if r % 2 == 0 else list(files)[::-1]
+            for label in order:
+                if mode == 'cold':
+                    for path in files.values():
+                        evict(path)
+                elapsed, nbytes[label] = _time_reads(files[label], params, beams)
+                times[label].append(elapsed)
+        out = {}
+        for label, t in times.items():
+            med = float(np.median(t))
+            out[label] = {'seconds': med, 'MB': nbytes[label] / 1024.**2, 'MB_per_s': nbytes[label] / 1024.**2 / med}
+        out['speedup'] = out['original']['seconds'] / out['repacked']['seconds']
+        results[mode] = out
+    results.setdefault('cold', None)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Repack fitted / VVELS / synthetic HDF5 files for per-beam reads')
+    parser.add_argument('paths', nargs='+', help='files or directories (*-fitcal.h5, *_vvels.h5, *.h5)')
+    parser.add_argument('--outdir', help='write <name>.repacked.h5 here instead of next to the source')
+    parser.add_argument('--compression', default='auto', choices=['auto', 'blosc', 'lzf', 'gzip', 'none'])
+    parser.add_argument('--no-fits', action='store_true', help='drop the full FittedParams arrays')
+    parser.add_argument('--benchmark', action='store_true', help='compare per-beam read throughput')
+    args = parser.parse_args()
+
+    files = []
+    for p in args.paths:
+        files += sorted(glob.glob(os.path.join(p, '*.h5'))) if os.path.isdir(p) else [p]
+    files = [f for f in files if not f.endswith('.repacked.h5')]
+    if not files:
+        print("No HDF5 files found.")
+        sys.exit(1)
+
+    for fn in files:
+        dst = None
+        if args.outdir:
+            os.makedirs(args.outdir, exist_ok=True)
+            dst = os.path.join(args.outdir, os.path.splitext(os.path.basename(fn))[0] + '.repacked.h5')
+        t0 = time.time()
+        dst = repack(fn, dst, args.compression, keep_fits=not args.no_fits)
+        print(f"{os.path.basename(fn)}: {os.path.getsize(fn) / 1024.**2:.1f} MB -> "
+              f"{os.path.getsize(dst) / 1024.**2:.1f} MB in {time.time() - t0:.1f} s")
+
+        if args.benchmark:
+            with h5py.File(fn, 'r') as h5:
+                fitted = 'FittedParams/Fits' in h5
+            if not fitted:
+                continue
+            for mode, r in benchmark(fn, dst).items():
+                if r is None:
+                    print(f"  per-beam reads ({mode}): page cache cannot be dropped on this platform")
+                    continue
+                print(f"  per-beam reads ({mode}): original {r['original']['MB_per_s']:.0f} MB/s, "
+                      f"repacked {r['repacked']['MB_per_s']:.0f} MB/s ({r['speedup']:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+import os
+import re
+import sys
+import json
+import sqlite3
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+"""
+Purpose:
+    - walk data archives (sop23_data/, events/) and extract the structure of every
+      HDF5 (.h5), NetCDF (.nc) and CDF (.cdf) file in a process pool:
+        dataset names, shapes, dtypes, attributes, time coverage, integration time (from the filename,
+        else the median record length in Time/UnixTime)
+    - store everything in a SQLite index so questions like
+        "which files contain FittedParams/Fits with 3-minute integration covering 2023-03-22T09Z"
+      are answered without opening any data file
+    - files whose size and mtime are unchanged since the last crawl are not re-read
+
+Usage:
+    python metadata_crawler.py crawl index.sqlite /Users/clevenger/Projects/paper01/sop23_data ...
+    python metadata_crawler.py query index.sqlite --dataset FittedParams/Fits --integration 180 \
+        --time 2023-03-22T09:00:00
+"""
+
+EXTENSIONS = {'.h5': 'hdf5', '.hdf5': 'hdf5', '.nc': 'netcdf', '.cdf': 'cdf'}
+
+# CDF_EPOCH is milliseconds since 0000-01-01
+CDF_EPOCH_UNIX_OFFSET_MS = 62167219200000.
+# Integration times derived from record timestamps are not exact (179.98 s for a 3-minute file)
+INTEGRATION_TOL_S = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE,
+    format TEXT,
+    size INTEGER,
+    mtime REAL,
+    integration_s REAL,
+    time_start REAL,
+    time_end REAL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS datasets (
+    file_id INTEGER REFERENCES files(id) ON DELETE CASCADE,
+    name TEXT,
+    shape TEXT,
+    dtype TEXT
+);
+CREATE TABLE IF NOT EXISTS attributes (
+    file_id INTEGER REFERENCES files(id) ON DELETE CASCADE,
+    object TEXT,
+    key TEXT,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_datasets_name ON datasets(name);
+CREATE INDEX IF NOT EXISTS idx_files_time ON files(time_start, time_end);
+"""
+
+
+def _attr_str(val, maxlen=500):
+    if isinstance(val, bytes):
+        val = val.decode(errors='replace')
+    elif isinstance(val, np.ndarray):
+        val = val.tolist()
+    return str(val)[:maxlen]
+
+
+def integration_from_name(path):
+    """Integration time in seconds from AMISR-style filenames (..._lp_3min-fitcal.h5, ..._30sec-...)."""
+    m = re.search(r'_(\d+)(min|sec|s)[-_.]', os.path.basename(path))
+    if m is None:
+        return None
+    return float(m.group(1)) * (60. if m.group(2) == 'min' else 1.)
+
+
+def _scan_hdf5(path):
+    import h5py
+    datasets, attrs, times, integration = [], [], None, None
+    with h5py.File(path, 'r') as h5:
+        def visitor(name, obj):
+            if isinstance(obj, h5py.Dataset):
+                datasets.append((name, str(obj.shape), str(obj.dtype)))
+            for key, val in obj.attrs.items():
+                attrs.append((name, key, _attr_str(val)))
+        h5.visititems(visitor)
+        for key, val in h5.attrs.items():
+            attrs.append(('/', key, _attr_str(val)))
+
+        if 'Time/UnixTime' in h5:
+            t = h5['Time/UnixTime']
+            if t.shape[0] > 0:
+                first, last = np.ravel(t[0]), np.ravel(t[-1])
+                times = (float(first[0]), float(last[-1]))
+            # Integration time from the records themselves, for files whose names do not carry it
+            utime = t[...]
+            if utime.ndim == 2 and utime.shape[1] >= 2 and utime.shape[0] > 0:
+                integration = float(np.median(utime[:, -1] - utime[:, 0]))
+            elif utime.shape[0] > 1:
+                integration = float(np.median(np.diff(np.ravel(utime) if utime.ndim == 1 else utime[:, 0])))
+    return datasets, attrs, times, integration
+
+
+def _scan_netcdf(path):
+    from netCDF4 import Dataset, num2date
+    datasets, attrs, times = [], [], None
+    with Dataset(path, 'r') as nc:
+        for attr in nc.ncattrs():
+            attrs.append(('/', attr, _attr_str(nc.getncattr(attr))))
+        for name, var in nc.variables.items():
+            datasets.append((name, str(var.shape), str(var.dtype)))
+            for attr in var.ncattrs():
+                attrs.append((name, attr, _attr_str(var.getncattr(attr))))
+
+        if 'time' in nc.variables and nc.variables['time'].size > 0:
+            tvar = nc.variables['time']
+            tv = np.ravel(tvar[...])
+            if hasattr(tvar, 'units'):
+                dts = num2date([tv.min(), tv.max()], tvar.units, only_use_cftime_datetimes=False)
+                times = tuple(float(np.datetime64(d, 's').astype(np.int64)) for d in dts)
+
+    if times is None:
+        # Lompe outputs carry their time in the filename (2023-02-27_083500.nc)
+        m = re.match(r'(\d{4}-\d{2}-\d{2})_(\d{2})(\d{2})(\d{2})', os.path.basename(path))
+        if m:
+            t = float(np.datetime64(f"{m.group(1)}T{m.group(2)}:{m.group(3)}:{m.group(4)}", 's').astype(np.int64))
+            times = (t, t)
+    return datasets, attrs, times, None
+
+
+def _scan_cdf(path):
+    import cdflib
+    datasets, attrs, times = [], [], None
+    cdf = cdflib.CDF(path)
+    for key, val in cdf.globalattsget().items():
+        attrs.append(('/', key, _attr_str(val)))
+    info = cdf.cdf_info()
+    for name in list(info.zVariables) + list(info.rVariables):
+        vinfo = cdf.varinq(name)
+        nrec = vinfo.Last_Rec + 1
+        shape = (nrec,) + tuple(vinfo.Dim_Sizes)
+        datasets.append((name, str(shape), vinfo.Data_Type_Description))
+        for key, val in cdf.varattsget(name).items():
+            attrs.append((name, key, _attr_str(val)))
+
+    names = [d[0] for d in datasets]
+    if 'Timestamp' in names:
+        nrec = cdf.varinq('Timestamp').Last_Rec + 1
+        if nrec > 0:
+            first = cdf.varget('Timestamp', startrec=0, endrec=0)
+            last = cdf.varget('Timestamp', startrec=nrec - 1, endrec=nrec - 1)
+            times = tuple(float(np.ravel(t)[0]) / 1000. - CDF_EPOCH_UNIX_OFFSET_MS / 1000. for t in (first, last))
+    return datasets, attrs, times, None
+
+
+SCANNERS = {'hdf5': _scan_hdf5, 'netcdf': _scan_netcdf, 'cdf': _scan_cdf}
+
+
+def scan_file(path):
+    """
+    Extract metadata for one file (runs in a worker process). Any failure, including the file
+    disappearing during the crawl, is recorded in 'error' instead of raising.
+    """
+    fmt = EXTENSIONS[os.path.splitext(path)[1].lower()]
+    result = {'path': path, 'format': fmt, 'size': None, 'mtime': None,
+              'integration_s': integration_from_name(path), 'datasets': [], 'attrs': [],
+              'times': None, 'error': None}
+    try:
+        st = os.stat(path)
+        result['size'], result['mtime'] = st.st_size, st.st_mtime
+        result['datasets'], result['attrs'], result['times'], integration = SCANNERS[fmt](path)
+        if result['integration_s'] is None:
+            result['integration_s'] = integration
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def find_files(roots):
+    for root in roots:
+        for dirpath, _, filenames in os.walk(root):
+            for fn in filenames:
+                if os.path.splitext(fn)[1].lower() in EXTENSIONS:
+                    yield os.path.join(dirpath, fn)
+
+
+def open_index(db_path):
+    con = sqlite3.connect(db_path)
+    con.execute('PRAGMA foreign_keys = ON')
+    con.executescript(SCHEMA)
+    return con
+
+
+def _store(con, r):
+    con.execute('DELETE FROM files WHERE path = ?', (r['path'],))
+    t0, t1 = r['times'] if r['times'] is not None else (None, None)
+    cur = con.execute(
+        'INSERT INTO files (path, format, size, mtime, integration_s, time_start, time_end, error) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        (r['path'], r['format'], r['size'], r['mtime'], r['integration_s'], t0, t1, r['error']))
+    fid = cur.lastrowid
+    con.executemany('INSERT INTO datasets VALUES (?, ?, ?, ?)', [(fid,) + d for d in r['datasets']])
+    con.executemany('INSERT INTO attributes VALUES (?, ?, ?, ?)', [(fid,) + a for a in r['attrs']])
+
+
+def crawl(db_path, roots, max_workers=None):
+    """Index every supported file below roots; unchanged files are skipped."""
+    con = open_index(db_path)
+    known = {p: (s, m) for p, s, m in con.execute('SELECT path, size, mtime FROM files')}
+
+    todo = []
+    for path in find_files(roots):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if known.get(path) != (st.st_size, st.st_mtime):
+            todo.append(path)
+    print(f"{len(todo)} new or modified files to index")
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for i, r in enumerate(pool.map(scan_file, todo, chunksize=8)):
+            _store(con, r)
+            if r['error']:
+                print(f"  Error reading {r['path']}: {r['error']}")
+            if i % 100 == 99:
+                con.commit()
+    con.commit()
+    con.close()
+
+
+def query(db_path, dataset=None, time=None, integration=None, fmt=None, name_like=None):
+    """Return paths of indexed files matching all given criteria (integration within INTEGRATION_TOL_S)."""
+    sql = 'SELECT DISTINCT f.path FROM files f'
+    where, args = [], []
+    if dataset is not None:
+        sql += ' JOIN datasets d ON d.file_id = f.id'
+        where.append('(d.name = ? OR d.name = ?)')
+        args += [dataset, dataset.lstrip('/')]
+    if time is not None:
+        t = float(np.datetime64(time, 's').astype(np.int64))
+        where.append('f.time_start <= ? AND f.time_end >= ?')
+        args += [t, t]
+    if integration is not None:
+        where.append(f'ABS(f.integration_s - ?) < {INTEGRATION_TOL_S}')
+        args.append(float(integration))
+    if fmt is not None:
+        where.append('f.format = ?')
+        args.append(fmt)
+    if name_like is not None:
+        where.append('f.path LIKE ?')
+        args.append(f'%{name_like}%')
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+
+    con = open_index(db_path)
+    paths = [row[0] for row in con.execute(sql + ' ORDER BY f.path', args)]
+    con.close()
+    return paths
+
+
+def describe(db_path, path):
+    """Datasets and attributes of one indexed file, as stored in the index."""
+    con = open_index(db_path)
+    row = con.execute('SELECT id, format, time_start, time_end, integration_s FROM files WHERE path = ?',
+                      (path,)).fetchone()
+    if row is None:
+        con.close()
+        raise KeyError(f"{path} is not in {db_path}")
+    fid = row[0]
+    out = {
+        'format': row[1],
+        'time_coverage': [None if t is None else str(np.datetime64(int(t), 's')) for t in row[2:4]],
+        'integration_s': row[4],
+        'datasets': [list(r) for r in con.execute('SELECT name, shape, dtype FROM datasets WHERE file_id = ?', (fid,))],
+        'attributes': [list(r) for r in con.execute('SELECT object, key, value FROM attributes WHERE file_id = ?', (fid,))],
+    }
+    con.close()
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crawl and query HDF5/NetCDF/CDF metadata.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('crawl')
+    p.add_argument('db')
+    p.add_argument('roots', nargs='+')
+    p.add_argument('--workers', type=int, default=None)
+
+    p = sub.add_parser('query')
+    p.add_argument('db')
+    p.add_argument('--dataset')
+    p.add_argument('--time', help='e.g. 2023-03-22T09:00:00')
+    p.add_argument('--integration', type=float, help='integration time in seconds')
+    p.add_argument('--format', choices=sorted(set(EXTENSIONS.values())))
+    p.add_argument('--name')
+
+    p = sub.add_parser('describe')
+    p.add_argument('db')
+    p.add_argument('path')
+
+    args = parser.parse_args()
+    if args.command == 'crawl':
+        crawl(args.db, args.roots, max_workers=args.workers)
+    elif args.command == 'query':
+        for path in query(args.db, dataset=args.dataset, time=args.time, integration=args.integration,
+                          fmt=args.format, name_like=args.name):
+            print(path)
+    else:
+        try:
+            print(json.dumps(describe(args.db, args.path), indent=1))
+        except KeyError as e:
+            print(e)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import sys
 from netCDF4 import Dataset
 
 def read_nc_headers(nc_file):
@@ -21,7 +22,10 @@ def read_nc_headers(nc_file):
                 print(f"    {attr}: {var.getncattr(attr)}")
 
 if __name__ == "__main__":
-    nc_file = input("Enter the full path to the NetCDF file: ").strip()
+    if len(sys.argv) > 1:
+        nc_file = sys.argv[1]
+    else:
+        nc_file = input("Enter the full path to the NetCDF file: ").strip()
     try:
         read_nc_headers(nc_file)
     except FileNotFoundError:
@@ -1,61 +1,181 @@
+import os
 import sys
+import glob
+import json
 import h5py
 import numpy as np
 
+# Target size of one streamed block; datasets are never read whole
+BLOCK_BYTES = 64 * 1024**2
+
 
 def collect_datasets(h5file):
-    """Return dict of dataset_name -> dataset object"""
+    """Return dict of dataset_name -> (shape, dtype, chunks); no dataset handles are kept open"""
     datasets = {}
 
     def visitor(name, obj):
         if isinstance(obj, h5py.Dataset):
-            datasets[name] = obj
+            datasets[name] = {'shape': obj.shape, 'dtype': obj.dtype, 'chunks': obj.chunks}
 
     h5file.visititems(visitor)
     return datasets
 
 
-def print_dataset(name, dset):
-    data = dset[...]
+def block_slices(shape, itemsize, chunks=None, block_bytes=BLOCK_BYTES):
+    """
+    Index tuples (one slice per axis) tiling an array of the given shape in blocks of at most about
+    block_bytes. Blocks run along axis 0, aligned to whole chunks where a chunk fits in the budget; if a
+    single index along an axis is already larger than block_bytes, that axis is taken one index at a
+    time and the next axis is split instead.
+    """
+    def split(axis, prefix):
+        sub_bytes = int(np.prod(shape[axis + 1:])) * itemsize
+        if sub_bytes > block_bytes and axis < len(shape) - 1:
+            for i in range(shape[axis]):
+                yield from split(axis + 1, prefix + (slice(i, i + 1),))
+            return
+        rows = max(1, block_bytes // max(1, sub_bytes))
+        if chunks is not None and rows >= chunks[axis]:
+            rows -= rows % chunks[axis]
+        for start in range(0, shape[axis], rows):
+            yield prefix + (slice(start, start + rows),) + (slice(None),) * (len(shape) - axis - 1)
+
+    if len(shape) == 0:
+        yield ()
+        return
+    yield from split(0, ())
+
+
+def iter_blocks(dset, block_bytes=BLOCK_BYTES):
+    """Yield blocks of dset of at most about block_bytes each (see block_slices)."""
+    for sel in block_slices(dset.shape, dset.dtype.itemsize, dset.chunks, block_bytes):
+        yield dset[sel] if sel else dset[()]
+
+
+def stream_stats(dset, block_bytes=BLOCK_BYTES):
+    """Min/max/mean/NaN-count of a numeric dataset, computed block by block."""
+    vmin, vmax = np.inf, -np.inf
+    total, count, nans = 0., 0, 0
+    for block in iter_blocks(dset, block_bytes):
+        block = np.asarray(block, dtype=np.float64)
+        finite = np.isfinite(block)
+        nans += int(np.isnan(block).sum())
+        if finite.any():
+            vals = block[finite]
+            vmin = min(vmin, vals.min())
+            vmax = max(vmax, vals.max())
+            total += vals.sum()
+            count += vals.size
+    return {
+        'min': float(vmin) if count else None,
+        'max': float(vmax) if count else None,
+        'mean': float(total / count) if count else None,
+        'nan_count': nans,
+    }
+
+
+def center_slice(dset, half=2):
+    """Read only the centre (2*half+1)^2 hyperslab of the last two axes (first index of any others)."""
+    if dset.ndim == 0:
+        return dset[()]
+    if dset.ndim == 1:
+        c = dset.shape[0] // 2
+        return dset[max(0, c - half):c + half + 1]
+    nx, ny = dset.shape[-2:]
+    cx, cy = nx // 2, ny // 2
+    lead = (0,) * (dset.ndim - 2)
+    return dset[lead + (slice(max(0, cx - half), cx + half + 1), slice(max(0, cy - half), cy + half + 1))]
+
+
+def _summary_path(filename):
+    return filename + '.summary.json'
+
+
+def scan_file(filename, refresh=False):
+    """
+    Summary (shape, dtype, streaming stats) of every dataset in filename. The summary is cached
+    next to the file on first scan and reused until the file changes.
+    """
+    cache = _summary_path(filename)
+    mtime = os.path.getmtime(filename)
+    if not refresh and os.path.exists(cache):
+        with open(cache, 'r') as f:
+            summary = json.load(f)
+        if summary.get('mtime') == mtime:
+            return summary['datasets']
+
+    datasets = {}
+    with h5py.File(filename, 'r') as h5:
+        for name, info in collect_datasets(h5).items():
+            entry = {'shape': list(info['shape']), 'dtype': str(info['dtype'])}
+            if np.issubdtype(info['dtype'], np.number):
+                entry.update(stream_stats(h5[name]))
+            datasets[name] = entry
+
+    try:
+        with open(cache, 'w') as f:
+            json.dump({'mtime': mtime, 'datasets': datasets}, f, indent=1)
+    except OSError as e:
+        print(f"Could not write summary cache {cache}: {e}")
+    return datasets
+
 
+def print_dataset(name, dset, summary=None):
     print(f"\n{name}")
     print("-" * len(name))
-    print(f"shape = {data.shape}")
-    print(f"dtype = {data.dtype}")
+    print(f"shape = {dset.shape}")
+    print(f"dtype = {dset.dtype}")
 
-    if np.issubdtype(data.dtype, np.number):
-        print(f"min   = {np.nanmin(data)}")
-        print(f"max   = {np.nanmax(data)}")
+    if np.issubdtype(dset.dtype, np.number):
+        stats = summary if summary is not None else stream_stats(dset)
+        print(f"min   = {stats['min']}")
+        print(f"max   = {stats['max']}")
+        print(f"mean  = {stats['mean']}")
+        print(f"NaNs  = {stats['nan_count']}")
 
     # Pretty printing
-    if data.ndim == 0:
-        print(f"value = {data}")
-    elif data.ndim == 1:
+    if dset.ndim == 0:
+        print(f"value = {dset[()]}")
+    elif dset.ndim == 1 and dset.shape[0] <= 100:
         print("values:")
-        print(data)
-    elif data.ndim == 2:
-        nx, ny = data.shape
-        cx, cy = nx // 2, ny // 2
+        print(dset[...])
+    elif dset.ndim == 1:
+        print("center values:")
+        print(center_slice(dset))
+    elif dset.ndim == 2:
         print("center 5x5 slice:")
-        print(data[cx-2:cx+3, cy-2:cy+3])
+        print(center_slice(dset))
     else:
-        print("Data has >2 dimensions; showing first element:")
-        print(data[0])
+        print("Data has >2 dimensions; showing center 5x5 slice of first element:")
+        print(center_slice(dset))
+
+
+def scan_directory(directory):
+    """Print the cached summary of every HDF5 file in an input directory."""
+    for filename in sorted(glob.glob(os.path.join(directory, '*.h5'))):
+        print(f"\n=== {filename} ===")
+        for name, s in scan_file(filename).items():
+            stats = f"min={s['min']}, max={s['max']}, NaNs={s['nan_count']}" if 'min' in s else ''
+            print(f"{name:20s} shape={tuple(s['shape'])}, dtype={s['dtype']} {stats}")
 
 
 def main():
     if len(sys.argv) != 2:
-        print("Usage: python h5_var_reader.py <file.h5>")
+        print("Usage: python h5_var_reader.py <file.h5 | input_directory>")
         sys.exit(1)
 
     filename = sys.argv[1]
 
-    with h5py.File(filename, "r") as f:
-        datasets = collect_datasets(f)
+    if os.path.isdir(filename):
+        scan_directory(filename)
+        return
 
+    summary = scan_file(filename)
+
+    with h5py.File(filename, "r") as f:
         print(f"\n=== Datasets in {filename} ===\n")
-        for name, dset in datasets.items():
-            print(f"{name:20s} shape={dset.shape}, dtype={dset.dtype}")
+        for name, s in summary.items():
+            print(f"{name:20s} shape={tuple(s['shape'])}, dtype={s['dtype']}")
 
         print("\nType dataset name to view it.")
         print("Type 'q' to quit.\n")
@@ -66,11 +186,11 @@ def main():
             if choice.lower() in ("q", "quit", "exit"):
                 break
 
-            if choice not in datasets:
+            if choice not in summary:
                 print("Dataset not found. Try again.")
                 continue
 
-            print_dataset(choice, datasets[choice])
+            print_dataset(choice, f[choice], summary[choice] if 'min' in summary[choice] else None)
 
 
 if __name__ == "__main__":
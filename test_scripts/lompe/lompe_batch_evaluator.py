@@ -0,0 +1,189 @@
+import os
+import glob
+import json
+import h5py
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from lompe.utils.save_load_utils import load_model
+
+from lompe_timeseries_loader import parse_lompe_time
+
+"""
+Purpose:
+    - discover every <case>/<time>.nc file under a Lompe sensitivity test directory
+      (individual_contribution_sensitivity_test/, iweight_sensitivity_test/, ...)
+    - load and evaluate the models in a process pool
+    - write all per-case fields on the common grid into one HDF5 results store:
+        /grid_J/lat, /grid_J/lon, /grid_E/lat, /grid_E/lon     common grids (from the first case written)
+        /cases/<case>/<time>/<field>   (attrs: source file, source mtime, errors)
+        /cases/<case>/<time>/grid_<J|E>/lat, lon               only for a case on a different grid
+      every field's 'grid_path' attr names the group holding its coordinates
+    - cases whose outputs are already in the store, complete and newer than the source file are skipped;
+      a case with failed fields records the errors and is evaluated again on the next run
+"""
+
+STORE_NAME = 'lompe_batch_results.h5'
+
+# Fields evaluated on the model grids (same getters as lompe_diff_gemini_remapped.py)
+FIELDS = {
+    'v': (lambda m: np.vstack(m.v()), 'J'),
+    'E': (lambda m: np.vstack(m.E()), 'J'),
+    'j': (lambda m: np.vstack(m.j()), 'J'),
+    'FAC': (lambda m: np.atleast_2d(m.FAC()), 'J'),
+    'E_pot': (lambda m: np.atleast_2d(m.E_pot()), 'J'),
+    'B_ground': (lambda m: np.vstack(m.B_ground()), 'E'),
+    'B_space': (lambda m: np.vstack(m.B_space()), 'E'),
+}
+
+
+def discover_cases(root, pattern='*.nc'):
+    """
+    Return {case_name: [files sorted by time]} for every directory below root holding Lompe outputs.
+    Nested case directories (16_tii/everything_but_tii) become flat names (16_tii__everything_but_tii).
+    """
+    cases = {}
+    for dirpath, _, _ in os.walk(root):
+        files = []
+        for f in glob.glob(os.path.join(dirpath, pattern)):
+            try:
+                parse_lompe_time(f)
+            except ValueError:
+                continue
+            files.append(f)
+        if files:
+            case = os.path.relpath(dirpath, root).replace(os.sep, '__')
+            cases[case] = sorted(files, key=parse_lompe_time)
+    return cases
+
+
+def evaluate_file(filename, fields=tuple(FIELDS)):
+    """Load one Lompe output and evaluate the requested fields on its grid (runs in a worker process)."""
+    model = load_model(filename, time='first')
+    out = {'fields': {}, 'grids': {}, 'errors': {}}
+    for name in fields:
+        getter, grid = FIELDS[name]
+        try:
+            out['fields'][name] = np.asarray(getter(model), dtype=np.float64)
+        except Exception as e:
+            print(f" Error evaluating {name} for {filename}: {e}")
+            out['errors'][name] = repr(e)
+    for grid in ('J', 'E'):
+        g = getattr(model, f'grid_{grid}')
+        out['grids'][grid] = {'lat': np.asarray(g.lat), 'lon': np.asarray(g.lon)}
+    return out
+
+
+def _time_key(filename):
+    return str(parse_lompe_time(filename)).replace(':', '')
+
+
+def is_up_to_date(store, case, filename):
+    """True if the store holds this case/time without failed fields and it was produced from the current file."""
+    key = f'cases/{case}/{_time_key(filename)}'
+    if key not in store:
+        return False
+    attrs = store[key].attrs
+    if json.loads(attrs.get('errors', '{}')):
+        return False
+    return attrs.get('source_mtime', -1.) >= os.path.getmtime(filename)
+
+
+def _same_grid(group, coords):
+    return (group['lat'].shape == np.shape(coords['lat']) and group['lon'].shape == np.shape(coords['lon'])
+            and np.array_equal(group['lat'][...], coords['lat'], equal_nan=True)
+            and np.array_equal(group['lon'][...], coords['lon'], equal_nan=True))
+
+
+def _write_result(store, case, filename, result):
+    key = f'cases/{case}/{_time_key(filename)}'
+    if key in store:
+        del store[key]
+    grp = store.create_group(key)
+
+    # The first case written defines the common grids; a case on a different grid keeps its own copy
+    grid_paths = {}
+    for grid, coords in result['grids'].items():
+        if f'grid_{grid}' not in store:
+            g = store.create_group(f'grid_{grid}')
+            g.create_dataset('lat', data=coords['lat'])
+            g.create_dataset('lon', data=coords['lon'])
+        if _same_grid(store[f'grid_{grid}'], coords):
+            grid_paths[grid] = f'/grid_{grid}'
+        else:
+            print(f" {case} {os.path.basename(filename)}: grid_{grid} differs from the common grid, stored with the case")
+            g = grp.create_group(f'grid_{grid}')
+            g.create_dataset('lat', data=coords['lat'])
+            g.create_dataset('lon', data=coords['lon'])
+            grid_paths[grid] = g.name
+
+    grp.attrs['source'] = filename
+    grp.attrs['time'] = str(parse_lompe_time(filename))
+    grp.attrs['errors'] = json.dumps(result['errors'])
+    if not result['errors']:
+        # Only a complete case is marked up to date
+        grp.attrs['source_mtime'] = os.path.getmtime(filename)
+    for name, data in result['fields'].items():
+        ds = grp.create_dataset(name, data=data, compression='gzip', shuffle=True)
+        ds.attrs['grid'] = FIELDS[name][1]
+        ds.attrs['grid_path'] = grid_paths[FIELDS[name][1]]
+
+
+def run_batch(root, store_path=None, fields=tuple(FIELDS), max_workers=None, force=False):
+    """Evaluate every stale case/time file under root in parallel and update the results store."""
+    if store_path is None:
+        store_path = os.path.join(root, STORE_NAME)
+
+    cases = discover_cases(root)
+    with h5py.File(store_path, 'a') as store:
+        todo = [(case, f) for case, files in cases.items() for f in files
+                if force or not is_up_to_date(store, case, f)]
+    print(f"{sum(len(f) for f in cases.values())} files in {len(cases)} cases, {len(todo)} to evaluate")
+    if not todo:
+        return store_path
+
+    # Workers only evaluate; the parent process is the single writer of the store
+    with ProcessPoolExecutor(max_workers=max_workers) as pool, h5py.File(store_path, 'a') as store:
+        futures = {pool.submit(evaluate_file, f, fields): (case, f) for case, f in todo}
+        for fut in as_completed(futures):
+            case, f = futures[fut]
+            try:
+                _write_result(store, case, f, fut.result())
+                print(f"  done {case} {os.path.basename(f)}")
+            except Exception as e:
+                print(f" Error evaluating {f}: {e}")
+    return store_path
+
+
+def read_field(store_path, field, time=None):
+    """
+    Read one field for all cases on the common grid -> (case names, array (ncase, ...), grid name).
+    Cases stored with their own grid are left out (they cannot be stacked with the others).
+    """
+    names, data, grid = [], [], None
+    with h5py.File(store_path, 'r') as store:
+        for case, grp in store['cases'].items():
+            times = sorted(grp.keys())
+            tkey = times[0] if time is None else str(np.datetime64(time, 's')).replace(':', '')
+            if tkey not in grp or field not in grp[tkey]:
+                continue
+            ds = grp[tkey][field]
+            if ds.attrs.get('grid_path', f"/grid_{ds.attrs['grid']}") != f"/grid_{ds.attrs['grid']}":
+                print(f" Skipping {case}: {field} is on its own grid ({ds.attrs['grid_path']})")
+                continue
+            names.append(case)
+            data.append(grp[tkey][field][...])
+            grid = grp[tkey][field].attrs['grid']
+    return names, np.stack(data) if data else np.empty((0,)), grid
+
+
+if __name__ == "__main__":
+    root = '/Users/clevenger/Projects/paper01/events/20230227/lompe/individual_contribution_sensitivity_test/'
+    store_path = run_batch(root)
+
+    # Example: rank cases by RMS FAC difference from the all-instrument case
+    names, fac, grid = read_field(store_path, 'FAC')
+    if '13_all' in names:
+        ref = fac[names.index('13_all')]
+        rms = np.sqrt(np.nanmean((fac - ref)**2, axis=tuple(range(1, fac.ndim))))
+        for i in np.argsort(rms)[::-1]:
+            print(f"{names[i]:40s} RMS FAC diff = {rms[i]:.3e}")
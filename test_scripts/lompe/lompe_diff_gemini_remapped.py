@@ -3,10 +3,16 @@ import numpy as np
 from lompe.utils.save_load_utils import load_model
 from lompe.model.visualization import format_ax, plot_potential
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'profiling'))
+from instrumentation import span
 
 def plot_grouped_components(file1, file2, outdir):
-    model1 = load_model(file1, time='first')
-    model2 = load_model(file2, time='first')
+    with span('lompe_load_model', file=os.path.basename(file1)):
+        model1 = load_model(file1, time='first')
+    with span('lompe_load_model', file=os.path.basename(file2)):
+        model2 = load_model(file2, time='first')
 
     # all lompe plot objects of interest (that have multiple components)
     grouped_components = {
@@ -67,8 +73,9 @@ def plot_grouped_components(file1, file2, outdir):
 
         for i in range(num_components):
             try:
-                d1 = comp['getter'](model1)
-                d2 = comp['getter'](model2)
+                with span('lompe_model_eval', field=group_name):
+                    d1 = comp['getter'](model1)
+                    d2 = comp['getter'](model2)
                 if group_name != 'FAC':
                     d1 = d1[i]
                     d2 = d2[i]
@@ -0,0 +1,155 @@
+import os
+import hashlib
+import h5py
+import numpy as np
+import scipy.sparse as sp
+from scipy.spatial import Delaunay
+
+"""
+Purpose:
+    - remap GEMINI-derived 2D fields onto a Lompe grid (grid_J / grid_E) inside the project,
+      instead of remapping offline
+    - the geometric search (triangulation + barycentric weights) is done once per
+      GEMINI grid / Lompe grid pair and saved as a sparse weight matrix
+    - every GEMINI time step is then remapped with one sparse mat-vec:
+        lompe_field = W @ gemini_field.ravel()
+    - both sides must be in the same coordinate system: Lompe grids are geographic, so the GEMINI
+      geographic coordinates (glat / glon) are used
+    - cached weights are keyed on a hash of the source and destination coordinate arrays
+"""
+
+
+def _local_plane(lat, lon, lat0, lon0):
+    """Equirectangular projection (km) about (lat0, lon0); fine over a Lompe-sized region."""
+    R = 6371.2
+    dlon = (np.asarray(lon) - lon0 + 180.) % 360. - 180.
+    x = R * np.radians(dlon) * np.cos(np.radians(lat0))
+    y = R * np.radians(np.asarray(lat) - lat0)
+    return np.column_stack((np.ravel(x), np.ravel(y)))
+
+
+def load_gemini_latlon(grid_file, lat_key='glat', lon_key='glon'):
+    """
+    Read GEMINI geographic grid coordinates; 1D coordinate vectors are expanded to the 2D field layout.
+    Magnetic coordinates (mlat / mlon) can only be used if the Lompe grid is converted to the same system.
+    """
+    with h5py.File(grid_file, 'r') as h5:
+        if lat_key not in h5 or lon_key not in h5:
+            raise KeyError(f"{grid_file} has no {lat_key} / {lon_key}; the weights need GEMINI coordinates in "
+                           f"the same (geographic) system as the Lompe grid")
+        lat = h5[lat_key][...]
+        lon = h5[lon_key][...]
+    if lat.ndim == 1 and lon.ndim == 1:
+        lat, lon = np.meshgrid(lat, lon, indexing='ij')
+    return lat, lon
+
+
+def grid_hash(src_lat, src_lon, dst_lat, dst_lon):
+    """Hash of the shapes and values of both coordinate grids."""
+    h = hashlib.sha256()
+    for a in (src_lat, src_lon, dst_lat, dst_lon):
+        a = np.ascontiguousarray(a, dtype=np.float64)
+        h.update(str(a.shape).encode())
+        h.update(a.tobytes())
+    return h.hexdigest()
+
+
+def build_weights(src_lat, src_lon, dst_lat, dst_lon):
+    """
+    Sparse (n_dst x n_src) linear interpolation weights from the GEMINI points to the Lompe points.
+    Destination points outside the GEMINI footprint get an empty row and are returned as NaN.
+    """
+    src_shape = np.shape(src_lat)
+    dst_shape = np.shape(dst_lat)
+    lat0, lon0 = float(np.nanmean(dst_lat)), float(np.nanmean(dst_lon))
+
+    src_xy = _local_plane(src_lat, src_lon, lat0, lon0)
+    dst_xy = _local_plane(dst_lat, dst_lon, lat0, lon0)
+
+    tri = Delaunay(src_xy)
+    simplex = tri.find_simplex(dst_xy)
+    inside = simplex >= 0
+
+    # Barycentric coordinates of every destination point in its triangle
+    T = tri.transform[simplex[inside]]
+    b = np.einsum('nij,nj->ni', T[:, :2], dst_xy[inside] - T[:, 2])
+    bary = np.column_stack((b, 1. - b.sum(axis=1)))
+
+    rows = np.repeat(np.flatnonzero(inside), 3)
+    cols = tri.simplices[simplex[inside]].ravel()
+    W = sp.csr_matrix((bary.ravel(), (rows, cols)), shape=(dst_xy.shape[0], src_xy.shape[0]))
+    return {'W': W, 'src_shape': src_shape, 'dst_shape': dst_shape, 'inside': inside,
+            'grid_hash': grid_hash(src_lat, src_lon, dst_lat, dst_lon)}
+
+
+def save_weights(weights, filename):
+    """Save weights as <filename> (sparse matrix) plus <filename>.meta.npz (shapes, coverage mask, grid hash)."""
+    sp.save_npz(filename, weights['W'])
+    np.savez(filename + '.meta.npz', src_shape=weights['src_shape'], dst_shape=weights['dst_shape'],
+             inside=weights['inside'], grid_hash=weights['grid_hash'])
+
+
+def load_weights(filename):
+    meta = np.load(filename + '.meta.npz')
+    return {'W': sp.load_npz(filename).tocsr(), 'src_shape': tuple(meta['src_shape']),
+            'dst_shape': tuple(meta['dst_shape']), 'inside': meta['inside'],
+            'grid_hash': str(meta['grid_hash']) if 'grid_hash' in meta else None}
+
+
+def get_weights(cache_file, src_lat, src_lon, dst_lat, dst_lon):
+    """Load cached weights if they were built from the same coordinate grids, otherwise build and save them."""
+    if os.path.exists(cache_file) and os.path.exists(cache_file + '.meta.npz'):
+        weights = load_weights(cache_file)
+        if weights['grid_hash'] == grid_hash(src_lat, src_lon, dst_lat, dst_lon):
+            return weights
+    weights = build_weights(src_lat, src_lon, dst_lat, dst_lon)
+    save_weights(weights, cache_file)
+    return weights
+
+
+def apply_weights(weights, fields):
+    """
+    Remap one GEMINI field (src_shape) or a stack of them (ntime, *src_shape) onto the Lompe grid.
+    A stack is remapped with one sparse matrix product over all time steps.
+    """
+    fields = np.asarray(fields, dtype=float)
+    src_shape, dst_shape = weights['src_shape'], weights['dst_shape']
+    if fields.ndim not in (len(src_shape), len(src_shape) + 1) or fields.shape[-len(src_shape):] != src_shape:
+        raise ValueError(f"Field shape {fields.shape} does not match the GEMINI grid {src_shape} "
+                         f"(expected {src_shape} or (ntime, *{src_shape}))")
+    single = fields.shape == src_shape
+    stack = fields.reshape((-1, int(np.prod(src_shape))))
+
+    out = (weights['W'] @ stack.T).T
+    out[:, ~weights['inside']] = np.nan
+    out = out.reshape((-1,) + dst_shape)
+    return out[0] if single else out
+
+
+def remap_gemini_run(gemini_files, var, weights, transform=None):
+    """Remap var from every GEMINI output file; reads and remaps one frame at a time."""
+    out = np.empty((len(gemini_files),) + weights['dst_shape'])
+    for i, fn in enumerate(gemini_files):
+        with h5py.File(fn, 'r') as h5:
+            data = h5[var][...]
+        if transform is not None:
+            data = transform(data)
+        out[i] = apply_weights(weights, data)
+    return out
+
+
+if __name__ == "__main__":
+    import glob
+    from lompe.utils.save_load_utils import load_model
+
+    lompe_file = '/Users/clevenger/Projects/paper01/events/20230227/lompe/individual_contribution_sensitivity_test/13_all/2023-02-27_083500.nc'
+    gemini_dir = '/Users/clevenger/Projects/paper01/events/20230227/gemini/inputs/Efield/'
+    weight_file = '/Users/clevenger/Projects/paper01/events/20230227/gemini/gemini_to_lompe_gridJ.npz'
+
+    model = load_model(lompe_file, time='first')
+    src_lat, src_lon = load_gemini_latlon(os.path.join(gemini_dir, 'simgrid.h5'))
+    weights = get_weights(weight_file, src_lat, src_lon, model.grid_J.lat, model.grid_J.lon)
+
+    frames = sorted(f for f in glob.glob(os.path.join(gemini_dir, '*.h5')) if not f.endswith('simgrid.h5'))
+    pot = remap_gemini_run(frames, 'Vmaxx1it', weights)
+    print(f"Remapped {len(frames)} GEMINI frames onto grid_J {pot.shape[1:]}")
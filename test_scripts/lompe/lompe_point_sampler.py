@@ -0,0 +1,141 @@
+import hashlib
+import numpy as np
+from scipy.interpolate import griddata
+from lompe.utils.save_load_utils import load_model
+
+"""
+Purpose:
+    - evaluate Lompe velocity and E-field at arbitrary (lat, lon) points, e.g. a full Swarm pass
+      or every PFISR gate, instead of comparing plots by eye
+    - the E-field basis matrix for a fixed point set is built once per model grid and cached, after
+      which every model (time step, sensitivity case) on that grid is a single matrix product with
+      its m_CF amplitudes
+    - velocity is E x B / B^2 with the model's main field (B0, Bu on the model grid, interpolated to
+      the points): ve = En Bu / B0^2, vn = -Ee Bu / B0^2. For a fixed point set this is a fixed
+      per-point scaling of the E-field matrix rows, so it is folded into a cached matrix as well
+"""
+
+
+class LompePointSampler:
+    """Cached evaluation matrices for one fixed set of sample points, one pair per model grid."""
+
+    def __init__(self, lat, lon):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.shape = np.broadcast(self.lat, self.lon).shape
+        self._matrix_cache = {}  # grid signature -> ((2N, M) [Ee; En] matrix, (2N, M) [ve; vn] matrix)
+
+    def __len__(self):
+        return int(np.prod(self.shape))
+
+    @staticmethod
+    def _grid_signature(model):
+        """Hash of the grid_E coordinates and the main field: models sharing it share the matrices."""
+        h = hashlib.sha256()
+        for a in (model.grid_E.lat, model.grid_E.lon, model.B0, model.Bu):
+            a = np.ascontiguousarray(a, dtype=np.float64)
+            h.update(str(a.shape).encode())
+            h.update(a.tobytes())
+        return h.hexdigest()
+
+    @staticmethod
+    def _E_matrix(model, lon, lat):
+        # Public API where this Lompe version has it, otherwise the (older) private name
+        func = getattr(model, 'E_matrix', None) or model._E_matrix
+        Ee, En = func(lon, lat)
+        return np.asarray(Ee), np.asarray(En)
+
+    @staticmethod
+    def _main_field_factor(model, lon, lat):
+        """Bu / B0^2 [1/T] at the points from the model's main field, interpolated on the grid it is defined on."""
+        Bu = np.ravel(model.Bu)
+        B0 = np.ravel(model.B0)
+        grid = model.grid_J if Bu.size == model.grid_J.lat.size else model.grid_E
+        glat, glon = np.ravel(grid.lat), np.ravel(grid.lon)
+        factor = Bu / B0**2
+        lon0 = float(np.nanmean(glon))
+        wrap = lambda x: (np.asarray(x) - lon0 + 180.) % 360. - 180.
+        src = np.column_stack((wrap(glon), glat))
+        dst = np.column_stack((wrap(lon), lat))
+        a = griddata(src, factor, dst, method='linear')
+        outside = ~np.isfinite(a)
+        if outside.any():
+            # The main field is smooth; points just outside the grid take the nearest grid value
+            a[outside] = griddata(src, factor, dst[outside], method='nearest')
+        return a
+
+    def _build(self, model):
+        """Build the E-field and velocity basis matrices for the points on this model's grid."""
+        lat, lon = np.broadcast_arrays(self.lat, self.lon)
+        lat, lon = lat.ravel(), lon.ravel()
+
+        Ee, En = self._E_matrix(model, lon, lat)
+        G = np.vstack((Ee, En))
+        a = self._main_field_factor(model, lon, lat)
+        Gv = np.vstack((a[:, None] * En, -a[:, None] * Ee))
+        return G, Gv
+
+    def _matrices(self, model):
+        key = self._grid_signature(model)
+        if key not in self._matrix_cache:
+            self._matrix_cache[key] = self._build(model)
+        return self._matrix_cache[key]
+
+    def E(self, model):
+        """E-field (east, north) [V/m] at the sample points."""
+        G, _ = self._matrices(model)
+        out = G.dot(model.m_CF)
+        return out[:len(self)].reshape(self.shape), out[len(self):].reshape(self.shape)
+
+    def v(self, model):
+        """Convection velocity (east, north) [m/s] at the sample points."""
+        _, Gv = self._matrices(model)
+        out = Gv.dot(model.m_CF)
+        return out[:len(self)].reshape(self.shape), out[len(self):].reshape(self.shape)
+
+    def sample_many(self, models, quantity='v'):
+        """
+        Evaluate many models at once: models are grouped by grid signature, and each group's m_CF
+        columns are stacked into one matmul. Returns arrays (east, north) with shape
+        (n_models,) + point shape, in the order of models.
+        """
+        models = list(models)
+        groups = {}
+        for i, m in enumerate(models):
+            groups.setdefault(self._grid_signature(m), []).append(i)
+
+        n = len(self)
+        east = np.empty((len(models), n))
+        north = np.empty((len(models), n))
+        for idx in groups.values():
+            G, Gv = self._matrices(models[idx[0]])
+            M = np.column_stack([models[i].m_CF for i in idx])
+            out = (Gv if quantity == 'v' else G).dot(M).T
+            east[idx], north[idx] = out[:, :n], out[:, n:]
+        return east.reshape((-1,) + self.shape), north.reshape((-1,) + self.shape)
+
+
+def sample_files(files, lat, lon, quantity='v'):
+    """Load each Lompe output file and sample it at the same (lat, lon) points."""
+    sampler = LompePointSampler(lat, lon)
+    models = [load_model(f, time='first') for f in files]
+    return sampler.sample_many(models, quantity=quantity)
+
+
+if __name__ == "__main__":
+    import glob
+    import cdflib
+
+    # Swarm B TCT pass over PFISR
+    swarm_cdf = '/Users/clevenger/Projects/paper01/sop23_data/202303/22/SW_EXPT_EFIB_TCT02_20230322T005252_20230322T132507_0302.cdf'
+    v = cdflib.CDF(swarm_cdf)
+    swarm_lat = v.varget('Latitude')
+    swarm_lon = v.varget('Longitude')
+    mask = (swarm_lat > 60.) & (swarm_lat < 70.) & (swarm_lon > -160.) & (swarm_lon < -135.)
+
+    case_dir = '/Users/clevenger/Projects/paper01/events/20230227/lompe/individual_contribution_sensitivity_test/'
+    files = sorted(glob.glob(case_dir + '*/2023-02-27_083500.nc'))
+
+    ve, vn = sample_files(files, swarm_lat[mask], swarm_lon[mask])
+    for f, e, n in zip(files, ve, vn):
+        print(f"{f.split('/')[-2]:30s} mean |v| along pass = {np.nanmean(np.hypot(e, n)):.1f} m/s")
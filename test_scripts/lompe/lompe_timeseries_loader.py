@@ -0,0 +1,157 @@
+import os
+import glob
+import numpy as np
+from netCDF4 import Dataset
+
+"""
+Purpose:
+    - treat a Lompe case directory (one NetCDF per time step, e.g. 2023-02-27_083500.nc) as a single
+      time-ordered dataset
+    - files are only opened when a variable is actually requested, and only the requested
+      variable / grid subset is read from each file
+    - grid metadata (dimensions, static coordinate variables, global attributes) is identical
+      across the files of one case, so it is read once from the first file and cached
+"""
+
+LOMPE_TIME_FORMAT = '%Y-%m-%d_%H%M%S'
+
+
+def parse_lompe_time(filename):
+    """Convert a Lompe output filename (2023-02-27_083500.nc) to datetime64[s]."""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    day, hms = stem.split('_')
+    return np.datetime64(f"{day}T{hms[0:2]}:{hms[2:4]}:{hms[4:6]}", 's')
+
+
+class LompeCaseDataset:
+    """Lazy multi-file view over the time step files of one Lompe case directory."""
+
+    def __init__(self, case_dir, pattern='*.nc', time_dim='time'):
+        self.case_dir = case_dir
+        self.time_dim = time_dim
+        files = glob.glob(os.path.join(case_dir, pattern))
+        if not files:
+            raise FileNotFoundError(f"No Lompe output files matching {pattern} in {case_dir}")
+
+        times = np.array([parse_lompe_time(f) for f in files])
+        order = np.argsort(times)
+        self.files = [files[i] for i in order]
+        self.times = times[order]
+
+        self._grid = None
+        self._point_index = {}
+
+    def __len__(self):
+        return len(self.files)
+
+    @property
+    def grid(self):
+        """Cached grid metadata: dimensions, variable layout, static variables and global attributes."""
+        if self._grid is None:
+            with Dataset(self.files[0], 'r') as nc:
+                dims = {name: len(dim) for name, dim in nc.dimensions.items()}
+                variables = {}
+                static = {}
+                for name, var in nc.variables.items():
+                    variables[name] = {'dims': var.dimensions, 'shape': var.shape, 'dtype': var.dtype}
+                    if self.time_dim not in var.dimensions:
+                        static[name] = var[...]
+                attrs = {attr: nc.getncattr(attr) for attr in nc.ncattrs()}
+            self._grid = {'dims': dims, 'variables': variables, 'static': static, 'attrs': attrs}
+        return self._grid
+
+    @property
+    def variables(self):
+        return self.grid['variables']
+
+    def _file_selection(self, time):
+        """Return file indices for time=None (all), a single datetime64 (nearest) or a (start, end) window."""
+        if time is None:
+            return np.arange(len(self.files))
+        if isinstance(time, tuple):
+            start = np.searchsorted(self.times, np.datetime64(time[0], 's'), side='left')
+            end = np.searchsorted(self.times, np.datetime64(time[1], 's'), side='right')
+            return np.arange(start, end)
+        return np.array([np.argmin(np.abs(self.times - np.datetime64(time, 's')))])
+
+    def _file_index(self, var, index):
+        """Index over the non-time dims of var -> index over all of the file variable's dims."""
+        if index is Ellipsis:
+            return index
+        dims = self.variables[var]['dims']
+        index = list(index) if isinstance(index, tuple) else [index]
+        nspatial = len(dims) - 1
+        if Ellipsis in index:
+            i = index.index(Ellipsis)
+            index[i:i + 1] = [slice(None)] * (nspatial - len(index) + 1)
+        index += [slice(None)] * (nspatial - len(index))
+        index.insert(dims.index(self.time_dim), slice(None))
+        return tuple(index)
+
+    def read(self, var, time=None, index=Ellipsis):
+        """
+        Read one variable for the selected time steps, stacked along a new leading time axis.
+
+        index selects from the non-time dimensions only (the same for static and time-varying
+        variables) and is applied to each file's variable before reading (netCDF hyperslab), so only
+        the requested grid subset is transferred, e.g. index=(slice(10, 20), 5) for a (time, lat, lon)
+        variable. Each file's length-1 time axis is kept as is.
+        """
+        if var not in self.variables:
+            raise KeyError(f"{var} not found in {self.files[0]}")
+
+        if self.time_dim not in self.variables[var]['dims']:
+            # Static field, identical in every file
+            data = self.grid['static'][var][index]
+            return self.times[self._file_selection(time)], data
+
+        fidx = self._file_selection(time)
+        index = self._file_index(var, index)
+        out = []
+        for i in fidx:
+            with Dataset(self.files[i], 'r') as nc:
+                out.append(np.ma.filled(nc.variables[var][index], np.nan))
+        return self.times[fidx], np.stack(out) if out else np.empty((0,))
+
+    def nearest_grid_index(self, lat, lon, lat_var='lat', lon_var='lon'):
+        """Grid index of the point closest to (lat, lon), computed once from the cached coordinates."""
+        key = (lat, lon, lat_var, lon_var)
+        if key not in self._point_index:
+            glat = np.asarray(self.grid['static'][lat_var], dtype=float)
+            glon = np.asarray(self.grid['static'][lon_var], dtype=float)
+            if glat.ndim == 1 and glon.ndim == 1 and self.variables[lat_var]['dims'] != self.variables[lon_var]['dims']:
+                glon, glat = np.meshgrid(glon, glat)
+            dlon = (glon - lon + 180.) % 360. - 180.
+            dist = (glat - lat)**2 + (dlon * np.cos(np.radians(lat)))**2
+            self._point_index[key] = np.unravel_index(np.nanargmin(dist), dist.shape)
+        return self._point_index[key]
+
+    def point_series(self, var, lat, lon, time=None, lat_var='lat', lon_var='lon'):
+        """Time series of var at the grid point nearest (lat, lon); reads a single element per file."""
+        gidx = self.nearest_grid_index(lat, lon, lat_var, lon_var)
+        dims = self.variables[var]['dims']
+        spatial = [d for d in dims if d != self.time_dim]
+        if len(spatial) != len(gidx):
+            raise ValueError(f"{var} has dims {dims}, cannot index with a {len(gidx)}-D grid point")
+
+        index = tuple(gidx[spatial.index(d)] for d in spatial)
+        times, data = self.read(var, time=time, index=index)
+        return times, np.ravel(data)
+
+
+if __name__ == "__main__":
+    case_dir = '/Users/clevenger/Projects/paper01/events/20230227/lompe/outputs/cases/17/'
+
+    ds = LompeCaseDataset(case_dir)
+    print(f"{len(ds)} time steps: {ds.times[0]} - {ds.times[-1]}")
+    for name, info in ds.variables.items():
+        print(f"  {name}: dims={info['dims']}, shape={info['shape']}, dtype={info['dtype']}")
+
+    # Whole-event time series at a point near Poker Flat
+    for var in ds.variables:
+        if ds.time_dim in ds.variables[var]['dims'] and len(ds.variables[var]['dims']) == 3:
+            times, series = ds.point_series(var, 65.13, -147.47)
+            print(f"\n{var} at (65.13, -147.47):")
+            for t, val in zip(times, series):
+                print(f"  {t}: {val}")
+            break
@@ -1,60 +1,76 @@
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 import pydarn
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'profiling'))
+from instrumentation import span
+
 # Constants
 EARTH_RADIUS_KM = 6371  # Approximate Earth radius
 
-# File to read
-fitacf_file = "/Users/clevenger/Projects/paper01/sop23_data/202302/08/superdarn/kod/20230208.1000.00.kod.d.fitacf"
-
-# Read file
-reader = pydarn.SuperDARNRead(fitacf_file)
-fitacf_data = reader.read_fitacf()
-
-# Lists to collect coordinates
-lats = []
-lons = []
-
-# Loop over records
-for rec in fitacf_data:
-    try:
-        stid = rec['stid']
-        beam = rec['bmnum']
-        frang = rec.get('frang', 180)
-        rsep = rec.get('rsep', 45)
-        slist = rec['slist']
-        gflg = rec['gflg']
-    except KeyError:
-        continue
-
-    # Get radar position and beam azimuth
-    radar = pydarn.SuperDARNRadars.radars[stid]
-    radar_lat = radar.hardware_info.geographic.lat
-    radar_lon = radar.hardware_info.geographic.lon
-    beam_az_deg = radar.hardware_info.beam_az[beam]  # in degrees
-
-    for j, gate in enumerate(slist):
-        if gflg[j] == 0 and gate > 10:
-            range_km = frang + gate * rsep
-            az_rad = np.radians(beam_az_deg)
-
-            # Estimate offset in lat/lon (flat Earth approximation)
+
+def read_fitacf(fitacf_file):
+    with span('superdarn_read_fitacf', file=os.path.basename(fitacf_file)):
+        reader = pydarn.SuperDARNRead(fitacf_file)
+        return reader.read_fitacf()
+
+
+def coverage_points(fitacf_data, min_gate=10):
+    """Lat/lon of every ionospheric-scatter gate beyond min_gate (flat Earth approximation)."""
+    lats = []
+    lons = []
+    with span('superdarn_coverage', records=len(fitacf_data)):
+        for rec in fitacf_data:
+            try:
+                stid = rec['stid']
+                beam = rec['bmnum']
+                frang = rec.get('frang', 180)
+                rsep = rec.get('rsep', 45)
+                slist = np.asarray(rec['slist'])
+                gflg = np.asarray(rec['gflg'])
+            except KeyError:
+                continue
+
+            # Get radar position and beam azimuth
+            radar = pydarn.SuperDARNRadars.radars[stid]
+            radar_lat = radar.hardware_info.geographic.lat
+            radar_lon = radar.hardware_info.geographic.lon
+            az_rad = np.radians(radar.hardware_info.beam_az[beam])
+
+            # All ionospheric gates of the record at once
+            gates = slist[(gflg == 0) & (slist > min_gate)]
+            range_km = frang + gates * rsep
             dlat = (range_km / EARTH_RADIUS_KM) * np.cos(az_rad)
             dlon = (range_km / (EARTH_RADIUS_KM * np.cos(np.radians(radar_lat)))) * np.sin(az_rad)
 
-            lat = radar_lat + np.degrees(dlat)
-            lon = radar_lon + np.degrees(dlon)
-
-            lats.append(lat)
-            lons.append(lon)
-
-# Plotting
-plt.figure(figsize=(10, 6))
-plt.scatter(lons, lats, s=3, c='royalblue', alpha=0.7)
-plt.xlabel("Longitude")
-plt.ylabel("Latitude")
-plt.title("SuperDARN Beam Coverage")
-plt.grid(True)
-plt.axis("equal")
-plt.show()
+            lats.append(radar_lat + np.degrees(dlat))
+            lons.append(radar_lon + np.degrees(dlon))
+
+    if not lats:
+        return np.empty(0), np.empty(0)
+    return np.concatenate(lats), np.concatenate(lons)
+
+
+def plot_coverage(lats, lons, outfile=None):
+    plt.figure(figsize=(10, 6))
+    plt.scatter(lons, lats, s=3, c='royalblue', alpha=0.7)
+    plt.xlabel("Longitude")
+    plt.ylabel("Latitude")
+    plt.title("SuperDARN Beam Coverage")
+    plt.grid(True)
+    plt.axis("equal")
+    if outfile:
+        plt.savefig(outfile, dpi=300, bbox_inches='tight')
+    else:
+        plt.show()
+
+
+if __name__ == "__main__":
+    # File to read
+    fitacf_file = "/Users/clevenger/Projects/paper01/sop23_data/202302/08/superdarn/kod/20230208.1000.00.kod.d.fitacf"
+
+    fitacf_data = read_fitacf(fitacf_file)
+    lats, lons = coverage_points(fitacf_data)
+    plot_coverage(lats, lons)
@@ -0,0 +1,183 @@
+import os
+import h5py
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import matplotlib.image as mpimg
+from matplotlib.colors import Normalize
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+"""
+Purpose:
+    - fast renderer for the 3-D PFISR beam composites (pfisr_composite.py, swarm_passover2.py)
+    - all beams x gates inside the altitude range are flattened once into a single point set; each panel
+      (Ne, Ti, Te, Vlos) is ONE scatter collection over that shared geometry with a fixed norm, so a new
+      record only swaps the colour arrays (set_array) instead of rebuilding hundreds of per-beam collections
+    - headless raster path: one figure on an Agg canvas is reused for every record; the static parts
+      (axes, panes, colorbars) are rasterised once and each frame only blits the point collections and
+      titles on top, so frames for a full night can be written as PNGs or returned as RGBA arrays
+"""
+
+STYLES = {
+    'ne': ('Ne', 'viridis', 0., 4.e11),
+    'ti': ('Ti', 'magma', 0., 3.e3),
+    'te': ('Te', 'inferno', 0., 5.e3),
+    'vlos': ('Vlos', 'bwr', -500., 500.),
+}
+_FITS_INDEX = {'ti': (0, 1), 'te': (-1, 1), 'vlos': (0, 3)}
+
+
+class CompositeRenderer:
+    def __init__(self, h5file, alt_range=(100, 500), params=('ne', 'ti', 'te', 'vlos'), norms=None):
+        """
+        Load the flattened gate geometry and the selected parameters for every record of h5file.
+        alt_range in km; norms optionally overrides {param: (vmin, vmax)}.
+        """
+        with h5py.File(h5file, 'r') as h5:
+            self.utime = h5['Time/UnixTime'][:, 0]
+            lat = h5['Geomag/Latitude'][:]
+            lon = h5['Geomag/Longitude'][:]
+            alt = h5['Geomag/Altitude'][:] / 1000.
+
+            use = np.isfinite(lat) & np.isfinite(lon) & np.isfinite(alt) & \
+                  (alt >= alt_range[0]) & (alt <= alt_range[1])
+            self.beam, self.gate = np.nonzero(use)
+            self.lon, self.lat, self.alt = lon[use], lat[use], alt[use]
+
+            self.values = {}
+            for p in params:
+                if p == 'ne':
+                    full = h5['FittedParams/Ne'][:]
+                else:
+                    ion, k = _FITS_INDEX[p]
+                    full = h5['FittedParams/Fits'][:, :, :, ion, k]
+                # (nrec, npoints), contiguous per record for set_array
+                self.values[p] = np.ascontiguousarray(full[:, self.beam, self.gate])
+
+        self.alt_range = alt_range
+        self.params = tuple(params)
+        self.norms = {p: Normalize(*(norms or {}).get(p, STYLES[p][2:])) for p in self.params}
+        self.fig = None
+        self.marker = None
+        self._background = None
+
+    def record_index(self, time_point):
+        """Index of the record closest to time_point (datetime64 or unix seconds)."""
+        if isinstance(time_point, (np.datetime64, str)):
+            t = np.datetime64(time_point, 's').astype(np.int64)
+        else:
+            t = float(time_point)
+        i = np.clip(np.searchsorted(self.utime, t), 1, len(self.utime) - 1)
+        return int(i - 1 if abs(t - self.utime[i - 1]) <= abs(self.utime[i] - t) else i)
+
+    def figure(self, figsize=(20, 15), dpi=100, headless=False, point_size=10):
+        """Build the panels once: one scatter per parameter over the shared geometry."""
+        if headless:
+            self.fig = Figure(figsize=figsize, dpi=dpi)
+            FigureCanvasAgg(self.fig)
+        else:
+            self.fig = plt.figure(figsize=figsize, dpi=dpi)
+
+        ncol = 2 if len(self.params) > 1 else 1
+        nrow = int(np.ceil(len(self.params) / ncol))
+        self.axes, self.collections = {}, {}
+        for i, p in enumerate(self.params):
+            title, cmap, _, _ = STYLES[p]
+            ax = self.fig.add_subplot(nrow, ncol, i + 1, projection='3d')
+            sc = ax.scatter(self.lon, self.lat, self.alt, c=self.values[p][0], cmap=cmap, norm=self.norms[p],
+                            s=point_size, depthshade=False)
+            ax.set_zlim(*self.alt_range)
+            ax.set_xlabel('Longitude')
+            ax.set_ylabel('Latitude')
+            ax.set_zlabel('Altitude (km)')
+            self.fig.colorbar(sc, ax=ax, label=title)
+            self.axes[p], self.collections[p] = ax, sc
+
+        self.suptitle = self.fig.suptitle('', fontsize=16)
+        self._background = None
+        return self.fig
+
+    def set_marker(self, lon, lat, alt_km, **kwargs):
+        """Overlay (or move) a single marker, e.g. the Swarm position, on every panel."""
+        if self.marker is None:
+            kwargs = {'marker': '*', 'color': 'r', 'markersize': 10, 'linestyle': '', **kwargs}
+            self.marker = [ax.plot([lon], [lat], [alt_km], **kwargs)[0] for ax in self.axes.values()]
+            # New artist: the cached background has to be rebuilt without it
+            self._background = None
+        else:
+            for m in self.marker:
+                m.set_data([lon], [lat])
+                m.set_3d_properties([alt_km])
+
+    def update(self, record):
+        """Swap the colour arrays to another record; geometry and norms are untouched."""
+        if self.fig is None:
+            self.figure()
+        stamp = pd.to_datetime(self.utime[record], unit='s')
+        for p in self.params:
+            self.collections[p].set_array(self.values[p][record])
+            self.axes[p].set_title(f"{STYLES[p][0]} - Time: {stamp}")
+        self.suptitle.set_text(f"PFISR Data - Time: {stamp}")
+        return list(self.collections.values())
+
+    def _dynamic_artists(self):
+        artists = [(ax, self.collections[p]) for p, ax in self.axes.items()]
+        artists += [(ax, ax.title) for ax in self.axes.values()]
+        artists += [(ax, m) for ax, m in zip(self.axes.values(), self.marker or [])]
+        return artists + [(self.fig, self.suptitle)]
+
+    def render(self, record):
+        """Headless: draw one record and return the frame as an (h, w, 4) uint8 array."""
+        if self.fig is None:
+            self.figure(headless=True)
+        canvas = self.fig.canvas
+        artists = self._dynamic_artists()
+        if self._background is None:
+            # Rasterise everything that does not change between records once; the first full draw also
+            # computes the 3-D projection of the point sets, which stays valid while the view is fixed
+            canvas.draw()
+            for _, a in artists:
+                a.set_visible(False)
+            canvas.draw()
+            self._background = canvas.copy_from_bbox(self.fig.bbox)
+            for _, a in artists:
+                a.set_visible(True)
+
+        self.update(record)
+        canvas.restore_region(self._background)
+        for parent, a in artists:
+            parent.draw_artist(a)
+        return np.asarray(canvas.buffer_rgba()).copy()
+
+    def render_frames(self, out_dir, records=None, prefix='composite', callback=None):
+        """
+        Headless: write one PNG per record to out_dir, reusing the same figure. callback(renderer, record)
+        runs before each frame is drawn (e.g. to move the Swarm marker). Returns the written paths.
+        """
+        if self.fig is None:
+            self.figure(headless=True)
+        os.makedirs(out_dir, exist_ok=True)
+        records = range(len(self.utime)) if records is None else records
+        paths = []
+        for record in records:
+            if callback is not None:
+                callback(self, record)
+            path = os.path.join(out_dir, f"{prefix}_{record:04d}.png")
+            mpimg.imsave(path, self.render(record))
+            paths.append(path)
+        return paths
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if len(sys.argv) < 3:
+        print("Usage: python pfisr_composite_renderer.py <fitted file> <frame dir>")
+        sys.exit(1)
+
+    renderer = CompositeRenderer(sys.argv[1], alt_range=(100, 500))
+    t0 = time.time()
+    paths = renderer.render_frames(sys.argv[2])
+    print(f"{len(paths)} frames in {time.time() - t0:.1f} s -> {sys.argv[2]}")
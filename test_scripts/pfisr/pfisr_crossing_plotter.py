@@ -4,6 +4,7 @@ import os
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
 import matplotlib.dates as mdates
+from pfisr_rti_pyramid import build_pyramid, read_rti
 
 filename_ac = '/Users/clevenger/Projects/paper01/sop23_data/202303/22/20230322.003_ac_3min-fitcal.h5'
 filename_lp = '/Users/clevenger/Projects/paper01/sop23_data/202303/22/20230322.003_lp_3min-fitcal.h5'
@@ -12,39 +13,13 @@ start_time = np.datetime64('2023-03-22T08:30:00')
 end_time = np.datetime64('2023-03-22T09:29:00')
 
 def plot_beamcode(beamcode, filename_ac, filename_lp, start_time, end_time):
-    with h5py.File(filename_lp, 'r') as h5:
-        beamcodes = h5['BeamCodes'][:]
-        bidx = np.where(beamcodes[:, 0] == beamcode)[0][0]
-        alt_lp = h5['FittedParams/Altitude'][bidx,:]
-        ne_lp = h5['FittedParams/Ne'][:,bidx,:]
-        ti_lp = h5['FittedParams/Fits'][:,bidx,:,0,1]
-        te_lp = h5['FittedParams/Fits'][:,bidx,:,-1,1]
-        vlos_lp = h5['FittedParams/Fits'][:,bidx,:,0,3]
-        utime_lp = h5['Time/UnixTime'][:,0]
-
-    time_lp = utime_lp.astype('datetime64[s]')
-    ne_lp = ne_lp[:,np.isfinite(alt_lp)]
-    ti_lp = ti_lp[:,np.isfinite(alt_lp)]
-    te_lp = te_lp[:,np.isfinite(alt_lp)]
-    vlos_lp = vlos_lp[:,np.isfinite(alt_lp)]
-    alt_lp = alt_lp[np.isfinite(alt_lp)]
-
-    with h5py.File(filename_ac, 'r') as h5:
-        beamcodes = h5['BeamCodes'][:]
-        bidx = np.where(beamcodes[:, 0] == beamcode)[0][0]
-        alt_ac = h5['FittedParams/Altitude'][bidx,:]
-        ne_ac = h5['FittedParams/Ne'][:,bidx,:]
-        ti_ac = h5['FittedParams/Fits'][:,bidx,:,0,1]
-        te_ac = h5['FittedParams/Fits'][:,bidx,:,-1,1]
-        vlos_ac = h5['FittedParams/Fits'][:,bidx,:,0,3]
-        utime_ac = h5['Time/UnixTime'][:,0]
-
-    time_ac = utime_ac.astype('datetime64[s]')
-    ne_ac = ne_ac[:,np.isfinite(alt_ac)]
-    ti_ac = ti_ac[:,np.isfinite(alt_ac)]
-    te_ac = te_ac[:,np.isfinite(alt_ac)]
-    vlos_ac = vlos_ac[:,np.isfinite(alt_ac)]
-    alt_ac = alt_ac[np.isfinite(alt_ac)]
+    # Level-of-detail read: at most ~one record per pixel column of the saved figure
+    width_px = 10 * 300
+    time_lp, alt_lp, lp, _ = read_rti(filename_lp, beamcode, start_time, end_time, width_px)
+    ne_lp, ti_lp, te_lp, vlos_lp = lp['ne'], lp['ti'], lp['te'], lp['vlos']
+
+    time_ac, alt_ac, ac, _ = read_rti(filename_ac, beamcode, start_time, end_time, width_px)
+    ne_ac, ti_ac, te_ac, vlos_ac = ac['ne'], ac['ti'], ac['te'], ac['vlos']
 
     cutoff_alt = 150.*1000.
     aidx_ac = np.argmin(np.abs(alt_ac-cutoff_alt))
@@ -102,6 +77,10 @@ with h5py.File(filename_lp, 'r') as h5:
 # Extract the directory path from one of the input files
 output_dir = os.path.dirname(filename_ac)
 
+# Build (or reuse) the RTI pyramids once, before the per-beam reads
+build_pyramid(filename_ac)
+build_pyramid(filename_lp)
+
 # Loop through all beamcodes, create and save plots
 for beamcode in unique_beamcodes:
     fig = plot_beamcode(beamcode, filename_ac, filename_lp, start_time, end_time)
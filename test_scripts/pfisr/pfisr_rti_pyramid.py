@@ -0,0 +1,211 @@
+import os
+import sys
+import warnings
+import h5py
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'profiling'))
+from instrumentation import timed
+
+"""
+Purpose:
+    - level-of-detail pyramid for PFISR range-time-intensity plots
+    - for every fitted file a sidecar <file>.rti_pyramid.h5 holds the Ne / Ti / Te / Vlos time series
+      of all beams decimated in time by factor, factor**2, ... with NaN-aware mean, min and max:
+        /level_<k>/utime            (n_k, 2)   start of the first / end of the last record in each bin
+        /level_<k>/<param>_<stat>   (n_k, nbeams, nrange)
+        /level_<k>/<param>_count    (n_k, nbeams, nrange)
+      level 0 is the fitted file itself and is never copied
+    - read_rti picks the coarsest level that still has at least one record per pixel column for the
+      requested time span and figure width, so a week-long RTI draws about as many quads as a one-hour one
+"""
+
+PARAMETERS = {
+    'ne': ('FittedParams/Ne', None),
+    'ti': ('FittedParams/Fits', (0, 1)),
+    'te': ('FittedParams/Fits', (-1, 1)),
+    'vlos': ('FittedParams/Fits', (0, 3)),
+}
+STATS = ('mean', 'min', 'max')
+BLOCK_BINS = 256
+
+
+def pyramid_path(h5file):
+    return h5file + '.rti_pyramid.h5'
+
+
+def _read_param(h5, param, start, stop, bidx=slice(None)):
+    """Records [start:stop] of one parameter -> (n, nbeams, nrange), or (n, nrange) for a single beam index."""
+    dset, idx = PARAMETERS[param]
+    if idx is None:
+        return h5[dset][start:stop, bidx, :]
+    return h5[dset][start:stop, bidx, :, idx[0], idx[1]]
+
+
+def _decimate(mean, count, vmin, vmax, factor):
+    """Combine consecutive groups of factor bins (count-weighted mean, running min / max)."""
+    n = (mean.shape[0] // factor) * factor
+    rest = mean.shape[1:]
+    m = mean[:n].reshape((-1, factor) + rest)
+    c = count[:n].reshape((-1, factor) + rest)
+    total = c.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out_mean = np.nansum(np.where(c > 0, m * c, 0.), axis=1) / total
+    out_mean[total == 0] = np.nan
+    with warnings.catch_warnings():
+        # All-NaN groups are expected (gaps, failed fits)
+        warnings.simplefilter('ignore', RuntimeWarning)
+        out_min = np.nanmin(vmin[:n].reshape((-1, factor) + rest), axis=1)
+        out_max = np.nanmax(vmax[:n].reshape((-1, factor) + rest), axis=1)
+    return out_mean, total, out_min, out_max
+
+
+def _create_level(out, k, nbins, shape):
+    grp = out.create_group(f'level_{k}')
+    grp.create_dataset('utime', shape=(nbins, 2), dtype='f8')
+    chunks = (min(nbins, BLOCK_BINS),) + shape
+    for param in PARAMETERS:
+        for stat in STATS:
+            grp.create_dataset(f'{param}_{stat}', shape=(nbins,) + shape, dtype='f4', chunks=chunks,
+                               compression='gzip', compression_opts=4)
+        grp.create_dataset(f'{param}_count', shape=(nbins,) + shape, dtype='u4', chunks=chunks,
+                           compression='gzip', compression_opts=4)
+    return grp
+
+
+@timed('pfisr_rti_pyramid_build')
+def build_pyramid(h5file, factor=4, min_bins=64, force=False):
+    """
+    Build (or reuse) the sidecar pyramid for one fitted file. Levels are added until a level would
+    have fewer than min_bins records. Returns the sidecar path.
+    """
+    path = pyramid_path(h5file)
+    mtime = os.path.getmtime(h5file)
+    if not force and os.path.exists(path):
+        with h5py.File(path, 'r') as f:
+            if f.attrs.get('source_mtime') == mtime and f.attrs.get('factor') == factor:
+                return path
+
+    with h5py.File(h5file, 'r') as h5, h5py.File(path + '.tmp', 'w') as out:
+        utime = h5['Time/UnixTime'][:]
+        shape = h5['FittedParams/Ne'].shape[1:]
+        out.attrs['factor'] = factor
+        out.attrs['source'] = os.path.basename(h5file)
+        out.attrs['integration'] = float(np.median(utime[:, 1] - utime[:, 0]))
+
+        # Level 1 straight from the fitted file, streamed in blocks of BLOCK_BINS output bins
+        nbins = utime.shape[0] // factor
+        k = 0
+        if nbins >= min_bins:
+            k = 1
+            grp = _create_level(out, k, nbins, shape)
+            grp['utime'][:] = np.column_stack((utime[:nbins * factor:factor, 0],
+                                               utime[factor - 1:nbins * factor:factor, 1]))
+            step = BLOCK_BINS * factor
+            for param in PARAMETERS:
+                for r0 in range(0, nbins * factor, step):
+                    r1 = min(r0 + step, nbins * factor)
+                    data = _read_param(h5, param, r0, r1).astype(np.float64)
+                    count = np.isfinite(data).astype(np.uint32)
+                    mean, total, vmin, vmax = _decimate(data, count, data, data, factor)
+                    b0, b1 = r0 // factor, r1 // factor
+                    grp[f'{param}_mean'][b0:b1] = mean
+                    grp[f'{param}_min'][b0:b1] = vmin
+                    grp[f'{param}_max'][b0:b1] = vmax
+                    grp[f'{param}_count'][b0:b1] = total
+
+        # Coarser levels from the previous level
+        while k and nbins // factor >= min_bins:
+            prev = out[f'level_{k}']
+            k += 1
+            nbins = nbins // factor
+            grp = _create_level(out, k, nbins, shape)
+            pu = prev['utime'][:nbins * factor]
+            grp['utime'][:] = np.column_stack((pu[::factor, 0], pu[factor - 1::factor, 1]))
+            for param in PARAMETERS:
+                mean, total, vmin, vmax = _decimate(
+                    prev[f'{param}_mean'][:nbins * factor], prev[f'{param}_count'][:nbins * factor],
+                    prev[f'{param}_min'][:nbins * factor], prev[f'{param}_max'][:nbins * factor], factor)
+                grp[f'{param}_mean'][:] = mean
+                grp[f'{param}_min'][:] = vmin
+                grp[f'{param}_max'][:] = vmax
+                grp[f'{param}_count'][:] = total
+
+        out.attrs['levels'] = k
+        out.attrs['source_mtime'] = mtime
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def select_level(integration, factor, levels, tstart, tend, width_px):
+    """Coarsest level with at least one record per pixel column over [tstart, tend] (unix seconds)."""
+    span = max(tend - tstart, integration)
+    for k in range(levels, 0, -1):
+        if span / (integration * factor**k) >= width_px:
+            return k
+    return 0
+
+
+def _to_unix(t, default):
+    if t is None:
+        return default
+    return np.datetime64(t, 'ms').astype(np.int64) / 1000.
+
+
+@timed('pfisr_read_rti')
+def read_rti(h5file, beamcode=None, start_time=None, end_time=None, width_px=2000, stat='mean', build=False):
+    """
+    RTI data for one beam (default: highest elevation) at the level of detail that matches the time
+    span and width_px:
+        time (datetime64[s], record / bin starts), alt (m, finite gates only), {param: (n, nalt)}, level
+    The pyramid is only used when it exists and matches the fitted file's mtime (build it with
+    build_pyramid, or pass build=True); otherwise the beam is read at full resolution.
+    """
+    with h5py.File(h5file, 'r') as h5:
+        beamcodes = h5['BeamCodes'][:]
+        bidx = np.argmax(beamcodes[:, 2]) if beamcode is None else np.where(beamcodes[:, 0] == beamcode)[0][0]
+        alt = h5['FittedParams/Altitude'][bidx, :]
+        utime = h5['Time/UnixTime'][:]
+    good = np.isfinite(alt)
+    tstart = _to_unix(start_time, utime[0, 0])
+    tend = _to_unix(end_time, utime[-1, 1])
+
+    path = build_pyramid(h5file) if build else pyramid_path(h5file)
+    level = 0
+    if os.path.exists(path):
+        with h5py.File(path, 'r') as f:
+            if f.attrs.get('source_mtime') == os.path.getmtime(h5file):
+                level = select_level(f.attrs['integration'], f.attrs['factor'], f.attrs['levels'], tstart, tend,
+                                     width_px)
+
+    if level == 0:
+        i0 = max(0, int(np.searchsorted(utime[:, 1], tstart)))
+        i1 = int(np.searchsorted(utime[:, 0], tend, side='right'))
+        with h5py.File(h5file, 'r') as h5:
+            # One beam per hyperslab, as in the original plotters
+            data = {p: _read_param(h5, p, i0, i1, bidx)[:, good] for p in PARAMETERS}
+        return utime[i0:i1, 0].astype('datetime64[s]'), alt[good], data, level
+
+    with h5py.File(path, 'r') as f:
+        grp = f[f'level_{level}']
+        lut = grp['utime'][:]
+        i0 = max(0, int(np.searchsorted(lut[:, 1], tstart)))
+        i1 = int(np.searchsorted(lut[:, 0], tend, side='right'))
+        data = {p: grp[f'{p}_{stat}'][i0:i1, bidx, :][:, good] for p in PARAMETERS}
+    return lut[i0:i1, 0].astype('datetime64[s]'), alt[good], data, level
+
+
+if __name__ == "__main__":
+    import sys
+    import glob
+
+    if len(sys.argv) < 2:
+        print("Usage: python pfisr_rti_pyramid.py <fitted file or directory>")
+        sys.exit(1)
+
+    target = sys.argv[1]
+    files = sorted(glob.glob(os.path.join(target, '*-fitcal.h5'))) if os.path.isdir(target) else [target]
+    for fn in files:
+        path = build_pyramid(fn)
+        with h5py.File(path, 'r') as f:
+            print(f"{os.path.basename(fn)}: {f.attrs['levels']} levels -> {path}")
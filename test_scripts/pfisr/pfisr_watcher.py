@@ -0,0 +1,224 @@
+import os
+import sys
+import glob
+import json
+import time
+import h5py
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import matplotlib.gridspec as gridspec
+import matplotlib.dates as mdates
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'profiling'))
+from instrumentation import timed
+
+"""
+Purpose:
+    - near-real-time PFISR monitoring during SOP campaigns
+    - polls a directory for *_lp_*-fitcal.h5 / *_ac_*-fitcal.h5 files; for each file only the
+      Time/UnixTime records after the last ingested one are read
+    - new records are appended to a merged AC/LP product (resizable HDF5 datasets, one group per mode);
+      the per-file record offsets are stored in the same group (attr 'offsets') and written in the same
+      h5py session as the append, and records not newer than the last stored one are dropped, so a
+      restart never appends records twice
+    - every file must match the beam code and altitude gates the mode's group was created with;
+      a mismatching file is reported once and listed in the group's 'rejected' attr
+    - the quick-look figure (same layout as pfisr_plotter.py) only shows a trailing window, read from the
+      tail of the merged product, so update latency stays constant however long the night gets
+
+Usage:
+    python pfisr_watcher.py <watch_dir> <output_dir> [poll_seconds]
+"""
+
+PATTERNS = {'ac': '*_ac_*-fitcal.h5', 'lp': '*_lp_*-fitcal.h5'}
+PARAMETERS = ('ne', 'ti', 'te', 'vlos')
+CUTOFF_ALT = 150. * 1000.
+
+
+def _json_attr(grp, name):
+    return json.loads(grp.attrs[name]) if name in grp.attrs else ({} if name == 'offsets' else [])
+
+
+def file_offset(product, mode, filename):
+    """Number of records of filename already ingested into the mode's group (0 if none)."""
+    if mode not in product:
+        return 0
+    return int(_json_attr(product[mode], 'offsets').get(filename, 0))
+
+
+def is_rejected(product, mode, filename):
+    return mode in product and filename in _json_attr(product[mode], 'rejected')
+
+
+def reject(product, mode, filename):
+    rejected = _json_attr(product[mode], 'rejected')
+    product[mode].attrs['rejected'] = json.dumps(rejected + [filename])
+
+
+@timed('pfisr_read_new_records')
+def read_new_records(filename, start, beamcode=None):
+    """
+    Records [start:] of one fitted file for the selected beam (default: highest elevation).
+    Returns None if there is nothing new.
+    """
+    with h5py.File(filename, 'r') as h5:
+        nrec = h5['Time/UnixTime'].shape[0]
+        if nrec <= start:
+            return None
+        beamcodes = h5['BeamCodes'][:]
+        bidx = np.argmax(beamcodes[:, 2]) if beamcode is None else np.where(beamcodes[:, 0] == beamcode)[0][0]
+        fits = h5['FittedParams/Fits'][start:nrec, bidx, :, :, :]
+        return {
+            'nrec': nrec,
+            'beamcode': beamcodes[bidx, 0],
+            'altitude': h5['FittedParams/Altitude'][bidx, :],
+            'utime': h5['Time/UnixTime'][start:nrec],
+            'ne': h5['FittedParams/Ne'][start:nrec, bidx, :],
+            'ti': fits[:, :, 0, 1],
+            'te': fits[:, :, -1, 1],
+            'vlos': fits[:, :, 0, 3],
+        }
+
+
+def append_to_product(product, mode, new, filename):
+    """
+    Append new records to the merged product group for this mode (ac / lp) and store the file's record
+    offset with them. Records not newer than the last stored one are dropped. Raises ValueError if the
+    file's beam code or altitude gates differ from the group's. Returns the number of records appended.
+    """
+    if mode not in product:
+        grp = product.create_group(mode)
+        grp.create_dataset('altitude', data=new['altitude'])
+        grp.attrs['beamcode'] = new['beamcode']
+        grp.create_dataset('utime', shape=(0, 2), maxshape=(None, 2), chunks=(256, 2), dtype='f8')
+        nalt = new['altitude'].shape[0]
+        for p in PARAMETERS:
+            grp.create_dataset(p, shape=(0, nalt), maxshape=(None, nalt), chunks=(64, nalt), dtype='f4')
+    grp = product[mode]
+
+    alt = grp['altitude'][:]
+    if grp.attrs['beamcode'] != new['beamcode']:
+        raise ValueError(f"beam code {new['beamcode']} differs from the product's {grp.attrs['beamcode']}")
+    if alt.shape != new['altitude'].shape or not np.allclose(alt, new['altitude'], equal_nan=True):
+        raise ValueError("altitude gates differ from the product's")
+
+    n0 = grp['utime'].shape[0]
+    keep = np.ones(new['utime'].shape[0], dtype=bool)
+    if n0:
+        # Records already in the product (e.g. re-read after a crash) are dropped
+        keep = new['utime'][:, 0] > grp['utime'][n0 - 1, 0]
+    n = int(keep.sum())
+    for key in ('utime',) + PARAMETERS:
+        grp[key].resize(n0 + n, axis=0)
+        grp[key][n0:] = new[key][keep]
+
+    offsets = _json_attr(grp, 'offsets')
+    offsets[filename] = int(new['nrec'])
+    grp.attrs['offsets'] = json.dumps(offsets)
+    return n
+
+
+def quicklook(product_file, outfile, window_hours=3.):
+    """Render the trailing window_hours of the merged product (AC below, LP above the cutoff altitude)."""
+    fig = plt.figure(figsize=(10, 10))
+    gs = gridspec.GridSpec(4, 1)
+    axes = [fig.add_subplot(gs[i]) for i in range(4)]
+    styles = {
+        'ne': (0., 4.e11, 'viridis', r'Electron Density (m$^{-3}$)'),
+        'ti': (0., 3.e3, 'magma', r'Ion Temperature (K)'),
+        'te': (0., 5.e3, 'inferno', r'Electron Temperature (K)'),
+        'vlos': (-500., 500., 'bwr', r'Line-of-Site Velocity (m/s)'),
+    }
+
+    with h5py.File(product_file, 'r') as product:
+        tend = max(product[m]['utime'][-1, 1] for m in product if product[m]['utime'].shape[0])
+        tstart = tend - window_hours * 3600.
+        for mode in product:
+            grp = product[mode]
+            utime = grp['utime']
+            nrec = utime.shape[0]
+            if nrec == 0:
+                continue
+            # Only the tail of the product is read: estimate the window length in records from the
+            # latest integration time, then trim to tstart
+            integration = max(1., utime[-1, 1] - utime[-1, 0])
+            i0 = max(0, nrec - 1 - int(np.ceil(window_hours * 3600. / integration)))
+            t = utime[i0:, 0]
+            i0 += int(np.searchsorted(t, tstart))
+            time_dt = t[i0 - (nrec - len(t)):].astype('datetime64[s]')
+            alt = grp['altitude'][:]
+            good = np.isfinite(alt)
+            aidx = np.argmin(np.abs(alt[good] - CUTOFF_ALT))
+            rows = slice(None, aidx) if mode == 'ac' else slice(aidx, None)
+            for ax, p in zip(axes, PARAMETERS):
+                vmin, vmax, cmap, label = styles[p]
+                data = grp[p][i0:][:, good][:, rows]
+                c = ax.pcolormesh(time_dt, alt[good][rows], data.T, vmin=vmin, vmax=vmax, cmap=cmap)
+                c.set_label(label)
+
+    for ax, p in zip(axes, PARAMETERS):
+        ax.set_ylabel('Altitude (m)')
+        ax.set_xlim(np.datetime64(int(tstart), 's'), np.datetime64(int(tend), 's'))
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+        if ax.collections:
+            fig.colorbar(ax.collections[-1], ax=ax, label=styles[p][3])
+    axes[-1].set_xlabel('Universal Time')
+
+    fig.savefig(outfile + '.tmp.png', dpi=150, bbox_inches='tight')
+    plt.close(fig)
+    os.replace(outfile + '.tmp.png', outfile)
+
+
+def poll_once(watch_dir, output_dir):
+    """Ingest new records from every matching file; returns the number of records ingested."""
+    product_file = os.path.join(output_dir, 'pfisr_merged.h5')
+    ingested = 0
+    with h5py.File(product_file, 'a') as product:
+        for mode, pattern in PATTERNS.items():
+            for filename in sorted(glob.glob(os.path.join(watch_dir, pattern))):
+                if is_rejected(product, mode, filename):
+                    continue
+                start = file_offset(product, mode, filename)
+                try:
+                    new = read_new_records(filename, start)
+                except (OSError, KeyError) as e:
+                    # File still being written by the processing chain; try again next poll
+                    print(f"Skipping {os.path.basename(filename)} this round: {e}")
+                    continue
+                if new is None:
+                    continue
+                try:
+                    n = append_to_product(product, mode, new, filename)
+                except ValueError as e:
+                    print(f"Rejecting {os.path.basename(filename)} for the {mode} product: {e}")
+                    reject(product, mode, filename)
+                    continue
+                ingested += n
+                print(f"{os.path.basename(filename)}: +{n} records")
+    return ingested
+
+
+def watch(watch_dir, output_dir, poll_seconds=60., window_hours=3.):
+    os.makedirs(output_dir, exist_ok=True)
+
+    while True:
+        t0 = time.time()
+        if poll_once(watch_dir, output_dir):
+            quicklook(os.path.join(output_dir, 'pfisr_merged.h5'), os.path.join(output_dir, 'pfisr_quicklook.png'),
+                      window_hours)
+            print(f"Updated in {time.time() - t0:.2f} s")
+        time.sleep(max(0., poll_seconds - (time.time() - t0)))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python pfisr_watcher.py <watch_dir> <output_dir> [poll_seconds]")
+        sys.exit(1)
+
+    poll = float(sys.argv[3]) if len(sys.argv) > 3 else 60.
+    try:
+        watch(sys.argv[1], sys.argv[2], poll)
+    except KeyboardInterrupt:
+        print("Stopped.")
@@ -0,0 +1,164 @@
+import os
+import sys
+import numpy as np
+
+"""
+Purpose:
+    - pipeline definition for the 2023-02-27 event (events/20230227), built on event_pipeline.py
+    - stages: index lookup -> PFISR / Swarm / VVELS extraction -> alignment -> Lompe inputs ->
+      Lompe evaluation -> diff metrics -> figures
+    - rerunning only recomputes the stages whose inputs, parameters or code changed
+
+Usage:
+    python event_20230227.py [stage ...]      run (default: all stages)
+    python event_20230227.py --status         show which stages are cached / stale
+"""
+
+# Sibling script directories (stages reuse the existing readers)
+_HERE = os.path.dirname(os.path.abspath(__file__))
+for _d in ('file_readers', 'vvels', 'swarm', 'lompe', 'alignment'):
+    sys.path.insert(0, os.path.join(_HERE, '..', _d))
+
+from event_pipeline import Pipeline
+
+EVENT_DIR = '/Users/clevenger/Projects/paper01/events/20230227'
+DATA_DIR = '/Users/clevenger/Projects/paper01/sop23_data/202302/27'
+START = '2023-02-27T08:00:00'
+END = '2023-02-27T09:30:00'
+# Instrument files index_lookup depends on (the rest of DATA_DIR does not change its result)
+DATA_INPUTS = [os.path.join(DATA_DIR, '*_lp_*.h5'), os.path.join(DATA_DIR, '*TCT02*.cdf')]
+
+
+def index_lookup(ctx):
+    from metadata_crawler import crawl, query
+    db = os.path.join(ctx['out_dir'], 'index.sqlite')
+    crawl(db, [ctx['params']['data_dir']])
+    found = {
+        'pfisr_lp': query(db, dataset='/Time/UnixTime', name_like='_lp_'),
+        'tct': query(db, fmt='cdf', name_like='TCT02'),
+    }
+    missing = [product for product, files in found.items() if not files]
+    if missing:
+        raise FileNotFoundError(f"No {', '.join(missing)} files indexed in {ctx['params']['data_dir']}")
+    return found
+
+
+def extract_pfisr(ctx, index_lookup):
+    import h5py
+    with h5py.File(index_lookup['pfisr_lp'][0], 'r') as h5:
+        utime = h5['Time/UnixTime'][:]
+        beamcodes = h5['BeamCodes'][:]
+        bidx = np.argmax(beamcodes[:, 2])
+        return {
+            'utime': utime,
+            'altitude': h5['FittedParams/Altitude'][bidx, :],
+            'ne': h5['FittedParams/Ne'][:, bidx, :],
+            'vlos': h5['FittedParams/Fits'][:, bidx, :, 0, 3],
+        }
+
+
+def extract_swarm(ctx, index_lookup):
+    from swarm_pfisr_los_projection import load_swarm_tct
+    return load_swarm_tct(index_lookup['tct'][0], np.datetime64(START), np.datetime64(END))
+
+
+def extract_vvels(ctx):
+    from vvels_lompe_converter import convert
+    epochs = np.arange(np.datetime64(START), np.datetime64(END), np.timedelta64(ctx['params']['cadence_min'], 'm'))
+    return convert(ctx['inputs'][0], epochs)
+
+
+def alignment(ctx, extract_pfisr, extract_swarm, extract_vvels):
+    from instrument_alignment import epoch_grid, align
+    p = ctx['params']
+    t_grid = epoch_grid(START, END, p['step_s'])
+    aidx = int(np.nanargmin(np.abs(extract_pfisr['altitude'] - p['pfisr_alt_m'])))
+    sources = [
+        {'name': 'pfisr', 'start': extract_pfisr['utime'][:, 0], 'end': extract_pfisr['utime'][:, 1],
+         'values': {'ne': extract_pfisr['ne'][:, aidx], 'vlos': extract_pfisr['vlos'][:, aidx]}},
+        {'name': 'tct', 'time': extract_swarm['time'], 'method': 'mean', 'tolerance': p['step_s'],
+         'values': {'vel': extract_swarm['vel']}},
+        {'name': 'vvels', 'time': extract_vvels['time'], 'method': 'nearest', 'tolerance': 300.,
+         'values': {'vel': np.nanmean(extract_vvels['values'], axis=-1)}},
+    ]
+    return align(t_grid, sources)
+
+
+def lompe_inputs(ctx, extract_vvels):
+    from vvels_lompe_converter import write_epoch_files
+    return write_epoch_files(extract_vvels, ctx['out_dir'])
+
+
+def lompe_evaluation(ctx):
+    from lompe_batch_evaluator import run_batch
+    return run_batch(os.path.join(ctx['event_dir'], ctx['params']['lompe_dir']),
+                     store_path=os.path.join(ctx['out_dir'], 'lompe_batch_results.h5'))
+
+
+def diff_metrics(ctx, lompe_evaluation):
+    from lompe_batch_evaluator import read_field
+    metrics = {}
+    for field in ctx['params']['fields']:
+        names, data, _ = read_field(lompe_evaluation, field)
+        if ctx['params']['reference'] not in names:
+            continue
+        ref = data[names.index(ctx['params']['reference'])]
+        rms = np.sqrt(np.nanmean((data - ref)**2, axis=tuple(range(1, data.ndim))))
+        metrics[field] = dict(zip(names, rms))
+    return metrics
+
+
+def figures(ctx, alignment, diff_metrics):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    paths = []
+    fig, axs = plt.subplots(2, 1, figsize=(12, 6), sharex=True)
+    axs[0].plot(alignment.index, alignment['pfisr_vlos'], label='PFISR Vlos')
+    axs[0].plot(alignment.index, alignment['vvels_vel_1'], label='VVELS north')
+    axs[0].set_ylabel('Velocity (m/s)')
+    axs[0].legend()
+    axs[1].plot(alignment.index, alignment['pfisr_ne'], color='k')
+    axs[1].set_ylabel(r'Ne (m$^{-3}$)')
+    axs[1].set_xlabel('Universal Time')
+    paths.append(os.path.join(ctx['out_dir'], 'aligned_timeseries.png'))
+    fig.savefig(paths[-1], dpi=300, bbox_inches='tight')
+    plt.close(fig)
+
+    for field, rms in diff_metrics.items():
+        names = sorted(rms, key=rms.get)
+        fig, ax = plt.subplots(figsize=(8, 0.3 * len(names) + 1))
+        ax.barh(names, [rms[n] for n in names], color='tab:blue')
+        ax.set_xlabel(f'RMS {field} difference from {ctx["params"]["reference"]}')
+        paths.append(os.path.join(ctx['out_dir'], f'{field}_rms_diff.png'))
+        fig.savefig(paths[-1], dpi=300, bbox_inches='tight')
+        plt.close(fig)
+    return paths
+
+
+def build_pipeline(event_dir=EVENT_DIR):
+    p = Pipeline(event_dir)
+    p.add('index_lookup', index_lookup, inputs=DATA_INPUTS, params={'data_dir': DATA_DIR})
+    p.add('extract_pfisr', extract_pfisr, deps=['index_lookup'])
+    p.add('extract_swarm', extract_swarm, deps=['index_lookup'])
+    p.add('extract_vvels', extract_vvels, inputs=['vvels/outputs/20230227_vvels.h5'], params={'cadence_min': 5})
+    p.add('alignment', alignment, deps=['extract_pfisr', 'extract_swarm', 'extract_vvels'],
+          params={'step_s': 10., 'pfisr_alt_m': 300.e3})
+    p.add('lompe_inputs', lompe_inputs, deps=['extract_vvels'])
+    p.add('lompe_evaluation', lompe_evaluation, inputs=['lompe/individual_contribution_sensitivity_test'],
+          params={'lompe_dir': 'lompe/individual_contribution_sensitivity_test'})
+    p.add('diff_metrics', diff_metrics, deps=['lompe_evaluation'],
+          params={'fields': ['FAC', 'E_pot', 'v'], 'reference': '13_all'})
+    p.add('figures', figures, deps=['alignment', 'diff_metrics'])
+    return p
+
+
+if __name__ == "__main__":
+    pipeline = build_pipeline()
+    args = sys.argv[1:]
+    if args == ['--status']:
+        for name, state in pipeline.status().items():
+            print(f"{name:20s} {state}")
+    else:
+        pipeline.run(args or None)
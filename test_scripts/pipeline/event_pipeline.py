@@ -0,0 +1,223 @@
+import os
+import glob
+import json
+import time
+import pickle
+import fnmatch
+import inspect
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+"""
+Purpose:
+    - declarative per-event processing pipeline (index lookup -> extraction -> alignment -> Lompe inputs ->
+      Lompe evaluation -> diff metrics -> figures) instead of running every script by hand
+    - each stage declares
+        inputs  - files, directories or glob patterns it reads (relative to the event directory); cache
+                  sidecars the readers write next to their sources (SIDECAR_PATTERNS) are never inputs
+        deps    - upstream stages whose return values it receives as keyword arguments
+        params  - JSON-serialisable settings
+    - a stage's cache key is a content hash of its inputs, params, function source and upstream keys;
+      the return value is pickled to <event_dir>/.pipeline/<stage>/<key>.pkl, so only stale stages rerun
+    - stages whose dependencies are satisfied run in parallel (process pool by default, so stage
+      functions must be module-level)
+    - stage functions are called as func(ctx, **upstream_results); ctx is a dict with event_dir,
+      out_dir (a per-stage directory for files such as figures), params and the resolved input paths
+"""
+
+CACHE_DIRNAME = '.pipeline'
+HASH_BLOCK = 1 << 20
+# Derived files written next to the data by the readers (RTI pyramids, frame indexes, skymap lookup
+# tables, scan summaries, repacked copies, remap weights); hashing them would make every read a change
+SIDECAR_PATTERNS = ('*.rti_pyramid.h5', '*.frame_index.npz', 'skymap_lut_*.npy', '*.summary.json',
+                    '*.repacked.h5', '*.meta.npz', '*.tmp')
+
+
+def _is_sidecar(path):
+    name = os.path.basename(path)
+    return any(fnmatch.fnmatch(name, p) for p in SIDECAR_PATTERNS)
+
+
+class Stage:
+    def __init__(self, name, func, inputs=(), deps=(), params=None):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.deps = tuple(deps)
+        self.params = params or {}
+
+
+def _file_digest(path, memo):
+    """sha256 of a file's content, memoised on (size, mtime) so unchanged files are not re-read."""
+    st = os.stat(path)
+    entry = memo.get(path)
+    if entry and entry['size'] == st.st_size and entry['mtime'] == st.st_mtime:
+        return entry['sha256']
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            h.update(block)
+    memo[path] = {'size': st.st_size, 'mtime': st.st_mtime, 'sha256': h.hexdigest()}
+    return memo[path]['sha256']
+
+
+def resolve_inputs(event_dir, patterns):
+    """Expand input patterns (files, directories, globs) to a sorted list of files, without sidecars."""
+    files = []
+    for pattern in patterns:
+        path = pattern if os.path.isabs(pattern) else os.path.join(event_dir, pattern)
+        for match in sorted(glob.glob(path)):
+            if os.path.isdir(match):
+                for dirpath, dirnames, filenames in os.walk(match):
+                    dirnames[:] = [d for d in dirnames if d != CACHE_DIRNAME]
+                    files += [os.path.join(dirpath, f) for f in filenames]
+            else:
+                files.append(match)
+    return sorted(set(f for f in files if not _is_sidecar(f)))
+
+
+def _run_stage(func, ctx, upstream):
+    t0 = time.time()
+    os.makedirs(ctx['out_dir'], exist_ok=True)
+    return func(ctx, **upstream), time.time() - t0
+
+
+class Pipeline:
+    def __init__(self, event_dir, cache_dir=None):
+        self.event_dir = event_dir
+        self.cache_dir = cache_dir or os.path.join(event_dir, CACHE_DIRNAME)
+        self.stages = {}
+
+    def add(self, name, func, inputs=(), deps=(), params=None):
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}' (add stages in order)")
+        self.stages[name] = Stage(name, func, inputs, deps, params)
+        return self.stages[name]
+
+    def stage(self, name=None, inputs=(), deps=(), params=None):
+        """Decorator form of add()."""
+        def register(func):
+            self.add(name or func.__name__, func, inputs, deps, params)
+            return func
+        return register
+
+    def _order(self, targets):
+        """Stages needed for targets, in dependency order."""
+        needed, order = set(), []
+
+        def visit(name):
+            if name in needed:
+                return
+            needed.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            order.append(name)
+
+        for t in targets:
+            visit(t)
+        return order
+
+    def keys(self, targets=None):
+        """Content-hash cache key of every stage needed for targets."""
+        memo_file = os.path.join(self.cache_dir, 'file_hashes.json')
+        memo = {}
+        if os.path.exists(memo_file):
+            with open(memo_file, 'r') as f:
+                memo = json.load(f)
+
+        keys = {}
+        for name in self._order(targets or list(self.stages)):
+            s = self.stages[name]
+            inputs = resolve_inputs(self.event_dir, s.inputs)
+            try:
+                source = inspect.getsource(s.func)
+            except (OSError, TypeError):
+                source = f"{s.func.__module__}.{s.func.__qualname__}"
+            spec = {
+                'stage': name,
+                'source': source,
+                'params': s.params,
+                'inputs': [(os.path.relpath(p, self.event_dir), _file_digest(p, memo)) for p in inputs],
+                'deps': {d: keys[d] for d in s.deps},
+            }
+            keys[name] = hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()[:20]
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(memo_file + '.tmp', 'w') as f:
+            json.dump(memo, f)
+        os.replace(memo_file + '.tmp', memo_file)
+        return keys
+
+    def _result_path(self, name, key):
+        return os.path.join(self.cache_dir, name, f"{key}.pkl")
+
+    def _load(self, name, key):
+        with open(self._result_path(name, key), 'rb') as f:
+            return pickle.load(f)
+
+    def _store(self, name, key, result):
+        path = self._result_path(name, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+
+    def status(self, targets=None):
+        """{stage: 'cached' | 'stale'} for every stage needed for targets."""
+        keys = self.keys(targets)
+        return {n: 'cached' if os.path.exists(self._result_path(n, k)) else 'stale' for n, k in keys.items()}
+
+    def run(self, targets=None, max_workers=None, force=(), executor='process'):
+        """
+        Run every stale stage needed for targets (default: all) and return {stage: result} for the targets.
+        force lists stages to rerun even if cached; executor is 'process' or 'thread'.
+        """
+        targets = list(targets or self.stages)
+        keys = self.keys(targets)
+        stale = {n for n, k in keys.items() if n in force or not os.path.exists(self._result_path(n, k))}
+        print(f"{len(keys)} stages, {len(stale)} to run: {', '.join(n for n in keys if n in stale) or '-'}")
+
+        results = {}
+
+        def result(name):
+            if name not in results:
+                results[name] = self._load(name, keys[name])
+            return results[name]
+
+        pool_cls = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+        pending, running = [n for n in keys if n in stale], {}
+        with pool_cls(max_workers=max_workers) as pool:
+            while pending or running:
+                # Submit every stale stage whose upstream stages are all done
+                for name in list(pending):
+                    s = self.stages[name]
+                    if any(d in pending or d in running.values() for d in s.deps):
+                        continue
+                    ctx = {
+                        'event_dir': self.event_dir,
+                        'out_dir': os.path.join(self.event_dir, 'pipeline_outputs', name),
+                        'params': s.params,
+                        'inputs': resolve_inputs(self.event_dir, s.inputs),
+                        'key': keys[name],
+                    }
+                    upstream = {d: result(d) for d in s.deps}
+                    running[pool.submit(_run_stage, s.func, ctx, upstream)] = name
+                    pending.remove(name)
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name = running.pop(fut)
+                    try:
+                        out, elapsed = fut.result()
+                    except Exception:
+                        # Let running stages finish; nothing downstream of a failed stage can run
+                        for other in running:
+                            other.cancel()
+                        print(f" Stage {name} failed")
+                        raise
+                    self._store(name, keys[name], out)
+                    results[name] = out
+                    print(f"  done {name} ({elapsed:.1f} s)")
+
+        return {t: result(t) for t in targets}
@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import time
+import runpy
+import atexit
+import resource
+import threading
+import functools
+from datetime import datetime
+
+"""
+Purpose:
+    - lightweight timing instrumentation for the data loaders and plotters
+    - named spans record wall time, bytes read by the process and the peak RSS:
+        with span('pfisr_read', file=fn):
+            ...
+        @timed('swarm_mag_read')
+        def read_mag_file(...): ...
+    - switched on by the environment variable PAPER01_PROFILE (any value except '' / '0'); when off,
+      span() is a shared no-op context manager and timed() returns the function unchanged
+    - when on, every matplotlib Figure.savefig is wrapped in a 'savefig' span, and at exit the run writes
+      profile_<script>_<timestamp>_<pid>.json (to PAPER01_PROFILE_DIR or the working directory) and prints
+      a summary table per span name
+    - bytes read come from /proc/self/io (rchar) or psutil when available, otherwise from block input
+      counts; both counters are per process, so spans running concurrently in threads overlap
+    - any script can be profiled without editing it, savefig calls included:
+        python test_scripts/profiling/instrumentation.py <script.py> [args ...]
+    - only the parent process is profiled: ProcessPoolExecutor / multiprocessing workers (event pipeline,
+      metadata crawler, synthetic generator) exit without running atexit handlers, so spans recorded
+      inside workers are not written; time the submitting side (pool.map / future.result) instead
+"""
+
+ENABLED = os.environ.get('PAPER01_PROFILE', '') not in ('', '0')
+TRACE_DIR = os.environ.get('PAPER01_PROFILE_DIR', os.getcwd())
+
+_records = []
+_lock = threading.Lock()
+_local = threading.local()
+_t0 = time.perf_counter()
+
+
+def _bytes_read():
+    try:
+        with open('/proc/self/io', 'r') as f:
+            for line in f:
+                if line.startswith('rchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().io_counters().read_bytes
+    except (ImportError, AttributeError, OSError):
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_inblock * 512
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak / 1024.**2 if sys.platform == 'darwin' else peak / 1024.
+
+
+class _Span:
+    def __init__(self, name, meta):
+        self.name = name
+        self.meta = meta
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1] if stack else None
+        stack.append(self.name)
+        self.start = time.perf_counter()
+        self.bytes0 = _bytes_read()
+        self.peak0 = _peak_rss_mb()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.start
+        peak = _peak_rss_mb()
+        _local.stack.pop()
+        record = {
+            'name': self.name,
+            'parent': self.parent,
+            'thread': threading.current_thread().name,
+            'start_s': self.start - _t0,
+            'wall_s': wall,
+            'bytes_read': _bytes_read() - self.bytes0,
+            'peak_rss_mb': peak,
+            'rss_growth_mb': peak - self.peak0,
+            'error': exc_type.__name__ if exc_type else None,
+        }
+        if self.meta:
+            record['meta'] = {k: str(v) for k, v in self.meta.items()}
+        with _lock:
+            _records.append(record)
+        return False
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name, **meta):
+    """Context manager timing one named span (no-op unless PAPER01_PROFILE is set)."""
+    return _Span(name, meta) if ENABLED else _NO_SPAN
+
+
+def timed(name=None):
+    """Decorator wrapping every call of a function in a span (default name: the function name)."""
+    def wrap(func):
+        if not ENABLED:
+            return func
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            with _Span(label, None):
+                return func(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def records():
+    with _lock:
+        return list(_records)
+
+
+def summary(recs=None):
+    """Per-name totals sorted by total wall time -> list of dicts."""
+    rows = {}
+    for r in recs if recs is not None else records():
+        row = rows.setdefault(r['name'], {'name': r['name'], 'count': 0, 'total_s': 0., 'max_s': 0.,
+                                          'bytes_read': 0, 'peak_rss_mb': 0.})
+        row['count'] += 1
+        row['total_s'] += r['wall_s']
+        row['max_s'] = max(row['max_s'], r['wall_s'])
+        row['bytes_read'] += r['bytes_read']
+        row['peak_rss_mb'] = max(row['peak_rss_mb'], r['peak_rss_mb'])
+    return sorted(rows.values(), key=lambda row: row['total_s'], reverse=True)
+
+
+def print_summary(rows=None):
+    rows = summary() if rows is None else rows
+    print(f"\n{'span':32s} {'count':>6s} {'total (s)':>10s} {'mean (s)':>10s} {'max (s)':>10s} "
+          f"{'read (MB)':>10s} {'peak RSS (MB)':>14s}")
+    for r in rows:
+        print(f"{r['name'][:32]:32s} {r['count']:6d} {r['total_s']:10.3f} {r['total_s'] / r['count']:10.3f} "
+              f"{r['max_s']:10.3f} {r['bytes_read'] / 1024.**2:10.1f} {r['peak_rss_mb']:14.1f}")
+
+
+def dump(path=None):
+    """Write the JSON trace of this run and print the summary table. Returns the trace path."""
+    recs = records()
+    if not recs:
+        return None
+    if path is None:
+        script = os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0] or 'python'
+        stamp = datetime.now().strftime('%Y%m%dT%H%M%S')
+        path = os.path.join(TRACE_DIR, f"profile_{script}_{stamp}_{os.getpid()}.json")
+    rows = summary(recs)
+    with open(path, 'w') as f:
+        json.dump({'argv': sys.argv, 'pid': os.getpid(), 'wall_s': time.perf_counter() - _t0,
+                   'summary': rows, 'spans': recs}, f, indent=1)
+    print_summary(rows)
+    print(f"Profile trace written to {path}")
+    return path
+
+
+def _instrument_savefig():
+    """Time every Figure.savefig (plt.savefig goes through it as well)."""
+    from matplotlib.figure import Figure
+    if getattr(Figure.savefig, '_instrumented', False):
+        return
+    original = Figure.savefig
+
+    @functools.wraps(original)
+    def savefig(self, fname, *args, **kwargs):
+        target = os.path.basename(fname) if isinstance(fname, (str, os.PathLike)) else type(fname).__name__
+        with _Span('savefig', {'file': target, 'dpi': kwargs.get('dpi', 'figure')}):
+            return original(self, fname, *args, **kwargs)
+
+    savefig._instrumented = True
+    Figure.savefig = savefig
+
+
+if ENABLED:
+    try:
+        _instrument_savefig()
+    except ImportError:
+        pass
+    atexit.register(dump)
+
+
+def run_script(path, args=()):
+    """Run a script as __main__ with instrumentation switched on (used by the command line entry point)."""
+    global ENABLED
+    if not ENABLED:
+        ENABLED = True
+        try:
+            _instrument_savefig()
+        except ImportError:
+            pass
+        atexit.register(dump)
+    sys.argv = [path] + list(args)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+    runpy.run_path(path, run_name='__main__')
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python instrumentation.py <script.py> [args ...]")
+        sys.exit(1)
+    # Switch profiling on before the scripts' own 'from instrumentation import ...' runs, and route those
+    # imports to one module instance (this file is __main__ here) so all spans land in the same trace
+    os.environ['PAPER01_PROFILE'] = os.environ.get('PAPER01_PROFILE') or '1'
+    import instrumentation
+    instrumentation.run_script(sys.argv[1], sys.argv[2:])
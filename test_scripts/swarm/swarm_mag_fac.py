@@ -0,0 +1,172 @@
+import numpy as np
+
+"""
+Purpose:
+    - magnetometer counterpart to the TCT drift product: process whole Swarm MAG LR passes as arrays
+        1. residuals dB = B_NEC - B_NEC_CHAOS
+        2. rotation of the residuals into a mean-field-aligned (MFA) frame
+        3. single-satellite field-aligned current estimate from the along-track gradient of the
+           cross-track residual (infinite current sheet assumption, central finite differences)
+    - input is either a VirES dataframe (B_NEC and B_NEC_CHAOS columns) or arrays from the
+      local loader (swarm_mag_loader.py) with model values computed separately
+"""
+
+MU0 = 4e-7 * np.pi
+RE_M = 6371.2e3
+
+
+def from_vires_dataframe(df, model='CHAOS'):
+    """Pull contiguous arrays out of a VirES dataframe (one np.stack per vector column)."""
+    return {
+        'time': df.index.values.astype('datetime64[ms]'),
+        'B_NEC': np.stack(df['B_NEC'].values).astype(np.float64),
+        'B_model': np.stack(df[f'B_NEC_{model}'].values).astype(np.float64),
+        'Latitude': df['Latitude'].values.astype(np.float64),
+        'Longitude': df['Longitude'].values.astype(np.float64),
+        'Radius': df['Radius'].values.astype(np.float64),
+    }
+
+
+def chaos_model(time, lat, lon, radius):
+    """CHAOS main + crustal field B_NEC (nT) at the satellite positions; requires chaosmagpy."""
+    import chaosmagpy as cp
+    model = cp.load_CHAOS_matfile()
+    mjd = (np.asarray(time, dtype='datetime64[ms]') - np.datetime64('2000-01-01', 'ms')) / np.timedelta64(1, 'D')
+    B_r, B_t, B_p = model.synth_values_tdep(mjd, radius / 1e3, 90. - lat, lon)
+    B_r_s, B_t_s, B_p_s = model.synth_values_static(radius / 1e3, 90. - lat, lon)
+    # (r, theta, phi) -> (N, E, C)
+    return np.column_stack((-(B_t + B_t_s), B_p + B_p_s, -(B_r + B_r_s)))
+
+
+def residuals(B_NEC, B_model):
+    """B - B_model, (N, 3) nT."""
+    return np.asarray(B_NEC, dtype=np.float64) - np.asarray(B_model, dtype=np.float64)
+
+
+def mfa_basis(B_model):
+    """
+    Mean-field-aligned unit vectors in NEC, each (N, 3):
+        z along the model field, y = z x r_up (eastward), x = y x z (poleward in the north)
+    """
+    z = B_model / np.linalg.norm(B_model, axis=1, keepdims=True)
+    up = np.array([0., 0., -1.])
+    y = np.cross(z, up)
+    y /= np.linalg.norm(y, axis=1, keepdims=True)
+    x = np.cross(y, z)
+    return x, y, z
+
+
+def to_mfa(dB, B_model):
+    """Rotate NEC residuals into the MFA frame -> (N, 3) [x, y, z]."""
+    R = np.stack(mfa_basis(B_model), axis=1)
+    return np.einsum('nij,nj->ni', R, dB)
+
+
+def _seconds(time):
+    time = np.asarray(time)
+    if np.issubdtype(time.dtype, np.datetime64):
+        return (time - time[0]) / np.timedelta64(1, 's')
+    return time.astype(np.float64)
+
+
+def along_track_frame(time, lat, lon, radius):
+    """
+    Horizontal along-track (t) and cross-track (c = r_up x t) unit vectors in NEC plus the horizontal
+    speed (m/s) of the satellite at its own radius (not projected to the ground), from central
+    differences of the positions. The FAC estimate needs the along-track distance at the altitude
+    where dB is measured, so no ground projection is applied.
+    """
+    ts = _seconds(time)
+    lat_r = np.radians(lat)
+    lon_r = np.unwrap(np.radians(lon))
+    vN = radius * np.gradient(lat_r, ts)
+    vE = radius * np.cos(lat_r) * np.gradient(lon_r, ts)
+    speed = np.hypot(vN, vE)
+
+    t = np.column_stack((vN, vE, np.zeros_like(vN))) / speed[:, None]
+    # r_up = (0, 0, -1) in NEC; c = r_up x t
+    c = np.column_stack((t[:, 1], -t[:, 0], np.zeros_like(vN)))
+    return t, c, speed
+
+
+def single_satellite_fac(time, dB, B_model, lat, lon, radius, min_inclination=30., max_gap=1.5):
+    """
+    Radial current density J_r and field-aligned current density j_par (uA/m^2) for a whole pass.
+
+        J_r   = (1/mu0) dB_c/ds                (infinite sheet, s = along-track distance at satellite altitude)
+        j_par = J_r / (b . r_up)               (positive along the model field)
+
+    Samples where the field inclination is below min_inclination, or whose difference stencil spans
+    a data gap longer than max_gap times the median cadence, are NaN.
+    """
+    ts = _seconds(time)
+    t, c, speed = along_track_frame(time, lat, lon, radius)
+
+    dBc = np.einsum('ij,ij->i', dB, c) * 1e-9
+    dBc_dt = np.gradient(dBc, ts)
+    J_r = dBc_dt / speed / MU0 * 1e6
+
+    b = B_model / np.linalg.norm(B_model, axis=1, keepdims=True)
+    b_up = -b[:, 2]
+    inclination = np.degrees(np.arcsin(np.abs(b_up)))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        j_par = np.where(inclination >= min_inclination, J_r / b_up, np.nan)
+
+    # Flag samples whose stencil crosses a gap
+    dt = np.diff(ts)
+    gap = dt > max_gap * np.median(dt)
+    bad = np.zeros(ts.shape, dtype=bool)
+    bad[:-1] |= gap
+    bad[1:] |= gap
+    J_r[bad] = np.nan
+    j_par[bad] = np.nan
+    return J_r, j_par
+
+
+def process_pass(data, B_model=None):
+    """
+    Full processing of one satellite's data dict (time, B_NEC, Latitude, Longitude, Radius[, B_model]).
+    Returns a dict with residuals (NEC and MFA), J_r and j_par.
+    """
+    if B_model is None:
+        B_model = data['B_model'] if 'B_model' in data else chaos_model(
+            data['time'], data['Latitude'], data['Longitude'], data['Radius'])
+    dB = residuals(data['B_NEC'], B_model)
+    J_r, j_par = single_satellite_fac(data['time'], dB, B_model, data['Latitude'], data['Longitude'], data['Radius'])
+    return {
+        'time': data['time'],
+        'dB_NEC': dB,
+        'dB_MFA': to_mfa(dB, B_model),
+        'J_r': J_r,
+        'FAC': j_par,
+    }
+
+
+def screen_fac(results, threshold=1.0):
+    """Times where |FAC| exceeds threshold (uA/m^2), per satellite, for conjunction screening."""
+    return {sat: r['time'][np.abs(np.nan_to_num(r['FAC'])) > threshold] for sat, r in results.items()}
+
+
+if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+    from swarm_mag_loader import load_mag_all
+
+    mag_dir = '/Users/clevenger/Projects/paper01/sop23_data/202303/04/swarm_mag/'
+    start_time = np.datetime64('2023-03-04T00:00:00')
+    end_time = np.datetime64('2023-03-05T00:00:00')
+
+    mag = load_mag_all(mag_dir, start_time, end_time)
+    results = {sat: process_pass(data) for sat, data in mag.items()}
+
+    for sat, times in screen_fac(results).items():
+        print(f"Swarm {sat}: {len(times)} samples with |FAC| > 1 uA/m^2")
+
+    fig, axs = plt.subplots(len(results), 1, figsize=(20, 4 * len(results)), sharex=True, squeeze=False)
+    for ax, (sat, r) in zip(axs[:, 0], results.items()):
+        ax.plot(r['time'], r['FAC'], color='k', linewidth=1)
+        ax.set_ylabel(r'FAC ($\mu$A/m$^2$)')
+        ax.set_title(f'Swarm {sat} single-satellite FAC')
+        ax.grid(True)
+    axs[-1, 0].set_xlabel('Time')
+    plt.tight_layout()
+    plt.savefig('/Users/clevenger/Projects/paper01/sop23_data/202303/04/swarm_fac.png', dpi=300, bbox_inches='tight')
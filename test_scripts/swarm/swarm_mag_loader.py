@@ -0,0 +1,119 @@
+import os
+import re
+import sys
+import glob
+import numpy as np
+import cdflib
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'profiling'))
+from instrumentation import span, timed
+
+"""
+Purpose:
+    - offline alternative to the VirES requests in swarm_mag_plotter.py
+    - read downloaded SW_OPER_MAG?_LR_1B CDF files for Swarm A/B/C concurrently
+    - window selection uses binary search on the Timestamp variable, then only the matching
+      records of the other variables are read (varget startrec/endrec)
+    - B_NEC is returned as one contiguous (N, 3) float64 array (no per-row object column)
+"""
+
+SATELLITES = ('A', 'B', 'C')
+MAG_VARIABLES = ('B_NEC', 'Latitude', 'Longitude', 'Radius', 'Flags_B')
+
+# CDF_EPOCH is milliseconds since 0000-01-01T00:00:00
+CDF_EPOCH_UNIX_OFFSET_MS = 62167219200000
+FILENAME_RANGE = re.compile(r'_(\d{8}T\d{6})_(\d{8}T\d{6})_')
+
+
+def cdf_epoch_to_datetime64(epoch):
+    """Vectorized CDF_EPOCH (ms since year 0) -> datetime64[ms]."""
+    ms = np.round(np.asarray(epoch, dtype=np.float64) - CDF_EPOCH_UNIX_OFFSET_MS).astype(np.int64)
+    return ms.astype('datetime64[ms]')
+
+
+def _filename_range(fn):
+    m = FILENAME_RANGE.search(os.path.basename(fn))
+    if m is None:
+        return None
+    t0, t1 = (np.datetime64(f"{s[:4]}-{s[4:6]}-{s[6:8]}T{s[9:11]}:{s[11:13]}:{s[13:15]}", 's') for s in m.groups())
+    return t0, t1
+
+
+def find_mag_files(mag_dir, sat, starttime, endtime):
+    """MAG LR files of one satellite whose filename time range overlaps [starttime, endtime]."""
+    files = []
+    for fn in sorted(glob.glob(os.path.join(mag_dir, '**', f'SW_OPER_MAG{sat}_LR_1B_*.cdf'), recursive=True)):
+        rng = _filename_range(fn)
+        if rng is None or (rng[0] <= endtime and rng[1] >= starttime):
+            files.append(fn)
+    return files
+
+
+@timed('swarm_mag_read')
+def read_mag_file(fn, starttime, endtime, variables=MAG_VARIABLES):
+    """Records of one MAG LR file inside [starttime, endtime]."""
+    v = cdflib.CDF(fn)
+    with span('cdf_epoch_conversion', file=os.path.basename(fn)):
+        time = cdf_epoch_to_datetime64(v.varget('Timestamp'))
+    stidx = int(np.searchsorted(time, np.datetime64(starttime, 'ms'), side='left'))
+    etidx = int(np.searchsorted(time, np.datetime64(endtime, 'ms'), side='right'))
+
+    data = {'time': time[stidx:etidx]}
+    for var in variables:
+        if etidx > stidx:
+            data[var] = np.asarray(v.varget(var, startrec=stidx, endrec=etidx - 1))
+        else:
+            data[var] = np.empty((0, 3) if var == 'B_NEC' else (0,))
+    return data
+
+
+def load_mag(mag_dir, sat, starttime, endtime, variables=MAG_VARIABLES):
+    """All records of one satellite in the window, concatenated over daily files."""
+    starttime, endtime = np.datetime64(starttime, 'ms'), np.datetime64(endtime, 'ms')
+    parts = [read_mag_file(fn, starttime, endtime, variables) for fn in find_mag_files(mag_dir, sat, starttime, endtime)]
+    if not parts:
+        raise FileNotFoundError(f"No SW_OPER_MAG{sat}_LR_1B files in {mag_dir} covering {starttime} - {endtime}")
+
+    out = {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+    out['B_NEC'] = np.ascontiguousarray(out['B_NEC'], dtype=np.float64).reshape(-1, 3)
+    return out
+
+
+def load_mag_all(mag_dir, starttime, endtime, satellites=SATELLITES, variables=MAG_VARIABLES):
+    """Load A/B/C concurrently -> {sat: data dict}; satellites without files are left out."""
+    def _load(sat):
+        try:
+            return sat, load_mag(mag_dir, sat, starttime, endtime, variables)
+        except FileNotFoundError as e:
+            print(e)
+            return sat, None
+
+    with ThreadPoolExecutor(max_workers=len(satellites)) as pool:
+        return {sat: data for sat, data in pool.map(_load, satellites) if data is not None}
+
+
+if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
+    mag_dir = '/Users/clevenger/Projects/paper01/sop23_data/202303/04/swarm_mag/'
+    start_time = np.datetime64('2023-03-04T12:30:00')
+    end_time = np.datetime64('2023-03-04T12:32:00')
+
+    mag = load_mag_all(mag_dir, start_time, end_time)
+
+    fig, axs = plt.subplots(len(mag), 1, figsize=(20, 6 * len(mag)), sharex=True, squeeze=False)
+    for ax, (sat, data) in zip(axs[:, 0], mag.items()):
+        ax.plot(data['time'], data['B_NEC'][:, 0], label='B_N (North-South)', color='cyan', linewidth=4)
+        ax.plot(data['time'], data['B_NEC'][:, 1], label='B_E (East-West)', color='magenta', linewidth=4)
+        ax.plot(data['time'], data['B_NEC'][:, 2], label='B_C (In-Out)', color='darkorange', linewidth=4)
+        ax.set_title(f'SW_OPER_MAG{sat}_LR_1B Magnetic Field Components')
+        ax.legend()
+        ax.grid(True)
+        ax.set_ylabel('Magnetic Field Component (nT)')
+    axs[-1, 0].set_xlabel('Time')
+    plt.tight_layout()
+
+    output_filename = os.path.join('/Users/clevenger/Projects/paper01/sop23_data/202303/04/', 'swarm_mags_crossing3_local.png')
+    plt.savefig(output_filename, dpi=300, bbox_inches='tight')
+    print(f"Plot saved as: {output_filename}")
@@ -1,7 +1,7 @@
 import os
 import pandas as pd
 import numpy as np
-from viresclient import SwarmRequest
+from swarm_vires_fetch import fetch
 import datetime as dt
 import matplotlib.pyplot as plt
 
@@ -16,23 +16,22 @@ fig, axs = plt.subplots(len(collections), 1, figsize=(20, 6 * len(collections)),
 if len(collections) == 1:  # If there's only one collection, axs is not a list
     axs = [axs]
 
+# Request Swarm data for all satellites concurrently (served from the local cache where possible)
+data = fetch(collections, start_time, end_time, measurements=["B_NEC"], models=["CHAOS"])
+
 # Loop through each satellite collection and plot its data
 for ax, collection in zip(axs, collections):
-    # Request Swarm data for the current satellite
-    request = SwarmRequest()
-    request.set_collection(collection)
-    request.set_products(measurements=["B_NEC"], models=["CHAOS"])
-    data = request.get_between(start_time, end_time)
-    df = data.as_dataframe()
+    df = data[collection]
     print(f"Data Headers for {collection}: ", df.columns)
 
     # Convert index to datetime for plotting
     time_array = pd.to_datetime(df.index)
-    
+    B_NEC = np.stack(df['B_NEC'].values)
+
     # Plot each component of the magnetic field
-    ax.plot(time_array, np.vstack(df['B_NEC'])[:, 0], label='B_N (North-South)', color='cyan', linewidth = '4')
-    ax.plot(time_array, np.vstack(df['B_NEC'])[:, 1], label='B_E (East-West)', color='magenta', linewidth = '4')
-    ax.plot(time_array, np.vstack(df['B_NEC'])[:, 2], label='B_C (In-Out)', color='darkorange', linewidth = '4')
+    ax.plot(time_array, B_NEC[:, 0], label='B_N (North-South)', color='cyan', linewidth = '4')
+    ax.plot(time_array, B_NEC[:, 1], label='B_E (East-West)', color='magenta', linewidth = '4')
+    ax.plot(time_array, B_NEC[:, 2], label='B_C (In-Out)', color='darkorange', linewidth = '4')
     
     ax.set_title(f'{collection} Magnetic Field Components')
     ax.legend()
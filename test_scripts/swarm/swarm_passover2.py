@@ -68,15 +68,9 @@ def plot_3d_composite(h5file, swarm_data, time_range, alt_range):
     valid_lats = lats[np.isfinite(lats)]
     valid_alts = alts[np.isfinite(alts)]
 
-    # Plot PFISR beams once outside the update loop
-    for beam in range(lats.shape[0]):
-        x = lons[beam]
-        y = lats[beam]
-        z = alts[beam] / 1000  # Convert to km
-        
-        # Use a single color for each beam, and only plot finite values
-        finite_mask = np.isfinite(x) & np.isfinite(y) & np.isfinite(z)
-        ax.scatter(x[finite_mask], y[finite_mask], z[finite_mask], c='blue', s=10, alpha=0.5)
+    # Plot all PFISR beams as a single collection over the flattened beam x gate geometry
+    finite_mask = np.isfinite(lons) & np.isfinite(lats) & np.isfinite(alts)
+    ax.scatter(lons[finite_mask], lats[finite_mask], alts[finite_mask] / 1000, c='blue', s=10, alpha=0.5)
 
     # Initialize Swarm satellite plot
     swarm_plot, = ax.plot([], [], [], 'r*', markersize=10)
@@ -0,0 +1,182 @@
+import os
+import sys
+import h5py
+import cdflib
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'profiling'))
+from instrumentation import span, timed
+
+"""
+Purpose:
+    - cross-validate Swarm TCT drifts against PFISR line-of-sight velocities in one batch
+    - Swarm ion drifts are rotated into ENU (same rotation as swarm_efi_los_calculator.py), the
+      field-aligned part is removed, and the remaining drift is projected onto the LOS of every
+      nearby PFISR gate:   Vlos_expected = (v - (v.b) b) . k
+        k = (cos(el) sin(az), cos(el) cos(az), sin(el)) from BeamCodes
+    - (Swarm sample, gate) pairs are found with a KD-tree on horizontal gate positions and matched in
+      time to the PFISR integration record containing the Swarm sample
+    - output is a residual table (pandas DataFrame) against the measured Vlos
+"""
+
+RE_KM = 6371.2
+
+
+@timed('tct_enu_rotation')
+def rotate_tct_to_enu(VsatN, VsatE, VsatC, Vixh, Vixv, Viy, Viz):
+    """TCT ion drift (satellite frame) -> ENU, shape (N, 3)."""
+    Vsat_mag = np.sqrt(VsatN**2 + VsatE**2 + VsatC**2)
+    VsN, VsE, VsC = VsatN / Vsat_mag, VsatE / Vsat_mag, VsatC / Vsat_mag
+
+    s = VsatC.shape
+    R = np.array([[VsE, VsN, -VsC * VsE],
+                  [VsN, -VsE, -VsC * VsN],
+                  [-VsC, np.zeros(s), VsC**2 - 1]]).transpose((2, 0, 1))
+    Vi = np.array([(Vixh + Vixv) / 2., Viy, Viz]).T
+    return np.einsum('...ij,...j->...i', R, Vi)
+
+
+def local_xy(lat, lon, lat0, lon0):
+    """Horizontal east/north offsets (km) from (lat0, lon0), equirectangular."""
+    dlon = (np.asarray(lon) - lon0 + 180.) % 360. - 180.
+    x = RE_KM * np.radians(dlon) * np.cos(np.radians(lat0))
+    y = RE_KM * np.radians(np.asarray(lat) - lat0)
+    return x, y
+
+
+def los_unit_vectors(az, el):
+    """ENU unit vectors (nbeams, 3) from beam azimuth / elevation in degrees."""
+    az, el = np.radians(az), np.radians(el)
+    return np.column_stack((np.cos(el) * np.sin(az), np.cos(el) * np.cos(az), np.sin(el)))
+
+
+def field_unit_vectors(dip, declination):
+    """ENU unit vectors of the magnetic field from inclination (dip) and declination in degrees."""
+    I, D = np.radians(dip), np.radians(declination)
+    return np.stack((np.cos(I) * np.sin(D), np.cos(I) * np.cos(D), -np.sin(I)), axis=-1)
+
+
+@timed('pfisr_read_gates')
+def load_pfisr_gates(h5file, alt_range_km=(200., 500.)):
+    """
+    Flattened PFISR gate geometry and measured Vlos for gates inside alt_range_km:
+        beam, gate, lat, lon, alt (km), k (ngate, 3), bhat (ngate, 3) or None,
+        utime (nrec, 2), vlos (nrec, ngate), dvlos (nrec, ngate), site (lat, lon)
+    """
+    with h5py.File(h5file, 'r') as h5:
+        beamcodes = h5['BeamCodes'][:]
+        lat = h5['Geomag/Latitude'][:]
+        lon = h5['Geomag/Longitude'][:]
+        alt = h5['Geomag/Altitude'][:] / 1000.
+        utime = h5['Time/UnixTime'][:]
+        site = (float(h5['Site/Latitude'][()]), float(h5['Site/Longitude'][()]))
+
+        use = np.isfinite(alt) & (alt >= alt_range_km[0]) & (alt <= alt_range_km[1])
+        beam, gate = np.nonzero(use)
+
+        # Read only the Vlos parameter; gates are then selected in memory
+        vlos = h5['FittedParams/Fits'][:, :, :, 0, 3][:, beam, gate]
+        dvlos = h5['FittedParams/Errors'][:, :, :, 0, 3][:, beam, gate] if 'FittedParams/Errors' in h5 else None
+
+        bhat = None
+        if 'Geomag/Dip' in h5 and 'Geomag/Declination' in h5:
+            bhat = field_unit_vectors(h5['Geomag/Dip'][:][beam, gate], h5['Geomag/Declination'][:][beam, gate])
+
+    k = los_unit_vectors(beamcodes[:, 1], beamcodes[:, 2])[beam]
+    return {'beam': beam, 'gate': gate, 'lat': lat[beam, gate], 'lon': lon[beam, gate], 'alt': alt[beam, gate],
+            'beamcode': beamcodes[beam, 0], 'k': k, 'bhat': bhat, 'utime': utime, 'vlos': vlos, 'dvlos': dvlos,
+            'site': site}
+
+
+@timed('swarm_tct_read')
+def load_swarm_tct(swarm_cdf, starttime, endtime):
+    """Swarm TCT samples in [starttime, endtime] with ENU drifts; flagged samples are NaN."""
+    v = cdflib.CDF(swarm_cdf)
+    with span('cdf_epoch_conversion', file=os.path.basename(swarm_cdf)):
+        swarm_time = cdflib.epochs.CDFepoch.to_datetime(v.varget('Timestamp'))
+    stidx = int(np.searchsorted(swarm_time, starttime))
+    etidx = int(np.searchsorted(swarm_time, endtime, side='right')) - 1
+    if etidx < stidx:
+        raise ValueError(f"No Swarm data between {starttime} and {endtime}")
+
+    get = lambda k: v.varget(k, startrec=stidx, endrec=etidx)
+    qf = get('Quality_flags')
+    Vi = {k: get(k).astype(np.float64) for k in ['Vixh', 'Vixv', 'Viy', 'Viz']}
+    for k in Vi:
+        Vi[k][qf < 1] = np.nan
+
+    vel = rotate_tct_to_enu(get('VsatN'), get('VsatE'), get('VsatC'), Vi['Vixh'], Vi['Vixv'], Vi['Viy'], Vi['Viz'])
+    return {'time': swarm_time[stidx:etidx + 1].astype('datetime64[ms]'),
+            'lat': get('Latitude'), 'lon': get('Longitude'), 'vel': vel}
+
+
+def project(swarm, gates, radius_km=50., bhat=None, los_sign=1.):
+    """
+    Residual table for every (Swarm sample, gate within radius_km) pair whose time falls inside a
+    PFISR integration record. bhat overrides the field direction (3,) or (ngate, 3); without it the
+    file's dip/declination are used, or a vertical field if those are missing.
+    """
+    lat0, lon0 = gates['site']
+    gx, gy = local_xy(gates['lat'], gates['lon'], lat0, lon0)
+    sx, sy = local_xy(swarm['lat'], swarm['lon'], lat0, lon0)
+
+    # Time match: PFISR record containing each Swarm sample
+    t = swarm['time'].astype('datetime64[ms]').astype(np.int64) / 1000.
+    starts, ends = gates['utime'][:, 0], gates['utime'][:, 1]
+    rec = np.searchsorted(starts, t, side='right') - 1
+    in_rec = (rec >= 0) & (t < ends[np.clip(rec, 0, None)]) & np.all(np.isfinite(swarm['vel']), axis=1)
+
+    # Spatial match: all gates within radius_km of each Swarm sample
+    tree = cKDTree(np.column_stack((gx, gy)))
+    samples = np.flatnonzero(in_rec)
+    neighbours = tree.query_ball_point(np.column_stack((sx[samples], sy[samples])), r=radius_km)
+    counts = np.fromiter((len(n) for n in neighbours), dtype=np.int64, count=len(neighbours))
+    si = np.repeat(samples, counts)
+    gi = np.concatenate([np.asarray(n, dtype=np.int64) for n in neighbours]) if counts.sum() else np.empty(0, np.int64)
+
+    if bhat is None:
+        bhat = gates['bhat'] if gates['bhat'] is not None else np.array([0., 0., -1.])
+    b = np.broadcast_to(bhat, (len(gates['lat']), 3))[gi]
+
+    v = swarm['vel'][si]
+    v_perp = v - np.einsum('ij,ij->i', v, b)[:, None] * b
+    vlos_expected = los_sign * np.einsum('ij,ij->i', v_perp, gates['k'][gi])
+    vlos_measured = gates['vlos'][rec[si], gi]
+
+    table = pd.DataFrame({
+        'swarm_time': swarm['time'][si],
+        'swarm_index': si,
+        'swarm_lat': swarm['lat'][si],
+        'swarm_lon': swarm['lon'][si],
+        'pfisr_record': rec[si],
+        'beamcode': gates['beamcode'][gi],
+        'beam': gates['beam'][gi],
+        'gate': gates['gate'][gi],
+        'gate_lat': gates['lat'][gi],
+        'gate_lon': gates['lon'][gi],
+        'gate_alt': gates['alt'][gi],
+        'distance_km': np.hypot(sx[si] - gx[gi], sy[si] - gy[gi]),
+        'vlos_expected': vlos_expected,
+        'vlos_measured': vlos_measured,
+        'residual': vlos_measured - vlos_expected,
+    })
+    if gates['dvlos'] is not None:
+        table['vlos_error'] = gates['dvlos'][rec[si], gi]
+    return table
+
+
+if __name__ == "__main__":
+    filename_lp = '/Users/clevenger/Projects/paper01/sop23_data/202303/22/20230322.003_lp_3min-fitcal.h5'
+    swarm_cdf = '/Users/clevenger/Projects/paper01/sop23_data/202303/22/SW_EXPT_EFIB_TCT02_20230322T005252_20230322T132507_0302.cdf'
+    starttime = np.datetime64('2023-03-22T08:30:00')
+    endtime = np.datetime64('2023-03-22T09:30:00')
+
+    gates = load_pfisr_gates(filename_lp)
+    swarm = load_swarm_tct(swarm_cdf, starttime, endtime)
+    table = project(swarm, gates, radius_km=50.)
+
+    print(f"{len(table)} Swarm/PFISR pairs")
+    summary = table.groupby('beamcode')['residual'].agg(['count', 'mean', 'std'])
+    print(summary)
@@ -0,0 +1,140 @@
+import os
+import json
+import hashlib
+import datetime as dt
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+Purpose:
+    - fetch layer for VirES requests (swarm_mag_plotter.py and friends)
+    - requests for several collections are issued concurrently from a thread pool instead of
+      blocking on each request.get_between in turn
+    - responses are stored in a local content-addressed cache:
+        <cache_dir>/<hash of collection, measurements, models, sampling>/<start>_<end>.pkl
+      overlapping windows are served from cached chunks and only the missing time ranges are fetched
+    - url (or request_factory) can point the requests at a different server, e.g. a local stand-in
+"""
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'paper01_vires')
+STAMP_FORMAT = '%Y%m%dT%H%M%S'
+
+
+def request_key(collection, measurements, models=(), sampling_step=None, auxiliaries=()):
+    """Content address of a request (everything except the time window)."""
+    spec = {
+        'collection': collection,
+        'measurements': sorted(measurements),
+        'models': sorted(models),
+        'sampling_step': sampling_step,
+        'auxiliaries': sorted(auxiliaries),
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:20], spec
+
+
+def _chunk_name(start, end):
+    return f"{start.strftime(STAMP_FORMAT)}_{end.strftime(STAMP_FORMAT)}.pkl"
+
+
+def cached_intervals(key_dir):
+    """[(start, end, path)] of the cached chunks for one request key, sorted by start."""
+    if not os.path.isdir(key_dir):
+        return []
+    out = []
+    for fn in os.listdir(key_dir):
+        if not fn.endswith('.pkl'):
+            continue
+        t0, t1 = fn[:-4].split('_')
+        out.append((dt.datetime.strptime(t0, STAMP_FORMAT), dt.datetime.strptime(t1, STAMP_FORMAT),
+                    os.path.join(key_dir, fn)))
+    return sorted(out)
+
+
+def missing_ranges(start, end, intervals):
+    """Parts of [start, end) not covered by the cached intervals."""
+    missing, cursor = [], start
+    for t0, t1, _ in intervals:
+        if t1 <= cursor or t0 >= end:
+            continue
+        if t0 > cursor:
+            missing.append((cursor, t0))
+        cursor = max(cursor, t1)
+        if cursor >= end:
+            break
+    if cursor < end:
+        missing.append((cursor, end))
+    return missing
+
+
+def _default_request_factory(url=None):
+    from viresclient import SwarmRequest
+    return SwarmRequest(url=url) if url else SwarmRequest()
+
+
+def _fetch_range(spec, start, end, request_factory):
+    request = request_factory()
+    request.set_collection(spec['collection'])
+    kwargs = {'measurements': spec['measurements'], 'models': spec['models']}
+    if spec['auxiliaries']:
+        kwargs['auxiliaries'] = spec['auxiliaries']
+    if spec['sampling_step']:
+        kwargs['sampling_step'] = spec['sampling_step']
+    request.set_products(**kwargs)
+    data = request.get_between(start, end, show_progress=False)
+    return data.as_dataframe()
+
+
+def fetch(collections, start_time, end_time, measurements, models=(), sampling_step=None, auxiliaries=(),
+          cache_dir=DEFAULT_CACHE_DIR, url=None, request_factory=None, max_workers=6):
+    """
+    Dataframes for every collection over [start_time, end_time) -> {collection: DataFrame}.
+    Cached time ranges are read from disk; all missing ranges of all collections are fetched concurrently.
+    """
+    if request_factory is None:
+        request_factory = lambda: _default_request_factory(url)
+
+    jobs, keys = [], {}
+    for collection in collections:
+        key, spec = request_key(collection, measurements, models, sampling_step, auxiliaries)
+        key_dir = os.path.join(cache_dir, key)
+        os.makedirs(key_dir, exist_ok=True)
+        keys[collection] = key_dir
+        with open(os.path.join(key_dir, 'request.json'), 'w') as f:
+            json.dump(spec, f, indent=1)
+        for t0, t1 in missing_ranges(start_time, end_time, cached_intervals(key_dir)):
+            jobs.append((collection, spec, key_dir, t0, t1))
+
+    def _run(job):
+        collection, spec, key_dir, t0, t1 = job
+        df = _fetch_range(spec, t0, t1, request_factory)
+        path = os.path.join(key_dir, _chunk_name(t0, t1))
+        df.to_pickle(path + '.tmp')
+        os.replace(path + '.tmp', path)
+        return collection, t0, t1, len(df)
+
+    if jobs:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for collection, t0, t1, n in pool.map(_run, jobs):
+                print(f"Fetched {collection} {t0} - {t1}: {n} records")
+
+    out = {}
+    for collection, key_dir in keys.items():
+        parts = [pd.read_pickle(p) for t0, t1, p in cached_intervals(key_dir) if t1 > start_time and t0 < end_time]
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            out[collection] = pd.DataFrame()
+            continue
+        df = pd.concat(parts)
+        df = df[~df.index.duplicated(keep='first')].sort_index()
+        out[collection] = df[(df.index >= start_time) & (df.index < end_time)]
+    return out
+
+
+if __name__ == "__main__":
+    start_time = dt.datetime(2023, 3, 4, 12, 30)
+    end_time = dt.datetime(2023, 3, 4, 12, 32)
+    collections = ["SW_OPER_MAGA_LR_1B", "SW_OPER_MAGB_LR_1B", "SW_OPER_MAGC_LR_1B"]
+
+    data = fetch(collections, start_time, end_time, measurements=["B_NEC"], models=["CHAOS"])
+    for collection, df in data.items():
+        print(f"{collection}: {len(df)} records, columns {list(df.columns)}")
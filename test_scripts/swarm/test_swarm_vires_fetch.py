@@ -0,0 +1,195 @@
+import os
+import sys
+import threading
+import datetime as dt
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import swarm_vires_fetch
+from swarm_vires_fetch import fetch, request_key, cached_intervals, missing_ranges, _chunk_name
+
+"""
+Purpose:
+    - tests for swarm_vires_fetch.py through its request_factory seam: FakeRequest implements the
+      SwarmRequest calls used by _fetch_range in-process and returns 1 s synthetic records, so these
+      cover the cache and scheduling logic, not viresclient or the HTTP exchange
+    - test_url_reaches_http_server points fetch(url=...) at a local http.server stub on an ephemeral
+      port and checks the request arrives there (needs viresclient; skipped otherwise)
+"""
+
+T0 = dt.datetime(2023, 3, 4, 12, 30)
+COLLECTIONS = ["SW_OPER_MAGA_LR_1B", "SW_OPER_MAGB_LR_1B", "SW_OPER_MAGC_LR_1B"]
+
+
+class FakeRequestFactory:
+    """
+    request_factory for fetch(): hands out FakeRequests and records every get_between call;
+    optionally blocks until `barrier` requests are in flight.
+    """
+
+    def __init__(self, barrier=None):
+        self.calls = []
+        self.lock = threading.Lock()
+        self.barrier = threading.Barrier(barrier, timeout=5) if barrier else None
+
+    def factory(self):
+        return FakeRequest(self)
+
+
+class FakeRequest:
+    def __init__(self, factory):
+        self.factory = factory
+
+    def set_collection(self, collection):
+        self.collection = collection
+
+    def set_products(self, measurements, models=(), **kwargs):
+        self.measurements = measurements
+
+    def get_between(self, start, end, show_progress=False):
+        with self.factory.lock:
+            self.factory.calls.append((self.collection, start, end, threading.get_ident()))
+        if self.factory.barrier is not None:
+            self.factory.barrier.wait()
+        return FakeData(self.collection, start, end)
+
+
+class FakeData:
+    def __init__(self, collection, start, end):
+        index = pd.date_range(start, end, freq='1s', inclusive='left')
+        self.df = pd.DataFrame({'B_NEC': np.arange(len(index), dtype=float), 'Spacecraft': collection[11]},
+                               index=index)
+
+    def as_dataframe(self):
+        return self.df
+
+
+def _minutes(m0, m1):
+    return T0 + dt.timedelta(minutes=m0), T0 + dt.timedelta(minutes=m1)
+
+
+def test_missing_ranges_empty_cache():
+    start, end = _minutes(0, 10)
+    assert missing_ranges(start, end, []) == [(start, end)]
+
+
+def test_missing_ranges_partial_overlaps():
+    start, end = _minutes(0, 10)
+    intervals = [(*_minutes(-5, 2), None), (*_minutes(4, 6), None), (*_minutes(5, 7), None), (*_minutes(9, 20), None)]
+    assert missing_ranges(start, end, intervals) == [_minutes(2, 4), _minutes(7, 9)]
+
+
+def test_missing_ranges_fully_covered_and_disjoint():
+    start, end = _minutes(0, 10)
+    assert missing_ranges(start, end, [(*_minutes(-1, 11), None)]) == []
+    outside = [(*_minutes(-10, -5), None), (*_minutes(12, 15), None)]
+    assert missing_ranges(start, end, outside) == [(start, end)]
+
+
+def test_concurrent_fetch_of_collections(tmp_path):
+    # Every request waits at the barrier, so this only completes if all three run at the same time
+    requests = FakeRequestFactory(barrier=len(COLLECTIONS))
+    start, end = _minutes(0, 2)
+    out = fetch(COLLECTIONS, start, end, ['B_NEC'], cache_dir=str(tmp_path), request_factory=requests.factory)
+
+    assert sorted(c for c, *_ in requests.calls) == sorted(COLLECTIONS)
+    assert len({ident for *_, ident in requests.calls}) == len(COLLECTIONS)
+    for collection in COLLECTIONS:
+        assert len(out[collection]) == 120
+        assert out[collection].index.is_monotonic_increasing
+
+
+def test_cache_layout_and_hits(tmp_path):
+    requests = FakeRequestFactory()
+    start, end = _minutes(0, 2)
+    fetch(COLLECTIONS[:1], start, end, ['B_NEC'], cache_dir=str(tmp_path), request_factory=requests.factory)
+
+    key, _ = request_key(COLLECTIONS[0], ['B_NEC'])
+    key_dir = os.path.join(str(tmp_path), key)
+    assert os.path.exists(os.path.join(key_dir, _chunk_name(start, end)))
+    assert os.path.exists(os.path.join(key_dir, 'request.json'))
+    assert [(t0, t1) for t0, t1, _ in cached_intervals(key_dir)] == [(start, end)]
+
+    # Same window again: served from the cache without a request
+    out = fetch(COLLECTIONS[:1], start, end, ['B_NEC'], cache_dir=str(tmp_path), request_factory=requests.factory)
+    assert len(requests.calls) == 1
+    assert len(out[COLLECTIONS[0]]) == 120
+
+    # A different request spec gets its own key directory
+    other, _ = request_key(COLLECTIONS[0], ['B_NEC'], models=['CHAOS'])
+    assert other != key
+
+
+def test_partially_overlapping_window_fetches_only_gaps(tmp_path):
+    requests = FakeRequestFactory()
+    kwargs = dict(cache_dir=str(tmp_path), request_factory=requests.factory)
+    fetch(COLLECTIONS[:1], *_minutes(2, 4), ['B_NEC'], **kwargs)
+    fetch(COLLECTIONS[:1], *_minutes(6, 8), ['B_NEC'], **kwargs)
+    requests.calls.clear()
+
+    out = fetch(COLLECTIONS[:1], *_minutes(0, 10), ['B_NEC'], **kwargs)
+    assert sorted((s, e) for _, s, e, _ in requests.calls) == [_minutes(0, 2), _minutes(4, 6), _minutes(8, 10)]
+
+    df = out[COLLECTIONS[0]]
+    assert len(df) == 600
+    assert df.index[0] == T0 and df.index[-1] == T0 + dt.timedelta(seconds=599)
+    assert not df.index.duplicated().any()
+
+
+def test_window_inside_cached_chunk_is_trimmed(tmp_path):
+    requests = FakeRequestFactory()
+    kwargs = dict(cache_dir=str(tmp_path), request_factory=requests.factory)
+    fetch(COLLECTIONS[:1], *_minutes(0, 10), ['B_NEC'], **kwargs)
+    out = fetch(COLLECTIONS[:1], *_minutes(3, 4), ['B_NEC'], **kwargs)
+    assert len(requests.calls) == 1
+    assert len(out[COLLECTIONS[0]]) == 60
+
+
+def test_url_is_passed_to_default_factory(tmp_path, monkeypatch):
+    requests, urls = FakeRequestFactory(), []
+
+    def default_factory(url=None):
+        urls.append(url)
+        return requests.factory()
+
+    monkeypatch.setattr(swarm_vires_fetch, '_default_request_factory', default_factory)
+    fetch(COLLECTIONS[:1], *_minutes(0, 2), ['B_NEC'], cache_dir=str(tmp_path), url='http://127.0.0.1:1/ows')
+    assert urls == ['http://127.0.0.1:1/ows']
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Records the path of every request and answers with an error, ending the exchange."""
+    seen = []
+
+    def _reply(self):
+        self.seen.append((self.command, self.path))
+        self.send_response(500)
+        self.end_headers()
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+def test_url_reaches_http_server(tmp_path):
+    pytest.importorskip('viresclient')
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    StubHandler.seen.clear()
+    try:
+        with pytest.raises(Exception):
+            fetch(COLLECTIONS[:1], *_minutes(0, 2), ['B_NEC'], cache_dir=str(tmp_path),
+                  url=f'http://127.0.0.1:{httpd.server_address[1]}/ows')
+    finally:
+        httpd.shutdown()
+    assert StubHandler.seen and all(path.startswith('/ows') for _, path in StubHandler.seen)
+    assert not any(f.endswith('.pkl') for _, _, files in os.walk(tmp_path) for f in files)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,130 @@
+import os
+import h5py
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from vvels_reader import VvelsReader
+
+"""
+Purpose:
+    - convert VVELS vectors into Lompe convection inputs for a whole list of Lompe epochs
+      (2023-02-27_083500, ...) at once
+    - the VVELS file is read once: a single contiguous read covering all epochs
+    - every epoch is aligned to the VVELS integration interval containing it in one
+      vectorized lookup (falls back to the nearest record if an epoch lies in a gap)
+    - output per epoch: east/north velocity, (lon, lat) coordinates and errors, ready for
+      lompe.Data(values, coordinates, datatype='convection', error=...)
+"""
+
+# Dataset names in the VVELS output file (geographic east, north, up components)
+VELOCITY_KEY = 'Velocity/Velocity'
+COVARIANCE_KEY = 'Velocity/CovVelocity'
+LATITUDE_KEY = 'Coordinates/Latitude'
+LONGITUDE_KEY = 'Coordinates/Longitude'
+
+
+def parse_epochs(epochs):
+    """Lompe epoch strings (2023-02-27_083500) or datetime64s -> datetime64[s] array."""
+    out = []
+    for e in np.atleast_1d(epochs):
+        if isinstance(e, str) and '_' in e:
+            day, hms = e.split('_')
+            e = f"{day}T{hms[0:2]}:{hms[2:4]}:{hms[4:6]}"
+        out.append(np.datetime64(e, 's'))
+    return np.array(out, dtype='datetime64[s]')
+
+
+def convert(vvels_fn, epochs, allow_nearest=True, velocity_key=VELOCITY_KEY, covariance_key=COVARIANCE_KEY,
+            latitude_key=LATITUDE_KEY, longitude_key=LONGITUDE_KEY):
+    """
+    Lompe-ready VVELS arrays for every epoch. Returns a dict of arrays with a leading epoch axis:
+        time (nepoch,), record (nepoch,), values (nepoch, 2, nbins), coordinates (nepoch, 2, nbins),
+        error (nepoch, 2, nbins)
+    Bins with non-finite velocity or position are NaN; records that could not be matched are -1.
+    """
+    reader = VvelsReader(vvels_fn)
+    times = parse_epochs(epochs)
+
+    records = reader.lookup(times)
+    if allow_nearest:
+        records = np.where(records < 0, reader.nearest(times), records)
+    matched = records >= 0
+
+    if not matched.any():
+        raise ValueError(f"None of the {len(times)} epochs fall inside {vvels_fn}")
+
+    # One contiguous read spanning every record needed
+    r0, r1 = records[matched].min(), records[matched].max() + 1
+    keys = [k for k in (velocity_key, covariance_key, latitude_key, longitude_key) if k in reader.record_datasets]
+    block = reader.read(slice(int(r0), int(r1)), keys)
+
+    with_static = [k for k in (latitude_key, longitude_key) if k not in reader.record_datasets]
+    if with_static:
+        with h5py.File(vvels_fn, 'r') as h5:
+            for k in with_static:
+                block[k] = np.broadcast_to(h5[k][...], (r1 - r0,) + h5[k].shape)
+
+    local = np.where(matched, records - r0, 0)
+    vel = np.asarray(block[velocity_key], dtype=float)[local]
+    nbins = vel.shape[1]
+
+    values = np.moveaxis(vel[..., :2], -1, 1)
+    lat = np.asarray(block[latitude_key], dtype=float)[local].reshape(len(times), nbins)
+    lon = np.asarray(block[longitude_key], dtype=float)[local].reshape(len(times), nbins)
+    coordinates = np.stack((lon, lat), axis=1)
+
+    if covariance_key in block:
+        cov = np.asarray(block[covariance_key], dtype=float)[local]
+        error = np.sqrt(np.stack((cov[..., 0, 0], cov[..., 1, 1]), axis=1))
+    else:
+        error = np.full_like(values, np.nan)
+
+    bad = ~(np.all(np.isfinite(values), axis=1) & np.all(np.isfinite(coordinates), axis=1))
+    bad |= ~matched[:, None]
+    for arr in (values, coordinates, error):
+        arr[np.broadcast_to(bad[:, None, :], arr.shape)] = np.nan
+
+    return {'time': times, 'record': records, 'values': values, 'coordinates': coordinates, 'error': error}
+
+
+def epoch_data(converted, i):
+    """Finite bins of epoch i as (values (2, n), coordinates (2, n), error (2, n))."""
+    good = np.all(np.isfinite(converted['values'][i]), axis=0)
+    return (converted['values'][i][:, good], converted['coordinates'][i][:, good],
+            converted['error'][i][:, good])
+
+
+def to_lompe_data(converted, i, iweight=1.0, default_error=50.):
+    """lompe.Data convection object for epoch i."""
+    import lompe
+    values, coords, error = epoch_data(converted, i)
+    error = np.where(np.isfinite(error), error, default_error)
+    return lompe.Data(values, coordinates=coords, datatype='convection', iweight=iweight, error=error)
+
+
+def write_epoch_files(converted, outdir, max_workers=4):
+    """Write one <epoch>_vvels.npz per epoch (Lompe time-step naming), in parallel."""
+    os.makedirs(outdir, exist_ok=True)
+
+    def _write(i):
+        stamp = str(converted['time'][i]).replace('T', '_').replace(':', '')
+        fn = os.path.join(outdir, f"{stamp}_vvels.npz")
+        values, coords, error = epoch_data(converted, i)
+        np.savez(fn, values=values, coordinates=coords, error=error, record=converted['record'][i])
+        return fn
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(_write, range(len(converted['time']))))
+
+
+if __name__ == "__main__":
+    vvels_fn = '/Users/clevenger/Projects/paper01/events/20230227/vvels/outputs/20230227_vvels.h5'
+    outdir = '/Users/clevenger/Projects/paper01/events/20230227/lompe/inputs/vvels/'
+
+    epochs = np.arange(np.datetime64('2023-02-27T08:00:00'), np.datetime64('2023-02-27T09:30:00'),
+                       np.timedelta64(5, 'm'))
+    converted = convert(vvels_fn, epochs)
+    for t, rec in zip(converted['time'], converted['record']):
+        print(f"{t}: VVELS record {rec}")
+    for fn in write_epoch_files(converted, outdir):
+        print(f"Saved {fn}")
@@ -0,0 +1,133 @@
+import h5py
+import numpy as np
+
+"""
+Purpose:
+    - reusable reader for VVELS (resolved vector velocity) files
+    - builds an interval index on Time/UnixTime once, for both layouts:
+        (N, 2): start and end time per record
+        (N,):   single time per record; the record is taken to last until the next one
+    - maps timestamps / windows to record indices with np.searchsorted
+    - reads only the matching record slices of the vector-velocity datasets
+"""
+
+
+def intervals_from_unixtime(utimes):
+    """Return (starts, ends) in unix seconds for either Time/UnixTime layout."""
+    utimes = np.asarray(utimes, dtype=np.float64)
+    if utimes.ndim == 2 and utimes.shape[1] == 2:
+        return utimes[:, 0], utimes[:, 1]
+
+    utimes = utimes.ravel()
+    if utimes.size == 0:
+        return utimes, utimes
+    step = np.median(np.diff(utimes)) if utimes.size > 1 else 0.
+    ends = np.append(utimes[1:], utimes[-1] + step)
+    return utimes, ends
+
+
+def _to_unix(times):
+    """datetime64 / unix-seconds input -> float64 unix seconds."""
+    times = np.asarray(times)
+    if np.issubdtype(times.dtype, np.datetime64):
+        return times.astype('datetime64[ms]').astype(np.int64) / 1000.
+    return times.astype(np.float64)
+
+
+class VvelsReader:
+    """Interval-indexed access to one VVELS file."""
+
+    def __init__(self, filename, time_key='Time/UnixTime'):
+        self.filename = filename
+        with h5py.File(filename, 'r') as h5:
+            self.starts, self.ends = intervals_from_unixtime(h5[time_key][:])
+            nrec = self.starts.shape[0]
+
+            # Time-varying datasets are the ones whose leading axis is the record axis
+            self.record_datasets = []
+
+            def visitor(name, obj):
+                if isinstance(obj, h5py.Dataset) and name != time_key and obj.ndim > 0 and obj.shape[0] == nrec:
+                    self.record_datasets.append(name)
+            h5.visititems(visitor)
+        self.time_key = time_key
+
+    def __len__(self):
+        return self.starts.shape[0]
+
+    @property
+    def times(self):
+        """Record (start, end) as datetime64[s], shape (N, 2)."""
+        return np.column_stack((self.starts, self.ends)).astype('datetime64[s]')
+
+    def lookup(self, times):
+        """
+        Record index whose integration interval [start, end) contains each time; -1 where
+        no record contains it. Accepts scalars or arrays of datetime64 / unix seconds.
+        """
+        t = _to_unix(times)
+        idx = np.searchsorted(self.starts, t, side='right') - 1
+        valid = (idx >= 0) & (t < self.ends[np.clip(idx, 0, None)])
+        return np.where(valid, idx, -1)
+
+    def nearest(self, times):
+        """Record index with the interval midpoint closest to each time."""
+        t = _to_unix(times)
+        mid = 0.5 * (self.starts + self.ends)
+        if len(mid) < 2:
+            return np.zeros(np.shape(t), dtype=int)
+        i = np.clip(np.searchsorted(mid, t), 1, len(mid) - 1)
+        return np.where(np.abs(t - mid[i - 1]) <= np.abs(mid[i] - t), i - 1, i)
+
+    def window(self, start, end):
+        """slice of records overlapping the window [start, end]."""
+        t0, t1 = _to_unix(start), _to_unix(end)
+        i0 = np.searchsorted(self.ends, t0, side='right')
+        i1 = np.searchsorted(self.starts, t1, side='right')
+        return slice(int(i0), int(max(i0, i1)))
+
+    def read(self, records, datasets=None):
+        """
+        Read the given records (slice, int or index array) of the record datasets.
+        Index arrays are read as one sorted hyperslab selection and returned in the requested order.
+        """
+        datasets = self.record_datasets if datasets is None else datasets
+        out = {}
+        with h5py.File(self.filename, 'r') as h5:
+            if isinstance(records, (slice, int, np.integer)):
+                for name in datasets:
+                    out[name] = h5[name][records]
+                out[self.time_key] = np.column_stack((self.starts, self.ends))[records]
+                return out
+
+            records = np.asarray(records)
+            if np.any(records < 0):
+                raise ValueError("Record indices must be >= 0 (lookup returns -1 for times outside all records)")
+            uniq, inverse = np.unique(records, return_inverse=True)
+            if uniq.size == 0:
+                return {name: h5[name][0:0] for name in datasets}
+            if uniq.size == uniq[-1] - uniq[0] + 1:
+                sel = slice(int(uniq[0]), int(uniq[-1]) + 1)
+            else:
+                sel = uniq
+            for name in datasets:
+                out[name] = h5[name][sel][inverse]
+        out[self.time_key] = np.column_stack((self.starts, self.ends))[records]
+        return out
+
+    def read_window(self, start, end, datasets=None):
+        return self.read(self.window(start, end), datasets)
+
+
+if __name__ == "__main__":
+    vvels_fn = '/Users/clevenger/Projects/paper01/events/20230227/vvels/outputs/20230227_vvels.h5'
+
+    reader = VvelsReader(vvels_fn)
+    print(f"{len(reader)} records, {reader.times[0, 0]} - {reader.times[-1, 1]}")
+    print("Record datasets:", reader.record_datasets)
+
+    # Every Lompe time step of the night in one call
+    lompe_times = np.arange(np.datetime64('2023-02-27T06:00:00'), np.datetime64('2023-02-27T12:00:00'),
+                            np.timedelta64(5, 'm'))
+    for t, i in zip(lompe_times, reader.lookup(lompe_times)):
+        print(f"{t}: index {i}")